@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Compare embedding backends on CPU: throughput, query latency and retrieval quality.
+
+    python benchmark_embeddings.py --corpus ./docs --queries queries.jsonl
+    python benchmark_embeddings.py --corpus ./docs --backends sentence-transformers,onnx-int8
+    python benchmark_embeddings.py --corpus ./docs --backends onnx-int8 --workers 1,2,4,8
+
+The queries file holds one JSON object per line, {"query": "...", "relevant": ["file.txt", ...]},
+naming the corpus files that answer each query. Without it, the first sentence of a sample of
+passages is used as the query and its own file as the answer. Results for each backend are
+also compared against the first backend (top-k agreement and embedding cosine similarity).
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+from embeddings import get_embedding_backend, BACKENDS
+from embedding_pool import EmbeddingWorkerPool
+
+
+def load_passages(corpus: str, pattern: str, passage_chars: int) -> List[Dict[str, str]]:
+    """Split every matching file into passages of roughly passage_chars, on paragraph boundaries."""
+    passages = []
+    for path in sorted(glob.glob(os.path.join(corpus, pattern), recursive=True)):
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (UnicodeDecodeError, OSError):
+            continue
+
+        source = os.path.relpath(path, corpus)
+        current = ""
+        for paragraph in re.split(r'\n\s*\n', text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if current and len(current) + len(paragraph) > passage_chars:
+                passages.append({'source': source, 'text': current})
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            passages.append({'source': source, 'text': current})
+    return passages
+
+
+def load_queries(path: str, passages: List[Dict[str, str]], sample: int, seed: int) -> List[Dict[str, Any]]:
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    random.seed(seed)
+    queries = []
+    for passage in random.sample(passages, min(sample, len(passages))):
+        first_sentence = re.split(r'(?<=[.!?])\s+', passage['text'], maxsplit=1)[0]
+        queries.append({'query': first_sentence[:200], 'relevant': [passage['source']]})
+    return queries
+
+
+def top_k(query_embeddings: np.ndarray, passage_embeddings: np.ndarray, k: int) -> np.ndarray:
+    norms = np.linalg.norm(passage_embeddings, axis=1) * np.linalg.norm(query_embeddings, axis=1)[:, None]
+    similarities = (query_embeddings @ passage_embeddings.T) / np.maximum(norms, 1e-12)
+    k = min(k, similarities.shape[1])
+    candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(-similarities, candidates, axis=1).argsort(axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def benchmark_backend(name: str, passages: List[Dict[str, str]], queries: List[Dict[str, Any]],
+                      batch_size: int, k: int, file_name: str = None) -> Dict[str, Any]:
+    backend = get_embedding_backend(name, file_name=file_name)
+
+    started = time.perf_counter()
+    backend.model
+    load_seconds = time.perf_counter() - started
+
+    texts = [passage['text'] for passage in passages]
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    started = time.perf_counter()
+    passage_embeddings = backend.encode(texts, batch_size=batch_size)
+    encode_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        backend.encode([query['query']], batch_size=1)
+        latencies.append((time.perf_counter() - started) * 1000)
+    query_embeddings = backend.encode([query['query'] for query in queries], batch_size=batch_size)
+
+    ranked = top_k(query_embeddings, passage_embeddings, k)
+    hits, reciprocal_ranks = 0, []
+    for query, row in zip(queries, ranked):
+        relevant = set(query['relevant'])
+        rank = next((i + 1 for i, index in enumerate(row) if passages[index]['source'] in relevant), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        'backend': name,
+        'file_name': backend.file_name,
+        'dimension': int(passage_embeddings.shape[1]),
+        'max_tokens': backend.max_tokens,
+        'load_seconds': round(load_seconds, 2),
+        'passages_per_second': round(len(texts) / encode_seconds, 1),
+        'query_latency_ms_p50': round(statistics.median(latencies), 2),
+        f'recall@{k}': round(hits / len(queries), 4),
+        f'mrr@{k}': round(sum(reciprocal_ranks) / len(queries), 4),
+        '_passage_embeddings': passage_embeddings,
+        '_ranked': ranked
+    }
+
+
+def benchmark_workers(name: str, passages: List[Dict[str, str]], worker_counts: List[int], batch_size: int,
+                      file_name: str = None) -> List[Dict[str, Any]]:
+    """Ingest throughput of the multiprocess worker pool for each worker count."""
+    backend = get_embedding_backend(name, file_name=file_name)
+    texts = [passage['text'] for passage in passages]
+    cpus = os.cpu_count() or 1
+    results = []
+    for workers in worker_counts:
+        pool = EmbeddingWorkerPool(backend.name, backend.model_name, backend.file_name, workers,
+                                   max(1, cpus // max(worker_counts)), batch_size)
+        try:
+            pool.warm_up()
+            pool.encode(texts[:batch_size * workers])
+            started = time.perf_counter()
+            pool.encode(texts)
+            seconds = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        results.append({'workers': workers, 'passages_per_second': round(len(texts) / seconds, 1)})
+        print(f"  {workers:>3} workers: {results[-1]['passages_per_second']} passages/s")
+    for result in results:
+        result['scaling'] = round(result['passages_per_second'] / results[0]['passages_per_second'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends on CPU")
+    parser.add_argument("--corpus", required=True, help="Directory of documents to embed")
+    parser.add_argument("--pattern", default="**/*.txt", help="Glob pattern for corpus files (default: **/*.txt)")
+    parser.add_argument("--queries", help="JSONL file of held-out queries with relevant file names")
+    parser.add_argument("--backends", default="sentence-transformers,onnx,onnx-int8",
+                        help=f"Comma-separated backends to compare ({', '.join(BACKENDS)})")
+    parser.add_argument("--onnx-file", help="ONNX file inside the model repository for the onnx-int8 backend")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--passage-chars", type=int, default=800)
+    parser.add_argument("--sample-queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", help="Comma-separated worker-process counts to measure pool scaling for the first backend")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    passages = load_passages(args.corpus, args.pattern, args.passage_chars)
+    if not passages:
+        print(f"No passages found under {args.corpus} matching {args.pattern}")
+        sys.exit(1)
+    queries = load_queries(args.queries, passages, args.sample_queries, args.seed)
+    print(f"Corpus: {len(passages)} passages, {len(queries)} queries")
+
+    results = []
+    for name in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        print(f"\nBenchmarking {name}...")
+        try:
+            file_name = args.onnx_file if name == "onnx-int8" else None
+            results.append(benchmark_backend(name, passages, queries, args.batch_size, args.k, file_name))
+        except Exception as e:
+            print(f"✗ {name} failed: {e}")
+    if not results:
+        sys.exit(1)
+
+    reference = results[0]
+    for result in results:
+        result['speedup'] = round(result['passages_per_second'] / reference['passages_per_second'], 2)
+        agreement = [
+            len(set(row) & set(reference_row)) / len(reference_row)
+            for row, reference_row in zip(result['_ranked'], reference['_ranked'])
+        ]
+        result[f'agreement@{args.k}'] = round(sum(agreement) / len(agreement), 4)
+        if result['dimension'] == reference['dimension']:
+            a, b = result['_passage_embeddings'], reference['_passage_embeddings']
+            cosine = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+            result['cosine_to_reference'] = round(float(cosine.mean()), 4)
+
+    for result in results:
+        del result['_passage_embeddings'], result['_ranked']
+
+    columns = ['backend', 'passages_per_second', 'speedup', 'query_latency_ms_p50',
+               f'recall@{args.k}', f'mrr@{args.k}', f'agreement@{args.k}', 'cosine_to_reference']
+    print("\n" + "  ".join(f"{column:>22}" for column in columns))
+    for result in results:
+        print("  ".join(f"{str(result.get(column, '-')):>22}" for column in columns))
+
+    scaling = None
+    if args.workers:
+        print(f"\nWorker pool scaling ({reference['backend']}):")
+        worker_counts = [int(count) for count in args.workers.split(",")]
+        scaling = benchmark_workers(reference['backend'], passages, worker_counts, args.batch_size,
+                                    reference['file_name'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'passages': len(passages), 'queries': len(queries), 'results': results,
+                       'worker_scaling': scaling}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
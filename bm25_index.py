@@ -0,0 +1,205 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Tuple
+
+
+# Identifiers such as "ERR_CONN_RESET", "0x80070005", "foo.bar" or "v1.2-rc" are kept whole
+_TOKEN = re.compile(r"\w+(?:[.\-:/]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its of on or so that
+the their then there these this to was were what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms for BM25. Compound identifiers are indexed whole and by their parts, so
+    "ERR-42" matches both an exact "err-42" query and a query for "err".
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token not in STOPWORDS:
+            terms.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    Persistent inverted index with Okapi BM25 scoring, one SQLite file per collection.
+
+    Documents here are chunks, keyed by their Chroma ids. Postings, per-chunk lengths, document
+    frequencies and corpus totals are updated in the same transaction as each add or delete,
+    so scoring a query only reads the postings of its own terms.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chunks (
+            chunk_id TEXT PRIMARY KEY,
+            length INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            chunk_id TEXT NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, chunk_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS postings_by_chunk ON postings (chunk_id);
+
+        CREATE TABLE IF NOT EXISTS terms (
+            term TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS corpus (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            chunks INTEGER NOT NULL,
+            total_length INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._conn.commit()
+
+    def is_initialized(self) -> bool:
+        """Whether the index has been built for its collection (a corpus row exists)."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM corpus").fetchone() is not None
+
+    def mark_initialized(self):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO corpus (id, chunks, total_length) VALUES (0, 0, 0)")
+
+    def _delete(self, chunk_ids: Iterable[str]):
+        for chunk_id in chunk_ids:
+            row = self._conn.execute("SELECT length FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            terms = [term for term, in self._conn.execute(
+                "SELECT term FROM postings WHERE chunk_id = ?", (chunk_id,)
+            )]
+            self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(term,) for term in terms])
+            self._conn.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+            self._conn.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id,))
+            self._conn.execute(
+                "UPDATE corpus SET chunks = chunks - 1, total_length = total_length - ?", (row[0],)
+            )
+        self._conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def add(self, chunk_ids: List[str], texts: List[str]):
+        """Index chunks, replacing any chunk already indexed under the same id."""
+        if not chunk_ids:
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO corpus (id, chunks, total_length) VALUES (0, 0, 0)")
+            self._delete(chunk_ids)
+            total_length = 0
+            for chunk_id, text in zip(chunk_ids, texts):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                total_length += length
+                self._conn.execute("INSERT INTO chunks (chunk_id, length) VALUES (?, ?)", (chunk_id, length))
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+                self._conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in counts]
+                )
+            self._conn.execute(
+                "UPDATE corpus SET chunks = chunks + ?, total_length = total_length + ?",
+                (len(chunk_ids), total_length)
+            )
+
+    def delete(self, chunk_ids: List[str]):
+        if not chunk_ids:
+            return
+        with self._lock, self._conn:
+            self._delete(chunk_ids)
+
+    def clear(self):
+        with self._lock, self._conn:
+            for table in ("postings", "chunks", "terms", "corpus"):
+                self._conn.execute(f"DELETE FROM {table}")
+
+    def vacuum(self):
+        """Rewrite the database file without the pages freed by deletes."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            # The database is in WAL mode: copy the rewritten pages back and truncate the -wal file
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def search(self, query: str, n_results: int = 10, chunk_ids: Iterable[str] = None) -> List[Tuple[str, float]]:
+        """Return up to n_results (chunk_id, score) pairs, best first, optionally only among chunk_ids."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        allowed = set(chunk_ids) if chunk_ids is not None else None
+
+        with self._lock:
+            corpus = self._conn.execute("SELECT chunks, total_length FROM corpus").fetchone()
+            if not corpus or not corpus[0]:
+                return []
+            n_chunks, total_length = corpus
+            avg_length = total_length / n_chunks or 1.0
+
+            scores = {}
+            for term in terms:
+                row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    continue
+                df = row[0]
+                idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+                for chunk_id, tf, length in self._conn.execute(
+                        """SELECT p.chunk_id, p.tf, c.length FROM postings p
+                           JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?""", (term,)):
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            corpus = self._conn.execute("SELECT chunks, total_length FROM corpus").fetchone()
+        chunks, total_length = corpus if corpus else (0, 0)
+        return {'chunks': chunks, 'avg_chunk_terms': round(total_length / chunks, 2) if chunks else 0.0}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(path: str) -> BM25Index:
+    """Return the process-wide index for a path, shared by every VectorStore using it."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = BM25Index(path)
+        return _indexes[path]
@@ -2,21 +2,29 @@
 
 import os
 import sys
+import argparse
 from mcp_client import MCPClient
 from typing import List, Dict
 import json
 
 
 class CLIChat:
-    def __init__(self):
-        self.client = MCPClient()
+    def __init__(self, warm_up: bool = True, stream: bool = True, collection: str = None, namespace: str = None):
+        self.client = MCPClient(collection=collection, namespace=namespace)
+        self.stream = stream
+        if warm_up:
+            # Load the embedding model and vector store while the user types their first message
+            self.client.warm_up(background=True)
         self.conversation_history = []
+        self.last_run = None
         self.commands = {
             '/help': self.show_help,
             '/add': self.add_document_interactive,
             '/addfile': self.add_file_interactive,
+            '/adddir': self.add_directory_interactive,
             '/search': self.search_interactive,
             '/info': self.show_collection_info,
+            '/timing': self.show_timing,
             '/clear': self.clear_history,
             '/quit': self.quit_chat,
             '/exit': self.quit_chat
@@ -30,8 +38,10 @@ RAG Chatbot Commands:
 /help      - Show this help message
 /add       - Add a document to the knowledge base
 /addfile   - Add a file to the knowledge base
+/adddir    - Add all matching files in a directory to the knowledge base
 /search    - Search the knowledge base
 /info      - Show collection information
+/timing    - Show the step/latency breakdown of the last answer
 /clear     - Clear conversation history
 /quit      - Exit the chat
 /exit      - Exit the chat
@@ -89,6 +99,32 @@ search the knowledge base when needed and provide informed responses.
         except Exception as e:
             print(f"✗ Error adding file: {e}")
     
+    def add_directory_interactive(self):
+        """Interactive directory ingestion."""
+        print("\n--- Add Directory ---")
+        directory = input("Enter directory path: ").strip()
+        if not directory:
+            print("Error: Directory path cannot be empty")
+            return
+        
+        pattern = input("Glob pattern (default **/*): ").strip() or "**/*"
+        
+        try:
+            result = self.client.execute_tool("add_directory", {
+                "directory": directory,
+                "pattern": pattern
+            })
+            result_data = json.loads(result)
+            if result_data.get("success"):
+                print(f"✓ Added {result_data.get('added')} files ({result_data.get('chunks')} chunks) "
+                      f"in {result_data.get('elapsed_seconds')}s")
+                for failure in result_data.get("failures", []):
+                    print(f"  ✗ {failure['source']}: {failure['error']}")
+            else:
+                print(f"✗ Error: {result_data.get('error')}")
+        except Exception as e:
+            print(f"✗ Error adding directory: {e}")
+    
     def search_interactive(self):
         """Interactive search."""
         print("\n--- Search Knowledge Base ---")
@@ -102,11 +138,13 @@ search the knowledge base when needed and provide informed responses.
             n_results = int(n_results) if n_results else 5
         except ValueError:
             n_results = 5
+        mode = input("Mode - vector, keyword or hybrid (default vector): ").strip().lower() or "vector"
         
         try:
             result = self.client.execute_tool("search_documents", {
                 "query": query,
-                "n_results": n_results
+                "n_results": n_results,
+                "mode": mode
             })
             result_data = json.loads(result)
             if result_data.get("success"):
@@ -115,7 +153,9 @@ search the knowledge base when needed and provide informed responses.
                 for i, doc in enumerate(results, 1):
                     print(f"\n--- Result {i} ---")
                     print(f"Content: {doc['content'][:200]}{'...' if len(doc['content']) > 200 else ''}")
-                    print(f"Distance: {doc['distance']:.4f}")
+                    if doc.get('distance') is not None:
+                        print(f"Distance: {doc['distance']:.4f}")
+                    print(f"Score: {doc['score']:.4f}")
                     if doc.get('metadata'):
                         print(f"Metadata: {doc['metadata']}")
             else:
@@ -132,12 +172,32 @@ search the knowledge base when needed and provide informed responses.
                 info = result_data.get("collection_info", {})
                 print(f"\n--- Collection Info ---")
                 print(f"Name: {info.get('name')}")
-                print(f"Document Count: {info.get('count')}")
+                print(f"Documents: {info.get('unique_documents')}")
+                print(f"Chunks: {info.get('total_chunks')}")
+                if info.get('total_bytes') is not None:
+                    print(f"Size: {info['total_bytes'] / 1024:.1f} KiB")
+                for source in info.get('sources', [])[:5]:
+                    print(f"  {source['source'] or '(no source)'}: {source['documents']} documents")
             else:
                 print(f"✗ Error: {result_data.get('error')}")
         except Exception as e:
             print(f"✗ Error getting collection info: {e}")
     
+    def show_timing(self):
+        """Show the per-step timing breakdown of the last agent run."""
+        if not self.last_run:
+            print("No answer yet.")
+            return
+        
+        run = self.last_run
+        print(f"\n--- Last Answer: {run['total_seconds']:.2f}s, {run['total_tokens']} tokens, "
+              f"stopped by {run['stop_reason']} ---")
+        for step in run['steps']:
+            tools = ", ".join(tool['name'] for tool in step['tools']) or "-"
+            first_token = f" (first token {step['first_token_seconds']:.2f}s)" if step.get('first_token_seconds') else ""
+            print(f"Step {step['step']}: LLM {step['llm_seconds']:.2f}s{first_token}, tools {step['tool_seconds']:.2f}s "
+                  f"({tools}), {step['tool_output_bytes']} bytes of tool output, {step['tokens']} tokens")
+    
     def clear_history(self):
         """Clear conversation history."""
         self.conversation_history = []
@@ -174,8 +234,16 @@ search the knowledge base when needed and provide informed responses.
                 print("\n🤖 Assistant: ", end="", flush=True)
                 
                 try:
-                    response = self.client.chat_with_tools(user_input, self.conversation_history)
-                    print(response)
+                    if self.stream:
+                        # Print tokens as they arrive so the first words show up at time-to-first-token
+                        for token in self.client.chat_with_tools_stream(user_input, self.conversation_history):
+                            print(token, end="", flush=True)
+                        print()
+                        self.last_run = self.client.last_run
+                    else:
+                        self.last_run = self.client.run_agent(user_input, self.conversation_history)
+                        print(self.last_run['answer'])
+                    response = self.last_run['answer']
                     
                     self.conversation_history.append({"role": "user", "content": user_input})
                     self.conversation_history.append({"role": "assistant", "content": response})
@@ -195,11 +263,21 @@ search the knowledge base when needed and provide informed responses.
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG chatbot with MCP tools")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Don't preload the embedding model and vector store in the background")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="Print each answer only once it is complete")
+    parser.add_argument("--collection", help="Collection to use (default: documents)")
+    parser.add_argument("--namespace", help="Namespace (tenant) whose collections to use")
+    args = parser.parse_args()
+    
     if not os.getenv("GROQ_API_KEY"):
         print("❌ Error: GROQ_API_KEY environment variable not set!")
         print("Please create a .env file with your Groq API key:")
         print("GROQ_API_KEY=your_api_key_here")
         sys.exit(1)
     
-    chat = CLIChat()
+    chat = CLIChat(warm_up=not args.no_warmup, stream=not args.no_stream,
+                   collection=args.collection, namespace=args.namespace)
     chat.run()
\ No newline at end of file
@@ -0,0 +1,446 @@
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Float16Codec:
+    """Half-precision vectors: 2x smaller than float32, with negligible loss for cosine scores."""
+
+    name = "float16"
+    code_dtype = np.float16
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.code_shape = (dim,)
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32)
+
+    def similarities(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ query
+
+
+class ProductQuantizer:
+    """
+    Product quantization: each vector is cut into `subspaces` slices and each slice is stored as
+    the index of its nearest of 256 centroids, one byte per slice (384 float32 dims with 48
+    subspaces: 1536 bytes down to 48). Query scores use per-query lookup tables (asymmetric
+    distance), so codes are never decoded during search.
+    """
+
+    name = "pq"
+    code_dtype = np.uint8
+
+    def __init__(self, dim: int, subspaces: int = 48, centroids: np.ndarray = None):
+        if dim % subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible into {subspaces} subspaces")
+        self.dim = dim
+        self.subspaces = subspaces
+        self.sub_dim = dim // subspaces
+        self.code_shape = (subspaces,)
+        self.centroids = centroids  # (subspaces, k, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0):
+        """k-means (k <= 256) in every subspace."""
+        rng = np.random.default_rng(seed)
+        k = min(256, len(vectors))
+        slices = vectors.reshape(len(vectors), self.subspaces, self.sub_dim)
+        centroids = np.empty((self.subspaces, k, self.sub_dim), dtype=np.float32)
+        for j in range(self.subspaces):
+            points = slices[:, j, :]
+            centers = points[rng.choice(len(points), k, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = self._nearest(points, centers)
+                sums = np.zeros_like(centers)
+                np.add.at(sums, assignment, points)
+                counts = np.bincount(assignment, minlength=k)[:, None]
+                # Empty clusters keep their previous center
+                centers = np.where(counts > 0, sums / np.maximum(counts, 1), centers)
+            centroids[j] = centers
+        self.centroids = centroids
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1)[None, :] - 2 * points @ centers.T
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        slices = vectors.reshape(len(vectors), self.subspaces, self.sub_dim)
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = self._nearest(slices[:, j, :], self.centroids[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[j][codes[:, j]] for j in range(self.subspaces)]
+        return np.concatenate(parts, axis=1) if parts else np.zeros((len(codes), 0), dtype=np.float32)
+
+    def similarities(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        tables = np.einsum('jkd,jd->jk', self.centroids, query.reshape(self.subspaces, self.sub_dim))
+        return tables[np.arange(self.subspaces), codes.astype(np.intp)].sum(axis=1)
+
+
+class CompressedVectorFile:
+    """
+    Compressed vectors in a memory-mapped file, addressed by chunk id.
+
+    Rows are fixed size; the id -> row map and the free list of deleted rows live in SQLite.
+    A product quantizer needs training data, so until `train_size` vectors have arrived they are
+    kept as float16 in a staging file, then the codebooks are trained and everything is encoded.
+    """
+
+    def __init__(self, directory: str, storage: str, pq_subspaces: int = 48, train_size: int = 4096):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.storage = storage
+        self.pq_subspaces = pq_subspaces
+        self.train_size = train_size
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "rows.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (chunk_id TEXT PRIMARY KEY, row INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self._conn.commit()
+        self.codec = None
+        self._arrays = {}
+        self._finish_compaction()
+        dim = self._meta("dim")
+        if dim is not None:
+            self._make_codec(int(dim))
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Any):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _make_codec(self, dim: int):
+        if self.storage == "float16":
+            self.codec = Float16Codec(dim)
+        else:
+            path = os.path.join(self.directory, "codebooks.npy")
+            centroids = np.load(path) if os.path.exists(path) else None
+            self.codec = ProductQuantizer(dim, self.pq_subspaces, centroids)
+
+    def _array(self, name: str, capacity: int) -> np.memmap:
+        """Memory-mapped array `name`, grown (by doubling) to hold at least `capacity` rows."""
+        if name == "codes":
+            shape, dtype = self.codec.code_shape, self.codec.code_dtype
+        else:
+            shape, dtype = (self.codec.dim,), np.float16
+        row_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        path = os.path.join(self.directory, f"{name}.bin")
+
+        current = self._arrays.get(name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        rows = size // row_bytes
+        if current is not None and len(current) >= capacity:
+            return current
+        if rows < capacity:
+            if current is not None:
+                current.flush()
+            rows = max(capacity, rows * 2, 1024)
+            with open(path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        self._arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(rows, *shape))
+        return self._arrays[name]
+
+    def _rows(self, ids: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows.update(self._conn.execute(
+                f"SELECT chunk_id, row FROM rows WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return rows
+
+    def put(self, ids: List[str], vectors: np.ndarray):
+        """Store (or overwrite) the vectors of chunks."""
+        if not ids:
+            return
+        vectors = _normalize(vectors)
+        with self._lock, self._conn:
+            if self.codec is None:
+                self._set_meta("dim", vectors.shape[1])
+                self._make_codec(vectors.shape[1])
+
+            rows = self._rows(ids)
+            next_row = int(self._meta("next_row") or 0)
+            for chunk_id in ids:
+                if chunk_id in rows:
+                    continue
+                free = self._conn.execute("SELECT row FROM free_rows LIMIT 1").fetchone()
+                if free:
+                    self._conn.execute("DELETE FROM free_rows WHERE row = ?", free)
+                    rows[chunk_id] = free[0]
+                else:
+                    rows[chunk_id] = next_row
+                    next_row += 1
+                self._conn.execute("INSERT INTO rows (chunk_id, row) VALUES (?, ?)", (chunk_id, rows[chunk_id]))
+            self._set_meta("next_row", next_row)
+
+            positions = np.array([rows[chunk_id] for chunk_id in ids], dtype=np.intp)
+            if self.codec.trained:
+                self._array("codes", next_row)[positions] = self.codec.encode(vectors)
+            else:
+                self._array("staging", next_row)[positions] = vectors.astype(np.float16)
+                live = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+                if live >= self.train_size:
+                    self._train(next_row)
+
+    def _train(self, next_row: int):
+        staging = self._array("staging", next_row)
+        live = np.array([row for row, in self._conn.execute("SELECT row FROM rows")], dtype=np.intp)
+        vectors = staging[live].astype(np.float32)
+        self.codec.train(vectors)
+        np.save(os.path.join(self.directory, "codebooks.npy"), self.codec.centroids)
+        self._array("codes", next_row)[live] = self.codec.encode(vectors)
+        self._arrays["codes"].flush()
+        del self._arrays["staging"], staging
+        os.remove(os.path.join(self.directory, "staging.bin"))
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with self._lock, self._conn:
+            for chunk_id, row in self._rows(ids).items():
+                self._conn.execute("DELETE FROM rows WHERE chunk_id = ?", (chunk_id,))
+                self._conn.execute("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", (row,))
+
+    def _finish_compaction(self):
+        """
+        Complete or undo a compaction that stopped part-way. The renumbered rows are committed
+        with a "compacting" marker naming the rewritten file before it replaces the old one, so
+        with the marker set the compacted file is the right one; without it, it is discarded.
+        """
+        name = self._meta("compacting")
+        if name is not None:
+            compacted_path = os.path.join(self.directory, f"{name}.bin.compact")
+            if os.path.exists(compacted_path):
+                os.replace(compacted_path, os.path.join(self.directory, f"{name}.bin"))
+            with self._conn:
+                self._conn.execute("DELETE FROM meta WHERE key = 'compacting'")
+        for name in ("codes", "staging"):
+            compacted_path = os.path.join(self.directory, f"{name}.bin.compact")
+            if os.path.exists(compacted_path):
+                os.remove(compacted_path)
+
+    def compact(self) -> Dict[str, int]:
+        """Rewrite the vector file with only live rows, renumbering them in order, and drop the free list."""
+        with self._lock:
+            before = int(self._meta("next_row") or 0)
+            if self.codec is None:
+                return {'rows_before': 0, 'rows_after': 0}
+            name = "codes" if self.codec.trained else "staging"
+            current = self._array(name, before)
+            live = self._conn.execute("SELECT chunk_id, row FROM rows ORDER BY row").fetchall()
+            compacted = np.memmap(os.path.join(self.directory, f"{name}.bin.compact"), dtype=current.dtype,
+                                  mode="w+", shape=(max(len(live), 1), *current.shape[1:]))
+            for start in range(0, len(live), 65536):
+                batch = np.array([row for _, row in live[start:start + 65536]], dtype=np.intp)
+                compacted[start:start + len(batch)] = current[batch]
+            compacted.flush()
+            del compacted, current
+
+            with self._conn:
+                self._conn.executemany("UPDATE rows SET row = ? WHERE chunk_id = ?",
+                                       [(new, chunk_id) for new, (chunk_id, old) in enumerate(live) if new != old])
+                self._conn.execute("DELETE FROM free_rows")
+                self._set_meta("next_row", len(live))
+                self._set_meta("compacting", name)
+            self._arrays.pop(name, None)
+            self._finish_compaction()
+        return {'rows_before': before, 'rows_after': len(live)}
+
+    def vacuum(self):
+        """Reclaim the space of deleted rows in the SQLite tables."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            # The database is in WAL mode: copy the rewritten pages back and truncate the -wal file
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _codes(self, ids: List[str]):
+        """(positions in ids that are stored, their codes or staged vectors, whether they are codes)."""
+        rows = self._rows(ids)
+        found = [i for i, chunk_id in enumerate(ids) if chunk_id in rows]
+        positions = np.array([rows[ids[i]] for i in found], dtype=np.intp)
+        if not found:
+            return found, None, True
+        next_row = int(self._meta("next_row") or 0)
+        if self.codec.trained:
+            return found, np.asarray(self._array("codes", next_row)[positions]), True
+        return found, np.asarray(self._array("staging", next_row)[positions]), False
+
+    def similarities(self, query: np.ndarray, ids: List[str]) -> np.ndarray:
+        """Cosine similarity of each stored chunk to the query; NaN for unknown ids."""
+        scores = np.full(len(ids), np.nan, dtype=np.float32)
+        with self._lock:
+            if self.codec is None:
+                return scores
+            found, codes, encoded = self._codes(ids)
+            if found:
+                query = _normalize(query)
+                scores[found] = self.codec.similarities(query, codes) if encoded else codes.astype(np.float32) @ query
+        return scores
+
+    def vectors(self, ids: List[str]) -> List[Optional[np.ndarray]]:
+        """Decoded (approximate) vectors, None for unknown ids."""
+        result = [None] * len(ids)
+        with self._lock:
+            if self.codec is None:
+                return result
+            found, codes, encoded = self._codes(ids)
+            if found:
+                decoded = self.codec.decode(codes) if encoded else codes.astype(np.float32)
+                for i, vector in zip(found, decoded):
+                    result[i] = vector
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+            disk = sum(
+                os.path.getsize(os.path.join(self.directory, name))
+                for name in ("codes.bin", "staging.bin", "codebooks.npy") if os.path.exists(os.path.join(self.directory, name))
+            )
+        return {
+            'storage': self.storage,
+            'vectors': live,
+            'trained': bool(self.codec and self.codec.trained),
+            'bytes_per_vector': (
+                int(np.prod(self.codec.code_shape)) * np.dtype(self.codec.code_dtype).itemsize if self.codec else None
+            ),
+            'disk_bytes': disk
+        }
+
+
+class CompressedCollection:
+    """
+    Wraps a Chroma collection that indexes low-dimensional random projections of the
+    embeddings (the coarse index), while the embeddings themselves live compressed in a
+    CompressedVectorFile. Queries over-fetch from the coarse index and re-score the candidates
+    with NumPy against the compressed vectors. Exposes the subset of the Chroma collection API
+    that VectorStore uses.
+    """
+
+    def __init__(self, collection, vectors: CompressedVectorFile, coarse_dim: int = 64,
+                 oversample: int = 8, seed: int = 0):
+        self._collection = collection
+        self.vectors = vectors
+        self.coarse_dim = coarse_dim
+        self.oversample = oversample
+        self.seed = seed
+        self._projection = None
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    @property
+    def coarse_collection(self):
+        """The Chroma collection holding the coarse projections."""
+        return self._collection
+
+    @coarse_collection.setter
+    def coarse_collection(self, collection):
+        self._collection = collection
+
+    def _project(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = _normalize(embeddings)
+        if self._projection is None or self._projection.shape[0] != embeddings.shape[1]:
+            rng = np.random.default_rng(self.seed)
+            self._projection = (
+                rng.standard_normal((embeddings.shape[1], self.coarse_dim)) / np.sqrt(self.coarse_dim)
+            ).astype(np.float32)
+        return _normalize(embeddings @ self._projection)
+
+    def upsert(self, ids: List[str], embeddings=None, metadatas=None, documents=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.vectors.put(ids, embeddings)
+        self._collection.upsert(ids=ids, embeddings=self._project(embeddings), metadatas=metadatas, documents=documents)
+
+    add = upsert
+
+    def update(self, ids: List[str], embeddings=None, metadatas=None, documents=None):
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            self.vectors.put(ids, embeddings)
+            embeddings = self._project(embeddings)
+        self._collection.update(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def delete(self, ids: List[str] = None, where: Dict[str, Any] = None, where_document: Dict[str, Any] = None):
+        if ids is None:
+            ids = self._collection.get(where=where, where_document=where_document, include=[])['ids']
+        elif where is not None or where_document is not None:
+            ids = self._collection.get(ids=ids, where=where, where_document=where_document, include=[])['ids']
+        if ids:
+            self._collection.delete(ids=ids)
+            self.vectors.delete(ids)
+
+    def get(self, ids: List[str] = None, where: Dict[str, Any] = None, limit: int = None, offset: int = None,
+            where_document: Dict[str, Any] = None, include: List[str] = ("metadatas", "documents")):
+        include = list(include)
+        results = self._collection.get(
+            ids=ids, where=where, limit=limit, offset=offset, where_document=where_document,
+            include=[field for field in include if field != "embeddings"]
+        )
+        if "embeddings" in include:
+            results['embeddings'] = self.vectors.vectors(results['ids'])
+        return results
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict[str, Any] = None,
+              where_document: Dict[str, Any] = None, include: List[str] = ("metadatas", "documents", "distances")):
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        coarse = self._collection.query(
+            query_embeddings=self._project(queries),
+            n_results=n_results * self.oversample,
+            where=where,
+            where_document=where_document,
+            include=["metadatas", "documents"]
+        )
+
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': None}
+        for query, ids, documents, metadatas in zip(queries, coarse['ids'], coarse['documents'], coarse['metadatas']):
+            scores = self.vectors.similarities(query, ids)
+            order = [i for i in np.argsort(-np.nan_to_num(scores, nan=-np.inf)) if not np.isnan(scores[i])][:n_results]
+            results['ids'].append([ids[i] for i in order])
+            results['documents'].append([documents[i] for i in order])
+            results['metadatas'].append([metadatas[i] for i in order])
+            results['distances'].append([float(1.0 - scores[i]) for i in order])
+        return results
+
+
+_vector_files = {}
+_vector_files_lock = threading.Lock()
+
+
+def get_compressed_vectors(directory: str, storage: str, pq_subspaces: int = 48) -> CompressedVectorFile:
+    """Return the process-wide side store in a directory, so its memory map is opened once."""
+    directory = os.path.abspath(directory)
+    with _vector_files_lock:
+        if directory not in _vector_files:
+            _vector_files[directory] = CompressedVectorFile(directory, storage, pq_subspaces)
+        return _vector_files[directory]
@@ -0,0 +1,140 @@
+from typing import List, Dict, Any, Callable
+
+
+def overlap_length(previous: str, following: str, limit: int = 2000) -> int:
+    """
+    Length of the longest suffix of `previous` that is also a prefix of `following`, looking at
+    no more than `limit` characters (linear time, via the KMP prefix function).
+    """
+    limit = min(limit, len(previous), len(following))
+    if not limit:
+        return 0
+    text = following[:limit] + "\0" + previous[-limit:]
+    prefix = [0] * len(text)
+    for i in range(1, len(text)):
+        k = prefix[i - 1]
+        while k and text[i] != text[k]:
+            k = prefix[k - 1]
+        if text[i] == text[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1]
+
+
+def strip_overlap(previous: str, following: str, min_overlap: int = 16, limit: int = 2000) -> str:
+    """Drop the start of `following` that repeats the end of `previous` (chunk overlap)."""
+    k = overlap_length(previous, following, limit)
+    return following[k:].lstrip() if k >= min_overlap else following
+
+
+def _relevance(hits: List[Dict[str, Any]]) -> List[float]:
+    """Positive utility per hit: its rerank score or search score, shifted so the weakest hit is near zero."""
+    scores = [hit.get('rerank_score', hit.get('score')) for hit in hits]
+    if any(score is None for score in scores):
+        # Fall back to rank order
+        return [1.0 / (rank + 1) for rank in range(len(hits))]
+    low = min(scores, default=0.0)
+    shift = -low + 1e-6 if low <= 0 else 0.0
+    return [score + shift for score in scores]
+
+
+def merge_adjacent(hits: List[Dict[str, Any]], max_chars: int = None) -> List[Dict[str, Any]]:
+    """
+    Merge hits that are consecutive chunks of the same document into single segments, with
+    the repeated overlap text removed. A run is split where merging would exceed max_chars.
+    """
+    utilities = _relevance(hits)
+    by_document = {}
+    for rank, (hit, utility) in enumerate(zip(hits, utilities)):
+        metadata = hit.get('metadata') or {}
+        doc_id = metadata.get('parent_doc_id', hit.get('id'))
+        by_document.setdefault(doc_id, []).append((metadata.get('chunk_index'), rank, hit, utility))
+
+    segments = []
+    for doc_id, members in by_document.items():
+        members.sort(key=lambda member: (member[0] is None, member[0] or 0, member[1]))
+        segment = None
+        for index, rank, hit, utility in members:
+            adjacent = (
+                segment is not None and index is not None and segment['chunk_indices'][-1] is not None
+                and index == segment['chunk_indices'][-1] + 1
+            )
+            if adjacent:
+                addition = strip_overlap(segment['content'], hit['content'])
+                merged = segment['content'] + " " + addition
+                if max_chars is None or len(merged) <= max_chars:
+                    segment['content'] = merged
+                    segment['chunk_indices'].append(index)
+                    segment['ids'].append(hit['id'])
+                    segment['utility'] += utility
+                    segment['rank'] = min(segment['rank'], rank)
+                    continue
+            segment = {
+                'doc_id': doc_id,
+                'ids': [hit['id']],
+                'chunk_indices': [index],
+                'content': hit['content'],
+                'metadata': hit.get('metadata') or {},
+                'utility': utility,
+                'rank': rank
+            }
+            segments.append(segment)
+    return segments
+
+
+def _render(segment: Dict[str, Any]) -> str:
+    label = segment['metadata'].get('title') or segment['metadata'].get('source') or segment['doc_id']
+    return f"[{label}]\n{segment['content']}"
+
+
+def pack_context(hits: List[Dict[str, Any]], max_chars: int = 4000, max_tokens: int = None,
+                 count_tokens: Callable[[str], int] = None, separator: str = "\n\n") -> Dict[str, Any]:
+    """
+    Assemble ranked search hits into one context string under a character (and optionally
+    token) budget.
+
+    Adjacent chunks are merged and de-overlapped first; segments are then chosen greedily by
+    relevance per character, skipping any that no longer fit, and emitted most relevant first.
+
+    Returns:
+        Dict with the packed 'context', the chosen 'segments', 'chars', 'tokens' (when
+        counted) and the number of hits 'dropped'
+    """
+    if max_tokens is not None and count_tokens is None:
+        raise ValueError("max_tokens needs a count_tokens function")
+
+    segments = merge_adjacent(hits, max_chars)
+    for segment in segments:
+        segment['text'] = _render(segment)
+        segment['tokens'] = count_tokens(segment['text']) if count_tokens else None
+
+    chosen = []
+    chars = 0
+    tokens = 0
+    for segment in sorted(segments, key=lambda s: s['utility'] / max(1, len(s['text'])), reverse=True):
+        extra = len(segment['text']) + (len(separator) if chosen else 0)
+        if chars + extra > max_chars:
+            continue
+        if max_tokens is not None and tokens + segment['tokens'] > max_tokens:
+            continue
+        chosen.append(segment)
+        chars += extra
+        tokens += segment['tokens'] or 0
+
+    chosen.sort(key=lambda segment: segment['rank'])
+    return {
+        'context': separator.join(segment['text'] for segment in chosen),
+        'segments': [
+            {
+                'doc_id': segment['doc_id'],
+                'ids': segment['ids'],
+                'chunk_indices': segment['chunk_indices'],
+                'metadata': segment['metadata'],
+                'content': segment['content']
+            }
+            for segment in chosen
+        ],
+        'chars': chars,
+        'tokens': tokens if count_tokens else None,
+        'dropped': len(hits) - sum(len(segment['ids']) for segment in chosen)
+    }
@@ -0,0 +1,255 @@
+import sqlite3
+import threading
+import time
+import os
+from typing import List, Dict, Any, Optional
+
+
+class DocumentRegistry:
+    """
+    One row per document, per collection, in a SQLite side table.
+
+    Per-collection and per-source totals (documents, chunks, bytes) live in their own tables
+    and are kept up to date by triggers, so counting documents never scans the collection.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            collection TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            title TEXT,
+            source TEXT NOT NULL DEFAULT '',
+            type TEXT,
+            doc_hash TEXT,
+            chunk_count INTEGER NOT NULL,
+            byte_size INTEGER NOT NULL,
+            added_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (collection, doc_id)
+        );
+        CREATE INDEX IF NOT EXISTS documents_by_added ON documents (collection, added_at);
+        CREATE INDEX IF NOT EXISTS documents_by_source ON documents (collection, source, added_at);
+        CREATE INDEX IF NOT EXISTS documents_by_type ON documents (collection, type, added_at);
+        CREATE INDEX IF NOT EXISTS documents_by_title ON documents (collection, title);
+
+        CREATE TABLE IF NOT EXISTS collection_stats (
+            collection TEXT PRIMARY KEY,
+            documents INTEGER NOT NULL DEFAULT 0,
+            chunks INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS source_stats (
+            collection TEXT NOT NULL,
+            source TEXT NOT NULL,
+            documents INTEGER NOT NULL DEFAULT 0,
+            chunks INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (collection, source)
+        );
+
+        -- Index directories each Chroma collection (by its id) created on disk, so a vacuum
+        -- can remove exactly the ones of the collection it drops
+        CREATE TABLE IF NOT EXISTS segment_directories (
+            collection_id TEXT NOT NULL,
+            directory TEXT NOT NULL,
+            PRIMARY KEY (collection_id, directory)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+            INSERT INTO collection_stats (collection, documents, chunks, bytes)
+                VALUES (NEW.collection, 1, NEW.chunk_count, NEW.byte_size)
+                ON CONFLICT (collection) DO UPDATE SET
+                    documents = documents + 1,
+                    chunks = chunks + NEW.chunk_count,
+                    bytes = bytes + NEW.byte_size;
+            INSERT INTO source_stats (collection, source, documents, chunks, bytes)
+                VALUES (NEW.collection, NEW.source, 1, NEW.chunk_count, NEW.byte_size)
+                ON CONFLICT (collection, source) DO UPDATE SET
+                    documents = documents + 1,
+                    chunks = chunks + NEW.chunk_count,
+                    bytes = bytes + NEW.byte_size;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+            UPDATE collection_stats SET
+                documents = documents - 1,
+                chunks = chunks - OLD.chunk_count,
+                bytes = bytes - OLD.byte_size
+                WHERE collection = OLD.collection;
+            UPDATE source_stats SET
+                documents = documents - 1,
+                chunks = chunks - OLD.chunk_count,
+                bytes = bytes - OLD.byte_size
+                WHERE collection = OLD.collection AND source = OLD.source;
+            DELETE FROM source_stats
+                WHERE collection = OLD.collection AND source = OLD.source AND documents <= 0;
+        END;
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+        self._conn.commit()
+
+    def is_initialized(self, collection: str) -> bool:
+        """Whether the registry has been populated for a collection (a stats row exists)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM collection_stats WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row is not None
+
+    def mark_initialized(self, collection: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO collection_stats (collection) VALUES (?)", (collection,))
+
+    def upsert_documents(self, collection: str, documents: List[Dict[str, Any]]):
+        """
+        Insert or replace documents. Each dict needs doc_id, chunk_count and byte_size and may
+        carry title, source, type and doc_hash.
+        """
+        if not documents:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO collection_stats (collection) VALUES (?)", (collection,))
+            for doc in documents:
+                row = self._conn.execute(
+                    "SELECT added_at FROM documents WHERE collection = ? AND doc_id = ?",
+                    (collection, doc['doc_id'])
+                ).fetchone()
+                # Delete + insert (rather than UPDATE) keeps the counters to two triggers
+                self._conn.execute(
+                    "DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc['doc_id'])
+                )
+                self._conn.execute(
+                    """INSERT INTO documents (collection, doc_id, title, source, type, doc_hash,
+                                              chunk_count, byte_size, added_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        collection, doc['doc_id'], doc.get('title'), doc.get('source') or '', doc.get('type'),
+                        doc.get('doc_hash'), doc['chunk_count'], doc['byte_size'],
+                        row['added_at'] if row else doc.get('added_at', now), now
+                    )
+                )
+
+    def delete_documents(self, collection: str, doc_ids: List[str]) -> int:
+        with self._lock, self._conn:
+            deleted = 0
+            for doc_id in doc_ids:
+                deleted += self._conn.execute(
+                    "DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+                ).rowcount
+        return deleted
+
+    def clear(self, collection: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM source_stats WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM collection_stats WHERE collection = ?", (collection,))
+
+    def record_segment_directories(self, collection_id: str, directories: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO segment_directories (collection_id, directory) VALUES (?, ?)",
+                [(collection_id, directory) for directory in directories]
+            )
+
+    def segment_directories(self, collection_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT directory FROM segment_directories WHERE collection_id = ?", (collection_id,)
+            ).fetchall()
+        return [row['directory'] for row in rows]
+
+    def forget_segment_directories(self, collection_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segment_directories WHERE collection_id = ?", (collection_id,))
+
+    def vacuum(self):
+        """Rewrite the database file without the pages freed by deletes."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            # The database is in WAL mode: copy the rewritten pages back and truncate the -wal file
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self, collection: str) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT documents, chunks, bytes FROM collection_stats WHERE collection = ?", (collection,)
+            ).fetchone()
+        return dict(row) if row else {'documents': 0, 'chunks': 0, 'bytes': 0}
+
+    def source_stats(self, collection: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Per-source totals, largest sources first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT source, documents, chunks, bytes FROM source_stats
+                   WHERE collection = ? ORDER BY documents DESC LIMIT ?""",
+                (collection, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_document_ids(self, collection: str, source: str = None, title: str = None, doc_type: str = None,
+                          added_after: float = None, added_before: float = None, limit: int = None) -> List[str]:
+        """Ids of documents matching every given field, answered from the indexes above."""
+        clauses, params = ["collection = ?"], [collection]
+        for column, value in (("source", source), ("title", title), ("type", doc_type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if added_after is not None:
+            clauses.append("added_at >= ?")
+            params.append(added_after)
+        if added_before is not None:
+            clauses.append("added_at <= ?")
+            params.append(added_before)
+
+        query = f"SELECT doc_id FROM documents WHERE {' AND '.join(clauses)}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def list_documents(self, collection: str, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Page through documents, most recently added first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT doc_id, title, source, type, chunk_count, byte_size, added_at, updated_at
+                   FROM documents WHERE collection = ?
+                   ORDER BY added_at DESC, doc_id LIMIT ? OFFSET ?""",
+                (collection, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_document_registry(path: str) -> DocumentRegistry:
+    """Return the process-wide registry for a path, shared by every VectorStore using it."""
+    path = os.path.abspath(path)
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = DocumentRegistry(path)
+        return _registries[path]
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import hashlib
+import os
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model name, SHA-256 of the text).
+
+    Vectors are stored as float32 blobs in SQLite, with a bounded in-memory LRU in front
+    so hot texts (popular queries, re-ingested chunks) never touch the disk.
+    """
+
+    # SQLite's default limit on host parameters per statement is 999
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: str, max_memory_items: int = 20000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None where the text has not been embedded yet."""
+        hashes = [self._hash_text(text) for text in texts]
+        results = [None] * len(texts)
+
+        with self._lock:
+            disk_lookup = {}
+            for i, text_hash in enumerate(hashes):
+                key = (model, text_hash)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self._stats['memory_hits'] += 1
+                else:
+                    disk_lookup.setdefault(text_hash, []).append(i)
+
+            pending = list(disk_lookup)
+            for start in range(0, len(pending), self._LOOKUP_BATCH):
+                batch = pending[start:start + self._LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember((model, text_hash), vector)
+                    for i in disk_lookup[text_hash]:
+                        results[i] = vector
+                        self._stats['disk_hits'] += 1
+
+            self._stats['misses'] += sum(1 for vector in results if vector is None)
+
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray):
+        """Store freshly computed vectors for texts."""
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                text_hash = self._hash_text(text)
+                self._remember((model, text_hash), vector)
+                rows.append((model, text_hash, vector.tobytes()))
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_items'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str, max_memory_items: int = 20000) -> EmbeddingCache:
+    """Return the process-wide cache for a path, so every VectorStore shares one LRU and connection."""
+    path = os.path.abspath(path)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path, max_memory_items)
+        return _caches[path]
@@ -0,0 +1,166 @@
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import List, Dict, Any
+import numpy as np
+
+
+# Set in each worker process by _init_worker
+_worker_backend = None
+
+
+def pin_threads(threads: int):
+    """Limit this process's BLAS and torch thread pools, so several processes can share the cores."""
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    # Tokenizers would otherwise start their own thread pool in every worker
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+
+def _init_worker(backend: str, model_name: str, file_name: str, threads: int):
+    """Pin the worker's thread pools, then load its own copy of the model."""
+    global _worker_backend
+    pin_threads(threads)
+    from embeddings import get_embedding_backend
+    _worker_backend = get_embedding_backend(backend, model_name, file_name)
+    _worker_backend.model
+
+
+def _worker_dimension() -> int:
+    return _worker_backend.dimension
+
+
+def _embed_into(shm_name: str, shape: tuple, start: int, texts: List[str], batch_size: int) -> int:
+    """Embed texts straight into rows start..start+len(texts) of the caller's shared-memory matrix."""
+    vectors = _worker_backend.encode(texts, batch_size=batch_size)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = vectors
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EmbeddingWorkerPool:
+    """
+    Embeds text batches in N worker processes, each with its own model and a fixed number of
+    torch threads, so ingest uses every core instead of one process's thread pool.
+
+    Texts go to the workers through the executor's task queue. Vectors come back through a
+    shared-memory matrix that every worker writes its rows into, instead of being pickled
+    through the result queue.
+    """
+
+    def __init__(self, backend: str, model_name: str, file_name: str = None, processes: int = None,
+                 threads_per_process: int = None, batch_size: int = 64):
+        cpus = os.cpu_count() or 1
+        self.processes = processes or cpus
+        self.threads_per_process = threads_per_process or max(1, cpus // self.processes)
+        self.batch_size = batch_size
+        self.config = (backend, model_name, file_name)
+        self._executor = None
+        self._dimension = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn, not fork: forking a process that already runs torch or Chroma threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(*self.config, self.threads_per_process)
+                    )
+        return self._executor
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self.executor.submit(_worker_dimension).result()
+        return self._dimension
+
+    def warm_up(self):
+        """Start every worker and wait for its model to load."""
+        for future in [self.executor.submit(_worker_dimension) for _ in range(self.processes)]:
+            self._dimension = future.result()
+
+    def encode(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """Embed texts across the workers into a (len(texts), dimension) float32 matrix."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        batch_size = batch_size or self.batch_size
+        # Spread even small calls over every worker, in slices no larger than batch_size
+        step = max(1, min(batch_size, math.ceil(len(texts) / self.processes)))
+        shape = (len(texts), self.dimension)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+        futures = []
+        try:
+            for start in range(0, len(texts), step):
+                futures.append(self.executor.submit(
+                    _embed_into, shm.name, shape, start, texts[start:start + step], batch_size
+                ))
+            for future in futures:
+                future.result()
+            view = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            # The one copy on this side: out of the segment before it is released
+            result = view.copy()
+            del view
+        finally:
+            # After a failed slice, the other workers may still be writing into the segment:
+            # drop the slices not started yet and let the running ones finish before freeing it
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            shm.close()
+            shm.unlink()
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'processes': self.processes,
+            'threads_per_process': self.threads_per_process,
+            'started': self._executor is not None
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_embedding_pool(backend: str, model_name: str, file_name: str = None, processes: int = None,
+                       threads_per_process: int = None, batch_size: int = 64) -> EmbeddingWorkerPool:
+    """Return the process-wide pool for a backend configuration; workers start on first use."""
+    key = (backend, model_name, file_name, processes, threads_per_process)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = EmbeddingWorkerPool(backend, model_name, file_name, processes, threads_per_process, batch_size)
+        return _pools[key]
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in list(_pools.values()):
+        pool.shutdown()
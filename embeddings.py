@@ -0,0 +1,154 @@
+import os
+import threading
+from typing import List, Dict, Any
+import numpy as np
+
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+DEFAULT_EMBEDDING_BACKEND = 'sentence-transformers'
+# Dynamically quantized (uint8, AVX2) export shipped in the all-MiniLM-L6-v2 repository
+DEFAULT_QUANTIZED_FILE = 'onnx/model_quint8_avx2.onnx'
+
+
+class EmbeddingBackend:
+    """
+    An embedding model behind a common interface: encode(), dimension, max_tokens and tokenizer.
+
+    The model is loaded on first use, so creating a backend (and reading its cache_key) is cheap
+    and fully cached embedding lookups never load it.
+    """
+
+    name = None
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, file_name: str = None):
+        self.model_name = model_name
+        self.file_name = file_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this backend produces, for the embedding cache."""
+        if self.name == DEFAULT_EMBEDDING_BACKEND:
+            # Plain model name, so caches written before backends existed stay valid
+            return self.model_name
+        return f"{self.model_name}@{self.name}" + (f":{self.file_name}" if self.file_name else "")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        raise NotImplementedError
+
+    @property
+    def dimension(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def max_tokens(self) -> int:
+        """Longest input, in model tokens, before the model truncates."""
+        raise NotImplementedError
+
+    @property
+    def tokenizer(self):
+        raise NotImplementedError
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Embed texts into a (len(texts), dimension) float32 matrix."""
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'model': self.model_name, 'file_name': self.file_name}
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """sentence-transformers running the model through PyTorch."""
+
+    name = 'sentence-transformers'
+
+    def _model_kwargs(self) -> Dict[str, Any]:
+        return {}
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name, **self._model_kwargs())
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_tokens(self) -> int:
+        return self.model.max_seq_length
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+
+
+class OnnxBackend(SentenceTransformerBackend):
+    """
+    The same model exported to ONNX and run by ONNX Runtime on CPU (sentence-transformers'
+    onnx backend; needs `optimum[onnxruntime]`). Pooling and normalization are unchanged.
+    """
+
+    name = 'onnx'
+
+    def _model_kwargs(self) -> Dict[str, Any]:
+        kwargs = {'backend': 'onnx'}
+        if self.file_name:
+            kwargs['model_kwargs'] = {'file_name': self.file_name}
+        return kwargs
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """ONNX Runtime with int8 dynamically quantized weights, the fastest option on CPU."""
+
+    name = 'onnx-int8'
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, file_name: str = None):
+        super().__init__(model_name, file_name or DEFAULT_QUANTIZED_FILE)
+
+
+BACKENDS = {
+    'sentence-transformers': SentenceTransformerBackend,
+    'torch': SentenceTransformerBackend,
+    'onnx': OnnxBackend,
+    'onnx-int8': QuantizedOnnxBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(backend: str = None, model_name: str = None, file_name: str = None) -> EmbeddingBackend:
+    """
+    Return the process-wide backend for a configuration. Unset arguments fall back to the
+    EMBEDDING_BACKEND, EMBEDDING_MODEL and EMBEDDING_ONNX_FILE environment variables.
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND") or DEFAULT_EMBEDDING_BACKEND
+    model_name = model_name or os.getenv("EMBEDDING_MODEL") or DEFAULT_EMBEDDING_MODEL
+    file_name = file_name or os.getenv("EMBEDDING_ONNX_FILE") or None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (choose from {', '.join(BACKENDS)})")
+    if not issubclass(BACKENDS[backend], OnnxBackend):
+        file_name = None
+
+    key = (BACKENDS[backend].name, model_name, file_name)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BACKENDS[backend](model_name, file_name)
+        return _backends[key]
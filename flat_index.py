@@ -0,0 +1,403 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+_COMPARISONS = {'$eq': '=', '$ne': '!=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+# Metadata fields with an expression index; writes and scoped searches filter on them
+INDEXED_FIELDS = ("parent_doc_id", "source")
+
+
+def _metadata_field(key: str) -> str:
+    """SQL for one metadata field. The JSON path is inlined, not bound, so SQLite can match it to an index."""
+    path = '$."' + key.replace('"', '\\"') + '"'
+    return "json_extract(metadata, '" + path.replace("'", "''") + "')"
+
+
+def where_to_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma metadata filter into a SQL condition over the JSON metadata column."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ('$and', '$or'):
+            parts = [where_to_sql(sub) for sub in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, sub_params in parts for param in sub_params)
+            continue
+
+        field = _metadata_field(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for op, value in condition.items():
+            if op in _COMPARISONS:
+                clauses.append(f"{field} {_COMPARISONS[op]} ?")
+                params.append(value)
+            elif op in ('$in', '$nin'):
+                if not value:
+                    clauses.append("0" if op == '$in' else "1")
+                    continue
+                clauses.append(f"{field} {'NOT ' if op == '$nin' else ''}IN ({','.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+    return "(" + " AND ".join(clauses or ["1"]) + ")", params
+
+
+def where_document_to_sql(where_document: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma document filter ($contains / $not_contains, $and / $or) into SQL."""
+    clauses, params = [], []
+    for op, value in where_document.items():
+        if op in ('$and', '$or'):
+            parts = [where_document_to_sql(sub) for sub in value]
+            clauses.append("(" + f" {op[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, sub_params in parts for param in sub_params)
+        elif op == '$contains':
+            clauses.append("instr(document, ?) > 0")
+            params.append(value)
+        elif op == '$not_contains':
+            clauses.append("instr(document, ?) = 0")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported where_document operator: {op}")
+    return "(" + " AND ".join(clauses or ["1"]) + ")", params
+
+
+class FlatCollection:
+    """
+    Exact-search collection without Chroma: normalized float32 embeddings in a memory-mapped
+    NumPy array, chunk ids, documents and metadata in a parallel SQLite table.
+
+    Queries are one matrix product over all live rows (or the rows a filter selects) followed
+    by argpartition top-k, for a whole batch of queries at once. Deleted rows are tombstoned
+    and skipped; once they make up `compact_ratio` of the array it is rewritten without them.
+    Exposes the subset of the Chroma collection API that VectorStore uses, in cosine space.
+    """
+
+    metadata = {"hnsw:space": "cosine", "index": "flat"}
+
+    def __init__(self, directory: str, compact_ratio: float = 0.25, min_compact_rows: int = 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        self._path = os.path.join(directory, "vectors.bin")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        for field in INDEXED_FIELDS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS chunks_by_{field} ON chunks ({_metadata_field(field)})")
+        self._conn.commit()
+        self._finish_compaction()
+
+        dim = self._meta("dim")
+        self.dim = int(dim) if dim is not None else None
+        self._rows = int(self._meta("rows") or 0)
+        self._vectors = None
+        self._live = np.zeros(0, dtype=bool)
+        if self.dim is not None:
+            self._open(self._rows)
+            self._live = np.zeros(len(self._vectors), dtype=bool)
+            self._live[[row for row, in self._conn.execute("SELECT row FROM chunks")]] = True
+
+    def _meta(self, key: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Any):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _open(self, capacity: int):
+        """Map the vector file, growing it (by doubling) to hold at least `capacity` rows."""
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(self._path) // row_bytes if os.path.exists(self._path) else 0
+        if self._vectors is not None and len(self._vectors) >= capacity:
+            return
+        if rows < capacity:
+            if self._vectors is not None:
+                self._vectors.flush()
+            rows = max(capacity, rows * 2, 1024)
+            with open(self._path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        self._vectors = np.memmap(self._path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        if len(self._live) < rows:
+            self._live = np.concatenate([self._live, np.zeros(rows - len(self._live), dtype=bool)])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _existing_rows(self, ids: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows.update(self._conn.execute(
+                f"SELECT chunk_id, row FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return rows
+
+    def upsert(self, ids: List[str], embeddings=None, metadatas=None, documents=None):
+        """Overwrite existing chunks in place and append new ones."""
+        if not ids:
+            return
+        embeddings = _normalize(embeddings)
+        metadatas = metadatas or [{}] * len(ids)
+        documents = documents or [None] * len(ids)
+        with self._lock, self._conn:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self._set_meta("dim", self.dim)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match collection dimension {self.dim}")
+
+            rows = self._existing_rows(ids)
+            positions = []
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                row = rows.get(chunk_id)
+                if row is None:
+                    row = rows[chunk_id] = self._rows
+                    self._rows += 1
+                    self._conn.execute(
+                        "INSERT INTO chunks (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                        (row, chunk_id, document, json.dumps(metadata or {}))
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE chunks SET document = ?, metadata = ? WHERE row = ?",
+                        (document, json.dumps(metadata or {}), row)
+                    )
+                positions.append(row)
+            self._set_meta("rows", self._rows)
+
+            self._open(self._rows)
+            positions = np.asarray(positions, dtype=np.intp)
+            self._vectors[positions] = embeddings
+            self._live[positions] = True
+
+    add = upsert
+
+    def update(self, ids: List[str], embeddings=None, metadatas=None, documents=None):
+        """Update existing chunks; metadata is merged into the stored metadata, as in Chroma."""
+        with self._lock, self._conn:
+            rows = self._existing_rows(ids)
+            for i, chunk_id in enumerate(ids):
+                row = rows.get(chunk_id)
+                if row is None:
+                    continue
+                if metadatas is not None:
+                    stored = json.loads(self._conn.execute("SELECT metadata FROM chunks WHERE row = ?", (row,)).fetchone()[0])
+                    stored.update(metadatas[i])
+                    self._conn.execute("UPDATE chunks SET metadata = ? WHERE row = ?", (json.dumps(stored), row))
+                if documents is not None:
+                    self._conn.execute("UPDATE chunks SET document = ? WHERE row = ?", (documents[i], row))
+                if embeddings is not None:
+                    self._vectors[row] = _normalize(embeddings[i])
+
+    def _select(self, columns: str, ids: List[str] = None, where: Dict[str, Any] = None,
+                where_document: Dict[str, Any] = None, limit: int = None, offset: int = None) -> List[tuple]:
+        clauses, params = [], []
+        if ids is not None:
+            if not ids:
+                return []
+            clauses.append(f"chunk_id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            sql, where_params = where_to_sql(where)
+            clauses.append(sql)
+            params.extend(where_params)
+        if where_document:
+            sql, document_params = where_document_to_sql(where_document)
+            clauses.append(sql)
+            params.extend(document_params)
+        query = f"SELECT {columns} FROM chunks"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        return self._conn.execute(query, params).fetchall()
+
+    def delete(self, ids: List[str] = None, where: Dict[str, Any] = None, where_document: Dict[str, Any] = None):
+        """Tombstone chunks; compacts the vector file once enough rows are dead."""
+        with self._lock, self._conn:
+            rows = [row for row, in self._select("row", ids, where, where_document)]
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                self._conn.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+            self._live[rows] = False
+        dead = self._rows - self.count()
+        if dead >= self.min_compact_rows and dead >= self.compact_ratio * self._rows:
+            self.compact()
+
+    def _finish_compaction(self):
+        """
+        Complete or undo a compaction that stopped part-way. The renumbered rows are committed
+        together with a "compacting" marker before the compacted file replaces the old one, so
+        with the marker set the compacted file is the right one; without it, it is discarded.
+        """
+        compacted_path = self._path + ".compact"
+        if self._meta("compacting") is not None:
+            if os.path.exists(compacted_path):
+                os.replace(compacted_path, self._path)
+            with self._conn:
+                self._conn.execute("DELETE FROM meta WHERE key = 'compacting'")
+        elif os.path.exists(compacted_path):
+            os.remove(compacted_path)
+
+    def compact(self) -> Dict[str, int]:
+        """Rewrite the vector file with only live rows, renumbering them in order."""
+        with self._lock:
+            before = self._rows
+            if self.dim is None:
+                return {'rows_before': 0, 'rows_after': 0}
+            live = [row for row, in self._conn.execute("SELECT row FROM chunks ORDER BY row")]
+            compacted_path = self._path + ".compact"
+            compacted = np.memmap(compacted_path, dtype=np.float32, mode="w+", shape=(max(len(live), 1), self.dim))
+            for start in range(0, len(live), 65536):
+                batch = np.asarray(live[start:start + 65536], dtype=np.intp)
+                compacted[start:start + len(batch)] = self._vectors[batch]
+            compacted.flush()
+            del compacted
+
+            with self._conn:
+                # Ascending order never collides: each new row number is at most the old one
+                self._conn.executemany("UPDATE chunks SET row = ? WHERE row = ?", [(new, old) for new, old in enumerate(live) if new != old])
+                self._set_meta("rows", len(live))
+                self._set_meta("compacting", 1)
+            self._rows = len(live)
+            self._vectors = None
+            self._finish_compaction()
+
+            self._live = np.zeros(0, dtype=bool)
+            self._open(self._rows)
+            self._live[:self._rows] = True
+        return {'rows_before': before, 'rows_after': self._rows}
+
+    def vacuum(self):
+        """Reclaim the space of deleted rows in the SQLite table."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            # The database is in WAL mode: copy the rewritten pages back and truncate the -wal file
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get(self, ids: List[str] = None, where: Dict[str, Any] = None, limit: int = None, offset: int = None,
+            where_document: Dict[str, Any] = None, include: List[str] = ("metadatas", "documents")) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._select("row, chunk_id, document, metadata", ids, where, where_document, limit, offset)
+            return {
+                'ids': [row[1] for row in rows],
+                'documents': [row[2] for row in rows] if "documents" in include else None,
+                'metadatas': [json.loads(row[3]) for row in rows] if "metadatas" in include else None,
+                'embeddings': (
+                    np.asarray(self._vectors[[row[0] for row in rows]]) if "embeddings" in include and rows else
+                    ([] if "embeddings" in include else None)
+                )
+            }
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict[str, Any] = None,
+              where_document: Dict[str, Any] = None,
+              include: List[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        """Exact cosine top-k for a batch of query embeddings."""
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': None}
+        with self._lock:
+            rows = None
+            if self.dim is None:
+                k = 0
+            elif where or where_document:
+                rows = np.asarray([row for row, in self._select("row", None, where, where_document)], dtype=np.intp)
+                k = min(n_results, len(rows))
+            else:
+                live = self._live[:self._rows]
+                k = min(n_results, int(np.count_nonzero(live)))
+
+            if k == 0:
+                for _ in queries:
+                    for key in ('ids', 'documents', 'metadatas', 'distances'):
+                        results[key].append([])
+                return results
+
+            if rows is None:
+                # Multiply against the contiguous mapped matrix; indexing it with the live rows
+                # would copy every live vector on each query. Deleted rows are ranked last.
+                scores = self._vectors[:self._rows] @ queries.T
+                scores[~live] = -np.inf
+            else:
+                scores = np.asarray(self._vectors[rows]) @ queries.T
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+            top_scores = np.take_along_axis(scores, top, axis=0)
+            order = np.argsort(-top_scores, axis=0)
+            top = np.take_along_axis(top, order, axis=0)
+            top_scores = np.take_along_axis(top_scores, order, axis=0)
+            if rows is not None:
+                top = rows[top]
+
+            wanted = sorted({int(row) for row in top.ravel()})
+            stored = {}
+            for start in range(0, len(wanted), 500):
+                batch = wanted[start:start + 500]
+                for row, chunk_id, document, metadata in self._conn.execute(
+                        f"SELECT row, chunk_id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})",
+                        batch):
+                    stored[row] = (chunk_id, document, json.loads(metadata))
+
+        for j in range(len(queries)):
+            hits = [stored[int(row)] for row in top[:, j]]
+            results['ids'].append([hit[0] for hit in hits])
+            results['documents'].append([hit[1] for hit in hits])
+            results['metadatas'].append([hit[2] for hit in hits])
+            results['distances'].append([float(1.0 - score) for score in top_scores[:, j]])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = self.count()
+            return {
+                'index': 'flat',
+                'chunks': live,
+                'tombstones': self._rows - live,
+                'disk_bytes': os.path.getsize(self._path) if os.path.exists(self._path) else 0
+            }
+
+
+_flat_collections = {}
+_flat_collections_lock = threading.Lock()
+
+
+def get_flat_collection(directory: str) -> FlatCollection:
+    """Return the process-wide flat collection in a directory."""
+    directory = os.path.abspath(directory)
+    with _flat_collections_lock:
+        if directory not in _flat_collections:
+            _flat_collections[directory] = FlatCollection(directory)
+        return _flat_collections[directory]
+
+
+def release_flat_collection(directory: str):
+    """Forget the process-wide flat collection in a directory, flushing its vectors."""
+    with _flat_collections_lock:
+        collection = _flat_collections.pop(os.path.abspath(directory), None)
+    if collection is not None:
+        with collection._lock:
+            if collection._vectors is not None:
+                collection._vectors.flush()
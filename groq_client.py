@@ -1,16 +1,146 @@
-from groq import Groq
 import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 load_dotenv()
 
 
+# One pooled HTTP client and one concurrency limiter per process, shared by every GroqClient
+_shared_lock = threading.Lock()
+_http_client = None
+_request_semaphores = {}
+
+
+def get_http_client(max_connections: int = 20, max_keepalive_connections: int = 10):
+    global _http_client
+    with _shared_lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ))
+        return _http_client
+
+
+def get_request_semaphore(max_concurrency: int) -> threading.BoundedSemaphore:
+    with _shared_lock:
+        if max_concurrency not in _request_semaphores:
+            _request_semaphores[max_concurrency] = threading.BoundedSemaphore(max_concurrency)
+        return _request_semaphores[max_concurrency]
+
+
+def _parse_duration(value: str) -> float:
+    """Parse Groq's reset durations such as "7.66s", "2m59.56s" or "120ms" into seconds."""
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return float(value)
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def rate_limit_delay(headers: Any) -> float:
+    """Seconds the server asked us to wait, from retry-after or the x-ratelimit-reset-* headers."""
+    if not headers:
+        return None
+    
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    
+    delays = []
+    for kind in ("requests", "tokens"):
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if reset and headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            try:
+                delays.append(_parse_duration(reset))
+            except ValueError:
+                pass
+    return max(delays) if delays else None
+
+
 class GroqClient:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    def __init__(self, timeout: float = None, max_retries: int = None, max_concurrency: int = None,
+                 base_url: str = None):
+        """
+        Args:
+            timeout: Per-request timeout in seconds (env GROQ_TIMEOUT, default 60)
+            max_retries: Retries on 429, 5xx, timeouts and connection errors (env GROQ_MAX_RETRIES, default 4)
+            max_concurrency: Maximum in-flight requests per process (env GROQ_MAX_CONCURRENCY, default 8)
+            base_url: API base URL, e.g. a local fake endpoint for tests (env GROQ_BASE_URL)
+        """
+        # Imported here so importing this module (e.g. for `cli_chat.py --help`) stays cheap
+        from groq import Groq
+        self.timeout = timeout if timeout is not None else float(os.getenv("GROQ_TIMEOUT", "60"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GROQ_MAX_RETRIES", "4"))
+        max_concurrency = max_concurrency or int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+        self.backoff_base = 0.5
+        self.backoff_max = 30.0
+        
+        # Retries are handled here, with jitter and rate-limit headers, instead of in the SDK
+        self.client = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=base_url or os.getenv("GROQ_BASE_URL") or None,
+            timeout=self.timeout,
+            max_retries=0,
+            http_client=get_http_client()
+        )
+        self._semaphore = get_request_semaphore(max_concurrency)
         self.model = "deepseek-r1-distill-llama-70b"
     
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """How long to wait before retrying after `error`, or None if it should not be retried."""
+        from groq import APIStatusError, APIConnectionError
+        
+        server_delay = None
+        if isinstance(error, APIStatusError):
+            if error.status_code != 429 and error.status_code < 500:
+                return None
+            server_delay = rate_limit_delay(error.response.headers)
+        elif not isinstance(error, APIConnectionError):
+            return None
+        
+        if server_delay is not None and server_delay > self.backoff_max:
+            return None
+        
+        # Exponential backoff with full jitter, never shorter than what the server asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, server_delay or 0.0)
+    
+    def _create(self, **kwargs) -> Any:
+        """
+        Send a request, retrying as _retry_delay allows. A concurrency slot is held for each
+        attempt but released while backing off, so a rate-limited request does not block others.
+        A stream keeps its slot on success; the caller releases it once the stream is consumed.
+        """
+        attempt = 0
+        while True:
+            self._semaphore.acquire()
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self._semaphore.release()
+                delay = self._retry_delay(e, attempt) if attempt < self.max_retries else None
+                if delay is None:
+                    raise
+            else:
+                if not kwargs.get("stream"):
+                    self._semaphore.release()
+                return response
+            time.sleep(delay)
+            attempt += 1
+    
     def chat_completion(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Create a chat completion with the Groq API using Deepseek model.
@@ -23,23 +153,48 @@ class GroqClient:
             The response from the API
         """
         try:
-            kwargs = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 2048
-            }
-            
-            if tools:
-                kwargs["tools"] = tools
-                kwargs["tool_choice"] = "auto"
-            
-            response = self.client.chat.completions.create(**kwargs)
-            return response
+            return self._create(**self._completion_kwargs(messages, tools))
         except Exception as e:
             print(f"Error in chat completion: {e}")
             return None
     
+    def _completion_kwargs(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 2048
+        }
+        
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+        
+        return kwargs
+    
+    def chat_completion_stream(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Create a streaming chat completion.
+        
+        Args:
+            messages: List of message dictionaries
+            tools: Optional list of tools for function calling
+        
+        Yields:
+            The raw stream chunks as they arrive, so callers can read both content and tool call deltas.
+            Yields nothing if the request fails.
+        """
+        try:
+            stream = self._create(stream=True, **self._completion_kwargs(messages, tools))
+            # The concurrency slot is held until the stream is fully consumed
+            try:
+                for chunk in stream:
+                    yield chunk
+            finally:
+                self._semaphore.release()
+        except Exception as e:
+            print(f"Error in chat completion: {e}")
+    
     def generate_response(self, user_message: str, context: str = None) -> str:
         """
         Generate a response to a user message, optionally with context.
@@ -51,6 +206,34 @@ class GroqClient:
         Returns:
             The generated response
         """
+        response = self.chat_completion(self._response_messages(user_message, context))
+        
+        if response and response.choices:
+            return response.choices[0].message.content
+        else:
+            return "I'm sorry, I couldn't generate a response at this time."
+    
+    def generate_response_stream(self, user_message: str, context: str = None) -> Iterator[str]:
+        """
+        Streaming variant of generate_response.
+        
+        Args:
+            user_message: The user's message
+            context: Optional context from vector search
+        
+        Yields:
+            Pieces of the response text as they are generated
+        """
+        produced = False
+        for chunk in self.chat_completion_stream(self._response_messages(user_message, context)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                produced = True
+                yield chunk.choices[0].delta.content
+        
+        if not produced:
+            yield "I'm sorry, I couldn't generate a response at this time."
+    
+    def _response_messages(self, user_message: str, context: str = None) -> List[Dict[str, str]]:
         messages = []
         
         if context:
@@ -66,10 +249,4 @@ If the context doesn't contain relevant information, say so and provide a genera
             messages.append({"role": "system", "content": "You are a helpful AI assistant."})
         
         messages.append({"role": "user", "content": user_message})
-        
-        response = self.chat_completion(messages)
-        
-        if response and response.choices:
-            return response.choices[0].message.content
-        else:
-            return "I'm sorry, I couldn't generate a response at this time."
\ No newline at end of file
+        return messages
\ No newline at end of file
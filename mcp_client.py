@@ -1,17 +1,27 @@
-from mcp.server.fastmcp import FastMCP
 from groq_client import GroqClient
 import json
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 import subprocess
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 class MCPClient:
-    def __init__(self):
+    def __init__(self, max_parallel_tools: int = 4, max_steps: int = 4, max_seconds: float = 60.0,
+                 max_tokens: int = None, collection: str = None, namespace: str = None):
         self.groq_client = GroqClient()
+        # Applied to every tool call: the namespace is fixed per client (tenant), the collection
+        # is the default when the model does not name one
+        self.collection = collection
+        self.namespace = namespace
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.last_run = None
         self.server_process = None
+        self._search_executor = ThreadPoolExecutor(max_workers=max_parallel_tools, thread_name_prefix="mcp-tool")
         self.tools = [
             {
                 "type": "function",
@@ -29,12 +39,87 @@ class MCPClient:
                                 "type": "integer",
                                 "description": "Number of results to return (default: 5)",
                                 "default": 5
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": ["vector", "keyword", "hybrid"],
+                                "description": "vector for semantic search, keyword for exact terms (BM25), hybrid to combine both. Use hybrid or keyword for identifiers, error codes and rare names (default: vector)",
+                                "default": "vector"
+                            },
+                            "rerank": {
+                                "type": "boolean",
+                                "description": "Re-order candidates with a cross-encoder for more precise results (slower; default: false)",
+                                "default": False
+                            },
+                            "packed": {
+                                "type": "boolean",
+                                "description": "Return a single compact context with neighboring chunks merged and duplicate text removed (default: false)",
+                                "default": False
+                            },
+                            "source": {
+                                "type": "string",
+                                "description": "Only search documents from this source (e.g. a file path)"
+                            },
+                            "title": {
+                                "type": "string",
+                                "description": "Only search documents with this exact title"
+                            },
+                            "doc_type": {
+                                "type": "string",
+                                "description": "Only search documents of this type (e.g. file)"
+                            },
+                            "after": {
+                                "type": "string",
+                                "description": "Only search documents added at or after this ISO 8601 time"
+                            },
+                            "before": {
+                                "type": "string",
+                                "description": "Only search documents added at or before this ISO 8601 time"
+                            },
+                            "collections": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Search these collections together instead of the default one (see list_collections)"
                             }
                         },
                         "required": ["query"]
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "search_documents_batch",
+                    "description": "Search for several queries in one call (e.g. sub-questions of a complex question)",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "queries": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "The search query strings"
+                            },
+                            "n_results": {
+                                "type": "integer",
+                                "description": "Number of results to return per query (default: 5)",
+                                "default": 5
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": ["vector", "keyword", "hybrid"],
+                                "description": "vector for semantic search, keyword for exact terms (BM25), hybrid to combine both (default: vector)",
+                                "default": "vector"
+                            },
+                            "fuse": {
+                                "type": "string",
+                                "enum": ["union", "rrf"],
+                                "description": "Also return one combined result list: union (de-duplicated) or rrf (rank fusion)"
+                            }
+                        },
+                        "required": ["queries"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -81,6 +166,28 @@ class MCPClient:
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "add_directory",
+                    "description": "Add every file in a directory matching a glob pattern to the vector store",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "directory": {
+                                "type": "string",
+                                "description": "Directory to scan"
+                            },
+                            "pattern": {
+                                "type": "string",
+                                "description": "Glob pattern relative to the directory (default: **/*)",
+                                "default": "**/*"
+                            }
+                        },
+                        "required": ["directory"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -91,36 +198,146 @@ class MCPClient:
                         "properties": {}
                     }
                 }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "list_documents",
+                    "description": "List stored documents (id, title, source, size), most recently added first",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "offset": {
+                                "type": "integer",
+                                "description": "Number of documents to skip (default: 0)",
+                                "default": 0
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Maximum number of documents to return (default: 50)",
+                                "default": 50
+                            }
+                        }
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "list_collections",
+                    "description": "List the document collections available for searching",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {}
+                    }
+                }
             }
         ]
     
+    def warm_up(self, background: bool = True):
+        """
+        Import the MCP server module and load its vector store, so the first tool call
+        does not pay for model loading. Runs on a daemon thread by default.
+        """
+        if background:
+            thread = threading.Thread(target=self.warm_up, args=(False,), name="mcp-warm-up", daemon=True)
+            thread.start()
+            return thread
+        
+        try:
+            import mcp_server
+            mcp_server.warm_up(background=False)
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+    
     def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
         """Execute a tool function by importing and calling it directly."""
         try:
             from mcp_server import (
-                search_documents, add_document, add_file, 
-                get_collection_info, delete_document
+                search_documents, search_documents_batch, add_document, add_file, add_directory,
+                get_collection_info, list_documents, delete_document, list_collections, delete_documents, vacuum
             )
             
+            arguments = dict(arguments)
+            if self.namespace is not None:
+                arguments["namespace"] = self.namespace
+            if self.collection is not None and tool_name != "list_collections" and not arguments.get("collections"):
+                arguments.setdefault("collection", self.collection)
+            
             if tool_name == "search_documents":
                 return search_documents(**arguments)
+            elif tool_name == "search_documents_batch":
+                return search_documents_batch(**arguments)
             elif tool_name == "add_document":
                 return add_document(**arguments)
             elif tool_name == "add_file":
                 return add_file(**arguments)
+            elif tool_name == "add_directory":
+                return add_directory(**arguments)
             elif tool_name == "get_collection_info":
-                return get_collection_info()
+                return get_collection_info(**arguments)
+            elif tool_name == "list_documents":
+                return list_documents(**arguments)
             elif tool_name == "delete_document":
                 return delete_document(**arguments)
+            elif tool_name == "list_collections":
+                return list_collections(**arguments)
+            elif tool_name == "delete_documents":
+                return delete_documents(**arguments)
+            elif tool_name == "vacuum":
+                return vacuum(**arguments)
             else:
                 return json.dumps({"success": False, "error": f"Unknown tool: {tool_name}"})
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)})
     
-    def chat_with_tools(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> str:
-        """
-        Chat with the user, using MCP tools when needed.
-        """
+    # Read-only tools that are safe to run side by side; they get their own thread pool so
+    # slow ingest calls in the same turn cannot starve them
+    PARALLEL_TOOLS = {"search_documents", "search_documents_batch", "get_collection_info", "list_documents",
+                      "list_collections"}
+    
+    async def aexecute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Execute a tool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        if tool_name in self.PARALLEL_TOOLS:
+            return await loop.run_in_executor(self._search_executor, self.execute_tool, tool_name, arguments)
+        return await asyncio.to_thread(self.execute_tool, tool_name, arguments)
+    
+    async def _aexecute_tool_call(self, tool_call: Dict[str, Any]) -> str:
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            return json.dumps({"success": False, "error": f"Invalid tool arguments: {e}"})
+        return await self.aexecute_tool(tool_call["function"]["name"], arguments)
+    
+    async def aexecute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """Run all tool calls of one model turn concurrently; results keep the order of `tool_calls`."""
+        return list(await asyncio.gather(*(self._aexecute_tool_call(tool_call) for tool_call in tool_calls)))
+    
+    @staticmethod
+    def _tool_call_to_dict(tool_call: Any) -> Dict[str, Any]:
+        return {
+            "id": tool_call.id,
+            "type": "function",
+            "function": {
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments
+            }
+        }
+    
+    @staticmethod
+    def _tool_messages(tool_calls: List[Dict[str, Any]], results: List[str], content: str = None) -> List[Dict[str, Any]]:
+        """The assistant turn that requested the tools (with any text it said first), then one tool message per call."""
+        messages = [{"role": "assistant", "content": content or None, "tool_calls": tool_calls}]
+        for tool_call, result in zip(tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": result
+            })
+        return messages
+    
+    def _build_messages(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         if conversation_history is None:
             conversation_history = []
         
@@ -131,51 +348,255 @@ You can search for documents, add new documents, and manage the knowledge base.
 
 Available tools:
 - search_documents: Search for relevant documents in the vector store
+- search_documents_batch: Search for several queries in one call
 - add_document: Add new document content to the vector store  
 - add_file: Add a file's content to the vector store
+- add_directory: Add all matching files in a directory to the vector store
 - get_collection_info: Get information about the vector store
+- list_documents: List the stored documents
+- list_collections: List the document collections; search_documents can search several at once
 
 Use these tools to help answer user questions by:
 1. First searching for relevant information when users ask questions
 2. Adding documents when users want to store information
 3. Providing informed responses based on the retrieved context
 
+If the first results are not good enough, you may call the tools again with a refined query before answering.
+
 Be helpful and use the tools appropriately to provide the best possible assistance."""
         }
         
-        messages = [system_message] + conversation_history + [{"role": "user", "content": user_message}]
+        return [system_message] + conversation_history + [{"role": "user", "content": user_message}]
+    
+    @staticmethod
+    def _usage_tokens(response: Any) -> int:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            # Groq reports usage of a streamed completion on the last chunk's x_groq field
+            usage = getattr(getattr(response, "x_groq", None), "usage", None)
+        return getattr(usage, "total_tokens", 0) or 0
+    
+    async def _atimed_tool_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result = await self._aexecute_tool_call(tool_call)
+        return {
+            "name": tool_call["function"]["name"],
+            "result": result,
+            "seconds": round(time.perf_counter() - started, 4),
+            "output_bytes": len(result.encode("utf-8"))
+        }
+    
+    async def _atimed_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(self._atimed_tool_call(tool_call) for tool_call in tool_calls)))
+    
+    def _budget_exhausted(self, started: float, total_tokens: int, max_seconds: float, max_tokens: int) -> str:
+        if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+            return "max_seconds"
+        if max_tokens is not None and total_tokens >= max_tokens:
+            return "max_tokens"
+        return None
+    
+    async def arun_agent(self, user_message: str, conversation_history: List[Dict[str, str]] = None,
+                         max_steps: int = None, max_seconds: float = None, max_tokens: int = None) -> Dict[str, Any]:
+        """
+        Run the tool-using agent loop. Each step is one LLM call; if it requests tools they are
+        executed concurrently and the loop continues, so the model can refine its searches.
+        When the step, wall-clock or token budget runs out, a final completion without tools
+        forces an answer.
+        
+        Args:
+            user_message: The user's message
+            conversation_history: Previous user/assistant messages
+            max_steps: Maximum number of tool rounds (default: self.max_steps)
+            max_seconds: Wall-clock budget for the whole turn (default: self.max_seconds)
+            max_tokens: Budget of total LLM tokens for the turn (default: self.max_tokens)
         
-        response = self.groq_client.chat_completion(messages, self.tools)
+        Returns:
+            Dictionary with the answer, the stop reason and a per-step timing breakdown
+            (LLM latency, tool latency, tool output bytes and tokens)
+        """
+        max_steps = self.max_steps if max_steps is None else max_steps
+        max_seconds = self.max_seconds if max_seconds is None else max_seconds
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
         
-        if not response or not response.choices:
-            return "I'm sorry, I couldn't process your request."
+        messages = self._build_messages(user_message, conversation_history)
+        started = time.perf_counter()
+        steps = []
+        total_tokens = 0
+        answer = None
+        last_tools = []
+        stop_reason = "max_steps"
         
-        message = response.choices[0].message
+        for step in range(1, max_steps + 2):
+            # One step past max_steps is the forced final answer without tools
+            final = step > max_steps or stop_reason != "max_steps"
+            
+            llm_started = time.perf_counter()
+            response = await asyncio.to_thread(
+                self.groq_client.chat_completion, messages, None if final else self.tools
+            )
+            llm_seconds = time.perf_counter() - llm_started
+            tokens = self._usage_tokens(response)
+            total_tokens += tokens
+            record = {
+                "step": step,
+                "llm_seconds": round(llm_seconds, 4),
+                "tool_seconds": 0.0,
+                "tool_output_bytes": 0,
+                "tokens": tokens,
+                "tools": []
+            }
+            steps.append(record)
+            
+            if not response or not response.choices:
+                if not final or not last_tools:
+                    stop_reason = "error"
+                    answer = "I'm sorry, I couldn't process your request."
+                else:
+                    answer = f"Tool executed successfully:\n\n" + "\n\n".join(
+                        f"Tool: {tool['name']}\nResult: {tool['result']}" for tool in last_tools)
+                break
+            
+            message = response.choices[0].message
+            if final or not message.tool_calls:
+                if not final:
+                    stop_reason = "answer"
+                answer = message.content
+                break
+            
+            tool_calls = [self._tool_call_to_dict(tool_call) for tool_call in message.tool_calls]
+            tools_started = time.perf_counter()
+            last_tools = await self._atimed_tool_calls(tool_calls)
+            record["tool_seconds"] = round(time.perf_counter() - tools_started, 4)
+            record["tool_output_bytes"] = sum(tool["output_bytes"] for tool in last_tools)
+            record["tools"] = [{key: tool[key] for key in ("name", "seconds", "output_bytes")} for tool in last_tools]
+            messages.extend(self._tool_messages(tool_calls, [tool["result"] for tool in last_tools], message.content))
+            
+            stop_reason = self._budget_exhausted(started, total_tokens, max_seconds, max_tokens) or stop_reason
         
-        if message.tool_calls:
-            tool_responses = []
-            for tool_call in message.tool_calls:
-                tool_name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-                
-                tool_result = self.execute_tool(tool_name, arguments)
-                tool_responses.append(f"Tool: {tool_name}\nResult: {tool_result}")
-                
-                messages.append({
-                    "role": "assistant", 
-                    "content": None,
-                    "tool_calls": [tool_call.dict()]
-                })
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": tool_result
-                })
+        self.last_run = self._run_summary(answer, stop_reason, steps, started, total_tokens)
+        return self.last_run
+    
+    @staticmethod
+    def _run_summary(answer: str, stop_reason: str, steps: List[Dict[str, Any]], started: float,
+                     total_tokens: int) -> Dict[str, Any]:
+        return {
+            "answer": answer,
+            "stop_reason": stop_reason,
+            "steps": steps,
+            "total_seconds": round(time.perf_counter() - started, 4),
+            "llm_seconds": round(sum(step["llm_seconds"] for step in steps), 4),
+            "tool_seconds": round(sum(step["tool_seconds"] for step in steps), 4),
+            "tool_output_bytes": sum(step["tool_output_bytes"] for step in steps),
+            "total_tokens": total_tokens
+        }
+    
+    def run_agent(self, user_message: str, conversation_history: List[Dict[str, str]] = None,
+                  max_steps: int = None, max_seconds: float = None, max_tokens: int = None) -> Dict[str, Any]:
+        """Synchronous wrapper around arun_agent."""
+        return asyncio.run(self.arun_agent(user_message, conversation_history, max_steps, max_seconds, max_tokens))
+    
+    def chat_with_tools(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> str:
+        """
+        Chat with the user, using MCP tools when needed.
+        """
+        return self.run_agent(user_message, conversation_history)["answer"]
+    
+    async def achat_with_tools(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> str:
+        """
+        Async variant of chat_with_tools. Independent tool calls requested in the same turn
+        are dispatched concurrently, so a turn with several searches costs the latency of the
+        slowest one rather than their sum.
+        """
+        return (await self.arun_agent(user_message, conversation_history))["answer"]
+    
+    def chat_with_tools_stream(self, user_message: str, conversation_history: List[Dict[str, str]] = None,
+                               max_steps: int = None, max_seconds: float = None,
+                               max_tokens: int = None) -> Iterator[str]:
+        """
+        Streaming variant of chat_with_tools. Runs the same multi-round agent loop, but every
+        completion is streamed: answer text is yielded as soon as it arrives and tool call
+        deltas are assembled until the tools can run. The run summary of run_agent, with the
+        time to first token of each step, is stored in `self.last_run` when the stream ends.
+        """
+        max_steps = self.max_steps if max_steps is None else max_steps
+        max_seconds = self.max_seconds if max_seconds is None else max_seconds
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        
+        messages = self._build_messages(user_message, conversation_history)
+        started = time.perf_counter()
+        steps = []
+        total_tokens = 0
+        answer = []
+        last_tools = []
+        stop_reason = "max_steps"
+        
+        for step in range(1, max_steps + 2):
+            final = step > max_steps or stop_reason != "max_steps"
             
-            final_response = self.groq_client.chat_completion(messages)
-            if final_response and final_response.choices:
-                return final_response.choices[0].message.content
-            else:
-                return f"Tool executed successfully:\n\n" + "\n\n".join(tool_responses)
-        else:
-            return message.content
\ No newline at end of file
+            llm_started = time.perf_counter()
+            first_token_seconds = None
+            tokens = 0
+            content = []
+            tool_calls = {}
+            for chunk in self.groq_client.chat_completion_stream(messages, None if final else self.tools):
+                tokens = self._usage_tokens(chunk) or tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    if first_token_seconds is None:
+                        first_token_seconds = round(time.perf_counter() - llm_started, 4)
+                    content.append(delta.content)
+                    yield delta.content
+                for tool_delta in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tool_delta.index, {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if tool_delta.id:
+                        call["id"] = tool_delta.id
+                    if tool_delta.function and tool_delta.function.name:
+                        call["function"]["name"] += tool_delta.function.name
+                    if tool_delta.function and tool_delta.function.arguments:
+                        call["function"]["arguments"] += tool_delta.function.arguments
+            
+            total_tokens += tokens
+            record = {
+                "step": step,
+                "llm_seconds": round(time.perf_counter() - llm_started, 4),
+                "first_token_seconds": first_token_seconds,
+                "tool_seconds": 0.0,
+                "tool_output_bytes": 0,
+                "tokens": tokens,
+                "tools": []
+            }
+            steps.append(record)
+            answer.extend(content)
+            
+            if final or not tool_calls:
+                if not content:
+                    if final and last_tools:
+                        fallback = f"Tool executed successfully:\n\n" + "\n\n".join(
+                            f"Tool: {tool['name']}\nResult: {tool['result']}" for tool in last_tools)
+                    else:
+                        stop_reason = "error"
+                        fallback = "I'm sorry, I couldn't process your request."
+                    answer.append(fallback)
+                    yield fallback
+                elif not final:
+                    stop_reason = "answer"
+                break
+            
+            tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            tools_started = time.perf_counter()
+            last_tools = asyncio.run(self._atimed_tool_calls(tool_calls))
+            record["tool_seconds"] = round(time.perf_counter() - tools_started, 4)
+            record["tool_output_bytes"] = sum(tool["output_bytes"] for tool in last_tools)
+            record["tools"] = [{key: tool[key] for key in ("name", "seconds", "output_bytes")} for tool in last_tools]
+            messages.extend(self._tool_messages(tool_calls, [tool["result"] for tool in last_tools], "".join(content)))
+            
+            stop_reason = self._budget_exhausted(started, total_tokens, max_seconds, max_tokens) or stop_reason
+        
+        self.last_run = self._run_summary("".join(answer), stop_reason, steps, started, total_tokens)
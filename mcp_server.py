@@ -1,34 +1,93 @@
 from mcp.server.fastmcp import FastMCP
 from vector_store import VectorStore
+from store_pool import VectorStorePool
 import json
 from typing import Dict, Any, List
+import glob
 import os
+import sys
+import threading
 
 print("Initializing FastMCP server...")
 mcp = FastMCP("RAG Vector Store Server")
 
-print("Initializing vector store...")
-vector_store = VectorStore()
-print("Vector store initialized successfully")
+# Vector stores (embedding model + Chroma client) are opened on first use so the server can
+# answer list_tools immediately; warm_up() preloads the default one in the background. Every
+# tool takes a collection and namespace and leases that collection's handle for the call;
+# at most RAG_MAX_OPEN_COLLECTIONS idle handles stay open.
+_store_pool = None
+_store_pool_lock = threading.Lock()
+
+
+def get_store_pool() -> VectorStorePool:
+    global _store_pool
+    if _store_pool is None:
+        with _store_pool_lock:
+            if _store_pool is None:
+                _store_pool = VectorStorePool(
+                    persist_directory=os.getenv("RAG_PERSIST_DIRECTORY", "./chroma_db"),
+                    max_open=int(os.getenv("RAG_MAX_OPEN_COLLECTIONS", "16")),
+                    # RAG_SHARDS=N serves every collection from N shard processes (sharded_store.py)
+                    num_shards=int(os.getenv("RAG_SHARDS", "0"))
+                )
+    return _store_pool
+
+
+def get_vector_store(collection: str = None, namespace: str = None) -> VectorStore:
+    return get_store_pool().get(collection, namespace)
+
+
+def warm_up(background: bool = True):
+    """Create the default vector store and load its model, optionally on a background thread."""
+    return get_vector_store().warm_up(background=background)
 
 
 @mcp.tool()
-def search_documents(query: str, n_results: int = 5) -> str:
+def search_documents(query: str, n_results: int = 5, mode: str = "vector", rerank: bool = False,
+                     packed: bool = False, source: str = None, title: str = None, doc_type: str = None,
+                     after: str = None, before: str = None, where: Dict[str, Any] = None,
+                     collection: str = None, collections: List[str] = None, namespace: str = None) -> str:
     """
     Search for relevant documents in the vector store based on a query.
     
     Args:
         query: The search query string
         n_results: Number of results to return (default: 5)
+        mode: "vector" (semantic), "keyword" (BM25) or "hybrid" (both, fused) (default: vector)
+        rerank: Re-order a larger candidate pool with a cross-encoder before picking results (default: False)
+        packed: Return one merged, de-duplicated context string instead of separate chunks (default: False)
+        source: Only search documents from this source (e.g. a file path)
+        title: Only search documents with this title
+        doc_type: Only search documents of this type (e.g. "file")
+        after: Only search documents ingested at or after this ISO 8601 time
+        before: Only search documents ingested at or before this ISO 8601 time
+        where: Raw Chroma metadata filter, combined with the filters above
+        collection: Collection to search (default: documents)
+        collections: Several collections to search in parallel, with the hits merged by score
+        namespace: Namespace (tenant) the collections belong to
     
     Returns:
         JSON string containing the search results with content, metadata, and relevance scores
     """
     try:
-        results = vector_store.search(query, n_results)
+        filters = {"source": source, "title": title, "doc_type": doc_type, "after": after, "before": before, "where": where}
+        if collections is None and collection is not None:
+            collections = [collection]
+        if packed:
+            result = get_store_pool().search_context(
+                query, collections, namespace, n_candidates=n_results * 2, mode=mode, rerank=rerank, **filters
+            )
+            return json.dumps({
+                "success": True,
+                "mode": mode,
+                **result
+            }, indent=2)
+        
+        results = get_store_pool().search(query, collections, namespace, n_results, mode=mode, rerank=rerank, **filters)
         return json.dumps({
             "success": True,
             "query": query,
+            "mode": mode,
             "results": results,
             "count": len(results)
         }, indent=2)
@@ -40,14 +99,58 @@ def search_documents(query: str, n_results: int = 5) -> str:
 
 
 @mcp.tool()
-def add_document(content: str, title: str = None, source: str = None, **metadata) -> str:
+def search_documents_batch(queries: List[str], n_results: int = 5, mode: str = "vector", fuse: str = None,
+                           collection: str = None, namespace: str = None) -> str:
+    """
+    Search for several queries at once, with one embedding batch and one vector store query.
+    
+    Args:
+        queries: The search query strings
+        n_results: Number of results to return per query (default: 5)
+        mode: "vector" (semantic), "keyword" (BM25) or "hybrid" (both, fused) (default: vector)
+        fuse: Also combine the results: "union" (de-duplicated) or "rrf" (reciprocal rank fusion) (default: none)
+        collection: Collection to search (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
+    Returns:
+        JSON string containing the results for each query and, when fusing, the combined results
+    """
+    try:
+        with get_store_pool().lease(collection, namespace) as store:
+            response = store.search_many(queries, n_results, mode=mode, fuse=fuse)
+        payload = {
+            "success": True,
+            "mode": mode,
+            "results": [
+                {"query": query, "results": results, "count": len(results)}
+                for query, results in zip(queries, response['results'])
+            ]
+        }
+        if 'fused' in response:
+            payload["fused"] = {"method": fuse, "results": response['fused'], "count": len(response['fused'])}
+        return json.dumps(payload, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
+@mcp.tool()
+def add_document(content: str, title: str = None, source: str = None, collection: str = None,
+                 namespace: str = None, **metadata) -> str:
     """
     Add a document to the vector store.
     
+    The document ID is derived from a hash of the content, so adding the same
+    content again does not duplicate or re-embed it.
+    
     Args:
         content: The document content to add
         title: Optional title for the document
         source: Optional source information
+        collection: Collection to add to (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
         **metadata: Additional metadata as key-value pairs
     
     Returns:
@@ -61,7 +164,8 @@ def add_document(content: str, title: str = None, source: str = None, **metadata
             doc_metadata['source'] = source
         doc_metadata.update(metadata)
         
-        doc_id = vector_store.add_document(content, doc_metadata)
+        with get_store_pool().lease(collection, namespace) as store:
+            doc_id = store.add_document(content, doc_metadata)
         return json.dumps({
             "success": True,
             "document_id": doc_id,
@@ -76,13 +180,18 @@ def add_document(content: str, title: str = None, source: str = None, **metadata
 
 
 @mcp.tool()
-def add_file(file_path: str, title: str = None) -> str:
+def add_file(file_path: str, title: str = None, collection: str = None, namespace: str = None) -> str:
     """
     Add a file's content to the vector store.
     
+    The document ID is derived from the file path, so re-adding a changed file
+    only re-embeds the chunks that changed and removes chunks that no longer exist.
+    
     Args:
         file_path: Path to the file to add
         title: Optional title for the document (defaults to filename)
+        collection: Collection to add to (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
     
     Returns:
         JSON string containing the operation result and document ID
@@ -94,9 +203,6 @@ def add_file(file_path: str, title: str = None) -> str:
                 "error": f"File not found: {file_path}"
             })
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         if not title:
             title = os.path.basename(file_path)
         
@@ -106,7 +212,8 @@ def add_file(file_path: str, title: str = None) -> str:
             'type': 'file'
         }
         
-        doc_id = vector_store.add_document(content, metadata)
+        with get_store_pool().lease(collection, namespace) as store:
+            doc_id = store.add_file(file_path, title)
         return json.dumps({
             "success": True,
             "document_id": doc_id,
@@ -121,15 +228,70 @@ def add_file(file_path: str, title: str = None) -> str:
 
 
 @mcp.tool()
-def get_collection_info() -> str:
+def add_directory(directory: str, pattern: str = "**/*", max_workers: int = 4, collection: str = None,
+                  namespace: str = None) -> str:
+    """
+    Add every file under a directory that matches a glob pattern to the vector store.
+    
+    Files are read and chunked in a thread pool, embedded in large batches and written
+    in bounded batches. Files that fail (e.g. unreadable or not UTF-8) are reported
+    individually and do not abort the rest of the ingest.
+    
+    Args:
+        directory: Directory to scan
+        pattern: Glob pattern relative to the directory (default: "**/*", recursive)
+        max_workers: Number of threads used to read and chunk files (default: 4)
+        collection: Collection to add to (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
+    Returns:
+        JSON string containing ingest counts, the added document IDs and per-file failures
+    """
+    try:
+        if not os.path.isdir(directory):
+            return json.dumps({
+                "success": False,
+                "error": f"Directory not found: {directory}"
+            })
+        
+        file_paths = (
+            path for path in glob.iglob(os.path.join(directory, pattern), recursive=True)
+            if os.path.isfile(path)
+        )
+        
+        def log_progress(stats):
+            print(f"add_directory: {stats['processed']} files processed, {stats['added']} added, "
+                  f"{stats['failed']} failed, {stats['chunks']} chunks", file=sys.stderr)
+        
+        with get_store_pool().lease(collection, namespace) as store:
+            result = store.add_files(file_paths, max_workers=max_workers, progress_callback=log_progress)
+        return json.dumps({
+            "success": True,
+            "message": f"Added {result['added']} files from '{directory}'",
+            **result
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
+@mcp.tool()
+def get_collection_info(collection: str = None, namespace: str = None) -> str:
     """
     Get information about the vector store collection.
     
+    Args:
+        collection: Collection to describe (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
     Returns:
         JSON string containing collection information
     """
     try:
-        info = vector_store.get_collection_info()
+        with get_store_pool().lease(collection, namespace) as store:
+            info = store.get_collection_info()
         return json.dumps({
             "success": True,
             "collection_info": info
@@ -142,18 +304,50 @@ def get_collection_info() -> str:
 
 
 @mcp.tool()
-def delete_document(document_id: str) -> str:
+def list_documents(offset: int = 0, limit: int = 50, collection: str = None, namespace: str = None) -> str:
+    """
+    List documents in the vector store, most recently added first.
+    
+    Args:
+        offset: Number of documents to skip
+        limit: Maximum number of documents to return
+        collection: Collection to list (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
+    Returns:
+        JSON string containing one entry per document
+    """
+    try:
+        with get_store_pool().lease(collection, namespace) as store:
+            documents = store.list_documents(offset=offset, limit=limit)
+        return json.dumps({
+            "success": True,
+            "offset": offset,
+            "documents": documents
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
+@mcp.tool()
+def delete_document(document_id: str, collection: str = None, namespace: str = None) -> str:
     """
     Delete a document from the vector store.
     
     Args:
         document_id: The ID of the document to delete
+        collection: Collection the document is in (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
     
     Returns:
         JSON string containing the operation result
     """
     try:
-        success = vector_store.delete_document(document_id)
+        with get_store_pool().lease(collection, namespace) as store:
+            success = store.delete_document(document_id)
         if success:
             return json.dumps({
                 "success": True,
@@ -171,11 +365,103 @@ def delete_document(document_id: str) -> str:
         })
 
 
+@mcp.tool()
+def delete_documents(document_ids: List[str] = None, source: str = None, title: str = None, doc_type: str = None,
+                     after: str = None, before: str = None, where: Dict[str, Any] = None,
+                     collection: str = None, namespace: str = None) -> str:
+    """
+    Delete many documents at once, by id and/or by filter. Documents are deleted whole.
+    
+    Args:
+        document_ids: IDs of the documents to delete (narrowed by any filters given)
+        source: Delete documents from this source (e.g. a file path)
+        title: Delete documents with this title
+        doc_type: Delete documents of this type (e.g. "file")
+        after: Delete documents ingested at or after this ISO 8601 time
+        before: Delete documents ingested at or before this ISO 8601 time
+        where: Raw Chroma metadata filter, combined with the filters above
+        collection: Collection to delete from (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
+    Returns:
+        JSON string containing the number of documents and chunks deleted
+    """
+    try:
+        with get_store_pool().lease(collection, namespace) as store:
+            result = store.delete_documents(
+                document_ids, where=where, source=source, title=title, doc_type=doc_type, after=after, before=before
+            )
+        return json.dumps({
+            "success": True,
+            **result
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
+@mcp.tool()
+def vacuum(collection: str = None, namespace: str = None) -> str:
+    """
+    Rebuild a collection's vector index and compact its files, reclaiming space left by deletes.
+    
+    Args:
+        collection: Collection to vacuum (default: documents)
+        namespace: Namespace (tenant) the collection belongs to
+    
+    Returns:
+        JSON string containing the time taken and the bytes freed
+    """
+    try:
+        with get_store_pool().lease(collection, namespace) as store:
+            result = store.vacuum()
+        return json.dumps({
+            "success": True,
+            **result
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
+@mcp.tool()
+def list_collections(namespace: str = None) -> str:
+    """
+    List the collections in a namespace.
+    
+    Args:
+        namespace: Namespace (tenant) to list (default: the shared one)
+    
+    Returns:
+        JSON string containing the collection names
+    """
+    try:
+        return json.dumps({
+            "success": True,
+            "namespace": namespace,
+            "collections": get_store_pool().list_collections(namespace)
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
+
+
 if __name__ == "__main__":
     try:
+        if os.getenv("RAG_WARMUP", "1") != "0":
+            warm_up(background=True)
         print("Starting MCP server...")
         mcp.run()
     except Exception as e:
         print(f"Server error: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+    finally:
+        if _store_pool is not None:
+            _store_pool.close()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query for cache lookups. Only whitespace is collapsed: case can change the
+    results of cased embedding models, the cross-encoder reranker and exact keyword matches.
+    """
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+class QueryResultCache:
+    """
+    TTL + LRU cache of search results.
+
+    Every entry records the collection generation it was computed at; an entry from an older
+    generation is treated as a miss, so writes invalidate the cache without having to scan it.
+    """
+
+    def __init__(self, max_items: int = 1024, ttl_seconds: float = 300.0):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0}
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            entry_generation, expires_at, value = entry
+            if entry_generation != generation or expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats['invalidated' if entry_generation != generation else 'expired'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['items'] = len(self._entries)
+        return stats
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+
+DEFAULT_RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a local cross-encoder.
+
+    All uncached pairs for a query go through the model in one batched predict call. Scores are
+    kept in an LRU keyed by (query, chunk hash), so re-asked queries and chunks that show up in
+    several candidate pools are scored once.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL, batch_size: int = 32, max_cached_scores: int = 50000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_cached_scores = max_cached_scores
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'batches': 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        self.model
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance score of each text for the query (higher is more relevant)."""
+        query = query.strip()
+        keys = [(query, self._hash_text(text)) for text in texts]
+        scores = [None] * len(texts)
+        missing = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._scores.get(key)
+                if score is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._scores.move_to_end(key)
+                    scores[i] = score
+            self._stats['hits'] += len(texts) - sum(len(positions) for positions in missing.values())
+            self._stats['misses'] += len(missing)
+
+        if missing:
+            pending = list(missing)
+            predicted = self.model.predict(
+                [(query, texts[missing[key][0]]) for key in pending],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            with self._lock:
+                self._stats['batches'] += 1
+                for key, score in zip(pending, predicted):
+                    score = float(score)
+                    self._scores[key] = score
+                    self._scores.move_to_end(key)
+                    for i in missing[key]:
+                        scores[i] = score
+                while len(self._scores) > self.max_cached_scores:
+                    self._scores.popitem(last=False)
+
+        return scores
+
+    def rerank(self, query: str, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return search hits ordered by cross-encoder score, each with a 'rerank_score'."""
+        if not hits:
+            return []
+        scores = self.score(query, [hit['content'] for hit in hits])
+        reranked = [dict(hit, rerank_score=score) for hit, score in zip(hits, scores)]
+        reranked.sort(key=lambda hit: hit['rerank_score'], reverse=True)
+        return reranked
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_scores'] = len(self._scores)
+        return stats
+
+
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(model_name: str = DEFAULT_RERANKER_MODEL) -> CrossEncoderReranker:
+    """Return the process-wide reranker for a model, so the model and score cache are loaded once."""
+    with _rerankers_lock:
+        if model_name not in _rerankers:
+            _rerankers[model_name] = CrossEncoderReranker(model_name)
+        return _rerankers[model_name]
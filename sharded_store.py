@@ -0,0 +1,371 @@
+import atexit
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Any, Iterable, Callable
+
+from context_packer import pack_context
+from embedding_pool import pin_threads
+
+
+# Set in each shard process by _init_shard
+_shard_store = None
+
+# Stores whose shard processes may be running, stopped at exit. Weak references, so a store a
+# pool has evicted (and closed) can be garbage collected.
+_open_stores = weakref.WeakSet()
+
+
+def _shutdown_open_stores():
+    for store in list(_open_stores):
+        store.shutdown()
+
+
+atexit.register(_shutdown_open_stores)
+
+
+def _init_shard(persist_directory: str, collection_name: str, threads: int, store_options: Dict[str, Any]):
+    """Pin the shard's thread pools and open its own VectorStore."""
+    global _shard_store
+    pin_threads(threads)
+    from vector_store import VectorStore
+    _shard_store = VectorStore(collection_name=collection_name, persist_directory=persist_directory, **store_options)
+
+
+def _call_shard(method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    return getattr(_shard_store, method)(*args, **kwargs)
+
+
+def _document_id(content: str) -> str:
+    """The id VectorStore derives for a document added without one."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+
+def _file_document_id(file_path: str) -> str:
+    """VectorStore.file_document_id, without importing the vector store in this process."""
+    return hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:32]
+
+
+def fused_by_rank(search_options: Dict[str, Any]) -> bool:
+    """Whether a search's scores come from BM25 (keyword or hybrid, not reranked) and must be fused by rank."""
+    return search_options.get('mode', "vector") != "vector" and not search_options.get('rerank')
+
+
+def fuse_rankings(per_source: List[Dict[str, List[Dict[str, Any]]]], mode: str,
+                  rrf_k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Combine the vector and keyword rankings (see VectorStore.search_rankings) of several shards
+    or collections into one, best first; a chunk found in several sources is kept once.
+
+    Vector scores are cosine similarities and merge exactly. BM25 scores depend on each
+    source's own statistics, so keyword hits are combined by rank: keyword search interleaves
+    the sources' rankings rank by rank, and hybrid search applies reciprocal rank fusion to the
+    merged vector ranking and every source's keyword ranking.
+    """
+    vector = list(heapq.merge(*[rankings['vector'] for rankings in per_source], key=lambda hit: -hit['score']))
+    if mode == "vector":
+        ranked = vector
+    elif mode == "keyword":
+        by_rank = sorted(
+            ((rank, source, hit) for source, rankings in enumerate(per_source)
+             for rank, hit in enumerate(rankings['keyword'])),
+            key=lambda item: item[:2]
+        )
+        ranked = [hit for _, _, hit in by_rank]
+    else:
+        fused = {}
+        for ranking in [vector] + [rankings['keyword'] for rankings in per_source]:
+            for rank, hit in enumerate(ranking, start=1):
+                entry = fused.setdefault(hit['id'], dict(hit, score=0.0))
+                entry['score'] += 1.0 / (rrf_k + rank)
+        return sorted(fused.values(), key=lambda hit: hit['score'], reverse=True)
+
+    seen = set()
+    return [hit for hit in ranked if not (hit['id'] in seen or seen.add(hit['id']))]
+
+
+class ShardedVectorStore:
+    """
+    A collection hash-partitioned by document id across N shard processes, each running its
+    own VectorStore (and model) in persist_directory/shard-<i>.
+
+    Writes go to the shard that owns the document. Searches are scattered to every shard in
+    parallel and each shard's hits (best first) are merged with a heap. The shard count is
+    recorded in persist_directory and cannot change without re-ingesting.
+
+    Vector and rerank scores are comparable across shards and merge exactly. BM25 statistics are
+    per shard, so keyword and hybrid searches fetch each shard's separate vector and keyword
+    rankings and fuse them by rank (see fuse_rankings).
+    """
+
+    def __init__(self, num_shards: int = 4, persist_directory: str = "./chroma_shards",
+                 collection_name: str = "documents", threads_per_shard: int = None, **store_options):
+        os.makedirs(persist_directory, exist_ok=True)
+        layout_path = os.path.join(persist_directory, "shards.json")
+        if os.path.exists(layout_path):
+            with open(layout_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)['num_shards']
+            if stored != num_shards:
+                raise ValueError(f"{persist_directory} holds {stored} shards, not {num_shards}")
+        else:
+            with open(layout_path, 'w', encoding='utf-8') as f:
+                json.dump({'num_shards': num_shards}, f)
+
+        self.num_shards = num_shards
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.threads_per_shard = threads_per_shard or max(1, (os.cpu_count() or 1) // num_shards)
+        self.store_options = store_options
+        self._executors = [None] * num_shards
+        self._lock = threading.Lock()
+        _open_stores.add(self)
+
+    def _executor(self, shard: int) -> ProcessPoolExecutor:
+        if self._executors[shard] is None:
+            with self._lock:
+                if self._executors[shard] is None:
+                    # One process per shard, so every call for a shard reaches the same VectorStore.
+                    # spawn, not fork: forking a process that already runs torch or Chroma threads is unsafe
+                    self._executors[shard] = ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_shard,
+                        initargs=(os.path.join(self.persist_directory, f"shard-{shard}"), self.collection_name,
+                                  self.threads_per_shard, self.store_options)
+                    )
+        return self._executors[shard]
+
+    def shard_for(self, doc_id: str) -> int:
+        """The shard that owns a document (stable across processes and restarts)."""
+        return int(hashlib.md5(doc_id.encode('utf-8')).hexdigest()[:8], 16) % self.num_shards
+
+    def _submit(self, shard: int, method: str, *args, **kwargs) -> Future:
+        return self._executor(shard).submit(_call_shard, method, args, kwargs)
+
+    def _scatter(self, method: str, *args, **kwargs) -> List[Any]:
+        """Call a VectorStore method on every shard in parallel; results in shard order."""
+        futures = [self._submit(shard, method, *args, **kwargs) for shard in range(self.num_shards)]
+        return [future.result() for future in futures]
+
+    def warm_up(self, background: bool = False):
+        """Start every shard process and load its model and collection."""
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="sharded-store-warm-up", daemon=True)
+            thread.start()
+            return thread
+        self._scatter("warm_up")
+
+    def add_document(self, content: str, metadata: Dict[str, Any] = None, doc_id: str = None) -> str:
+        doc_id = doc_id or _document_id(content)
+        return self._submit(self.shard_for(doc_id), "add_document", content, metadata, doc_id).result()
+
+    def add_file(self, file_path: str, title: str = None) -> str:
+        file_path = os.path.abspath(file_path)
+        return self._submit(self.shard_for(_file_document_id(file_path)), "add_file", file_path, title).result()
+
+    def _ingest_partitioned(self, method: str, partitions: Dict[int, list], max_workers: int,
+                            progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        futures = [self._submit(shard, method, items, max_workers) for shard, items in partitions.items() if items]
+        combined = {'processed': 0, 'added': 0, 'unchanged': 0, 'failed': 0, 'chunks': 0, 'elapsed_seconds': 0.0,
+                    'documents': [], 'failures': []}
+        for future in futures:
+            result = future.result()
+            for key in ('processed', 'added', 'unchanged', 'failed', 'chunks'):
+                combined[key] += result[key]
+            # Shards ingest side by side, so the slowest one is the elapsed time
+            combined['elapsed_seconds'] = max(combined['elapsed_seconds'], result['elapsed_seconds'])
+            combined['documents'].extend(result['documents'])
+            combined['failures'].extend(result['failures'])
+            # Callbacks cannot cross into the shard processes; progress is reported per finished shard
+            if progress_callback:
+                progress_callback({key: combined[key] for key in ('processed', 'added', 'unchanged', 'failed', 'chunks')})
+        return combined
+
+    def add_documents(self, documents: Iterable[Any], max_workers: int = 4,
+                      progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Add many documents (as for VectorStore.add_documents), each shard ingesting its share in parallel."""
+        partitions = {shard: [] for shard in range(self.num_shards)}
+        for item in documents:
+            if isinstance(item, str):
+                item = {'content': item}
+            elif not isinstance(item, dict):
+                item = {'content': item[0], 'metadata': item[1]}
+            item = dict(item, doc_id=item.get('doc_id') or _document_id(item['content']))
+            partitions[self.shard_for(item['doc_id'])].append(item)
+        return self._ingest_partitioned("add_documents", partitions, max_workers, progress_callback)
+
+    def add_files(self, file_paths: Iterable[str], max_workers: int = 4,
+                  progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        partitions = {shard: [] for shard in range(self.num_shards)}
+        for path in file_paths:
+            path = os.path.abspath(path)
+            partitions[self.shard_for(_file_document_id(path))].append(path)
+        return self._ingest_partitioned("add_files", partitions, max_workers, progress_callback)
+
+    def delete_document(self, doc_id: str) -> bool:
+        return self._submit(self.shard_for(doc_id), "delete_document", doc_id).result()
+
+    def delete_documents(self, doc_ids: List[str] = None, **filters) -> Dict[str, Any]:
+        """Bulk delete (see VectorStore.delete_documents): ids go to their shards, filters to every shard."""
+        if filters and any(value is not None for value in filters.values()):
+            futures = [self._submit(shard, "delete_documents", doc_ids, **filters) for shard in range(self.num_shards)]
+        elif doc_ids is not None:
+            partitions = {}
+            for doc_id in doc_ids:
+                partitions.setdefault(self.shard_for(doc_id), []).append(doc_id)
+            futures = [self._submit(shard, "delete_documents", ids) for shard, ids in partitions.items()]
+        else:
+            raise ValueError("delete_documents needs document ids or a filter")
+
+        combined = {'deleted_documents': 0, 'deleted_chunks': 0, 'batches': 0, 'elapsed_seconds': 0.0}
+        for future in futures:
+            result = future.result()
+            for key in ('deleted_documents', 'deleted_chunks', 'batches'):
+                combined[key] += result[key]
+            combined['elapsed_seconds'] = max(combined['elapsed_seconds'], result['elapsed_seconds'])
+        return combined
+
+    def vacuum(self) -> Dict[str, Any]:
+        """Vacuum every shard in parallel."""
+        shards = self._scatter("vacuum")
+        return {
+            'elapsed_seconds': max(result['elapsed_seconds'] for result in shards),
+            'bytes_freed': sum(result['bytes_freed'] for result in shards),
+            'chunks': sum(result['chunks'] for result in shards),
+            'shards': shards
+        }
+
+    @staticmethod
+    def _merge(per_shard: List[List[Dict[str, Any]]], n_results: int, max_context_chars: int) -> List[Dict[str, Any]]:
+        """k-way heap merge of the shards' best-first hits, filling the context budget like VectorStore."""
+        tagged = [[dict(hit, shard=shard) for hit in hits] for shard, hits in enumerate(per_shard)]
+        merged = heapq.merge(*tagged, key=lambda hit: -hit.get('rerank_score', hit['score']))
+        return ShardedVectorStore._fill_context(merged, n_results, max_context_chars)
+
+    @staticmethod
+    def _fill_context(ranked: Iterable[Dict[str, Any]], n_results: int, max_context_chars: int) -> List[Dict[str, Any]]:
+        documents, total_chars = [], 0
+        for hit in ranked:
+            if total_chars + len(hit['content']) <= max_context_chars:
+                documents.append(hit)
+                total_chars += len(hit['content'])
+            if len(documents) >= n_results:
+                break
+        return documents
+
+    def _rank_fused(self, queries: List[str], n_results: int, options: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """Every query's hits across shards, best first, from the shards' separate vector and keyword rankings."""
+        options = {key: value for key, value in options.items() if key not in ("rerank", "rerank_candidates")}
+        per_shard = self._scatter("search_rankings", queries, n_results, **options)
+        rrf_k = self.store_options.get('rrf_k', 60)
+        return [
+            fuse_rankings(
+                [{name: [dict(hit, shard=shard) for hit in rankings[i][name]] for name in ("vector", "keyword")}
+                 for shard, rankings in enumerate(per_shard)],
+                options['mode'], rrf_k
+            )
+            for i in range(len(queries))
+        ]
+
+    def search_rankings(self, queries: List[str], n_results: int = 5, mode: str = "hybrid",
+                        **options) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        As VectorStore.search_rankings, across shards: 'vector' is the shards' vector hits merged
+        by score and 'keyword' their keyword hits interleaved by rank.
+        """
+        per_shard = self._scatter("search_rankings", queries, n_results, mode, **options)
+        return [
+            {
+                'vector': fuse_rankings([rankings[i] for rankings in per_shard], "vector"),
+                'keyword': fuse_rankings([rankings[i] for rankings in per_shard], "keyword")
+            }
+            for i in range(len(queries))
+        ]
+
+    def search(self, query: str, n_results: int = 5, max_context_chars: int = 4000, **options) -> List[Dict[str, Any]]:
+        """Scatter a search to every shard and merge the top n_results. Options are as for VectorStore.search()."""
+        if fused_by_rank(options):
+            return self._fill_context(self._rank_fused([query], n_results, options)[0], n_results, max_context_chars)
+        per_shard = self._scatter("search", query, n_results, max_context_chars, **options)
+        return self._merge(per_shard, n_results, max_context_chars)
+
+    def search_many(self, queries: List[str], n_results: int = 5, max_context_chars: int = 4000,
+                    fuse: str = None, **options) -> Dict[str, Any]:
+        """
+        Batch search (one batch per shard), merged per query. With fuse ("union" or "rrf", as for
+        VectorStore.search_many) the merged per-query results are also fused into one list.
+        """
+        if fuse not in (None, "union", "rrf"):
+            raise ValueError(f"Unknown fusion method: {fuse}")
+        if fused_by_rank(options):
+            results = [self._fill_context(hits, n_results, max_context_chars)
+                       for hits in self._rank_fused(queries, n_results, options)]
+        else:
+            per_shard = self._scatter("search_many", queries, n_results, max_context_chars, **options)
+            results = [
+                self._merge([response['results'][i] for response in per_shard], n_results, max_context_chars)
+                for i in range(len(queries))
+            ]
+        response = {'results': results}
+        if fuse == "rrf":
+            rrf_k = self.store_options.get('rrf_k', 60)
+            fused = {}
+            for documents in results:
+                for rank, hit in enumerate(documents, start=1):
+                    entry = fused.setdefault(hit['id'], dict(hit, score=0.0))
+                    entry['score'] += 1.0 / (rrf_k + rank)
+            ranked = sorted(fused.values(), key=lambda hit: hit['score'], reverse=True)
+            response['fused'] = self._fill_context(ranked, n_results, max_context_chars)
+        elif fuse == "union":
+            best = {}
+            for documents in results:
+                for hit in documents:
+                    if hit['id'] not in best or hit['score'] > best[hit['id']]['score']:
+                        best[hit['id']] = hit
+            ranked = sorted(best.values(), key=lambda hit: hit['score'], reverse=True)
+            response['fused'] = self._fill_context(ranked, n_results, max_context_chars)
+        return response
+
+    def search_context(self, query: str, max_context_chars: int = 4000, n_candidates: int = 10,
+                       **options) -> Dict[str, Any]:
+        """Packed context (see VectorStore.search_context) from the best hits across shards."""
+        if fused_by_rank(options):
+            hits = self._rank_fused([query], n_candidates, options)[0][:n_candidates]
+        else:
+            hits = self._merge(self._scatter("search", query, n_candidates, 1 << 30, **options), n_candidates, 1 << 30)
+        packed = pack_context(hits, max_context_chars)
+        packed['query'] = query
+        return packed
+
+    def list_documents(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Documents across shards, most recently added first."""
+        per_shard = self._scatter("list_documents", 0, offset + limit)
+        merged = heapq.merge(*per_shard, key=lambda document: (-(document['added_at'] or 0), document['doc_id']))
+        return list(merged)[offset:offset + limit]
+
+    def get_collection_info(self) -> Dict[str, Any]:
+        shards = self._scatter("get_collection_info")
+        return {
+            'name': self.collection_name,
+            'num_shards': self.num_shards,
+            'total_chunks': sum(info['total_chunks'] for info in shards),
+            'unique_documents': sum(info.get('unique_documents', 0) for info in shards),
+            'total_bytes': sum(info.get('total_bytes', 0) for info in shards),
+            'shards': shards
+        }
+
+    def close(self):
+        """Stop the shard processes (e.g. when a pool evicts this store); they restart on next use."""
+        self.shutdown()
+
+    def shutdown(self):
+        with self._lock:
+            for executor in self._executors:
+                if executor is not None:
+                    executor.shutdown(wait=True, cancel_futures=True)
+            self._executors = [None] * self.num_shards
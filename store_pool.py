@@ -0,0 +1,228 @@
+import heapq
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from typing import List, Dict, Any
+from vector_store import VectorStore, get_chroma_client
+from sharded_store import ShardedVectorStore, fuse_rankings, fused_by_rank
+from context_packer import pack_context
+
+
+DEFAULT_COLLECTION = "documents"
+# Chroma's collection name rules; namespaces follow them too since they become directory names
+_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$')
+
+
+class VectorStorePool:
+    """
+    Open VectorStore handles for many collections, so one server can serve many tenants.
+
+    A namespace is a separate persist directory (persist_directory/namespaces/<name>); without
+    one, collections live in persist_directory itself, where a single-collection setup already
+    keeps its data. At most `max_open` handles are kept, least recently used first out; a handle
+    that is leased (see lease()) is never closed, so the limit can be exceeded while every handle
+    is in use. Searches that span several collections run on a shared thread pool and their hits
+    are merged by score.
+
+    With num_shards > 0 every collection is a ShardedVectorStore with that many shard processes,
+    kept in <namespace directory>/shards/<collection>.
+    """
+
+    def __init__(self, persist_directory: str = "./chroma_db", max_open: int = 16, max_workers: int = 8,
+                 num_shards: int = 0, **store_options):
+        self.persist_directory = persist_directory
+        self.max_open = max_open
+        self.num_shards = num_shards
+        # Passed to every VectorStore (chunking, caches, embedding backend, ...)
+        self.store_options = store_options
+        self._stores = OrderedDict()
+        # Calls in flight per handle; leased handles are skipped by eviction
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="collection-search")
+        self.opened = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _validate(name: str, kind: str) -> str:
+        if not isinstance(name, str) or not _NAME.match(name) or ".." in name:
+            raise ValueError(
+                f"Invalid {kind} name: {name!r} (3-63 characters: letters, digits, '.', '_' or '-', "
+                f"starting and ending with a letter or digit)"
+            )
+        return name
+
+    def directory(self, namespace: str = None) -> str:
+        if namespace is None:
+            return self.persist_directory
+        return os.path.join(self.persist_directory, "namespaces", self._validate(namespace, "namespace"))
+
+    def _open(self, key: tuple) -> VectorStore:
+        """The handle for key, opened if needed and marked most recently used (call with the lock held)."""
+        store = self._stores.get(key)
+        if store is not None:
+            self._stores.move_to_end(key)
+            return store
+
+        namespace, collection = key
+        directory = self.directory(namespace)
+        options = dict(self.store_options)
+        if self.num_shards:
+            store = ShardedVectorStore(self.num_shards, os.path.join(directory, "shards", collection), collection,
+                                       **options)
+            self._stores[key] = store
+            self.opened += 1
+            return store
+        # Collections created with the flat backend keep using it
+        if "index_backend" not in options and os.path.isdir(os.path.join(directory, "flat", collection)):
+            options["index_backend"] = "flat"
+        store = VectorStore(collection_name=collection, persist_directory=directory, **options)
+        self._stores[key] = store
+        self.opened += 1
+        return store
+
+    def _evict(self, keep: tuple = None):
+        """Close least recently used handles that are not leased until at most max_open remain."""
+        for key in list(self._stores):
+            if len(self._stores) <= self.max_open:
+                break
+            if key == keep or self._leases.get(key):
+                continue
+            self._stores.pop(key).close()
+            self.evicted += 1
+
+    def _key(self, collection: str, namespace: str) -> tuple:
+        return namespace, self._validate(collection or DEFAULT_COLLECTION, "collection")
+
+    def get(self, collection: str = None, namespace: str = None) -> VectorStore:
+        """
+        Return the handle for a collection, opening it (and evicting the least recently used) if needed.
+        The handle is not leased: use lease() to call into it while other collections are opened.
+        """
+        key = self._key(collection, namespace)
+        with self._lock:
+            store = self._open(key)
+            self._evict(keep=key)
+            return store
+
+    @contextmanager
+    def lease(self, collection: str = None, namespace: str = None):
+        """
+        Use a collection's handle for the duration of a with block. A leased handle is not closed
+        by eviction, so every caller of a collection shares one VectorStore (and its write lock).
+        """
+        key = self._key(collection, namespace)
+        with self._lock:
+            store = self._open(key)
+            self._leases[key] = self._leases.get(key, 0) + 1
+            self._evict()
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._leases[key] -= 1
+                if not self._leases[key]:
+                    del self._leases[key]
+                # Handles kept open past max_open while leased are closed once released
+                self._evict()
+
+    def list_collections(self, namespace: str = None) -> List[str]:
+        """Names of the collections stored in a namespace, whichever index backend (or sharding) holds them."""
+        directory = self.directory(namespace)
+        if not os.path.isdir(directory):
+            return []
+        names = set()
+        for subdirectory in ("flat", "shards"):
+            if os.path.isdir(os.path.join(directory, subdirectory)):
+                names.update(os.listdir(os.path.join(directory, subdirectory)))
+        if os.path.exists(os.path.join(directory, "chroma.sqlite3")):
+            client = get_chroma_client(directory)
+            # Chroma returns names in newer releases and Collection objects in older ones
+            names.update(getattr(item, "name", item) for item in client.list_collections())
+        return sorted(names)
+
+    def _fan_out(self, collections: List[str], namespace: str, call) -> List[Any]:
+        with ExitStack() as leases:
+            stores = [leases.enter_context(self.lease(collection, namespace)) for collection in collections]
+            if len(stores) == 1:
+                return [call(stores[0])]
+            return list(self._executor.map(call, stores))
+
+    def _rank_fused(self, query: str, collections: List[str], namespace: str, n_results: int,
+                    search_options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Hits across collections for keyword and hybrid searches, fused by rank (see fuse_rankings)."""
+        options = {key: value for key, value in search_options.items() if key not in ("rerank", "rerank_candidates")}
+        per_collection = self._fan_out(collections, namespace,
+                                       lambda store: store.search_rankings([query], n_results, **options)[0])
+        tagged = [{name: [dict(hit, collection=collection) for hit in rankings[name]] for name in ("vector", "keyword")}
+                  for collection, rankings in zip(collections, per_collection)]
+        return fuse_rankings(tagged, options['mode'], self.store_options.get('rrf_k', 60))
+
+    @staticmethod
+    def _merge(per_collection: List[List[Dict[str, Any]]], collections: List[str], n_results: int) -> List[Dict[str, Any]]:
+        """Best hits across collections; a chunk stored in several collections is kept once."""
+        best = {}
+        for collection, hits in zip(collections, per_collection):
+            for hit in hits:
+                score = hit.get('rerank_score', hit['score'])
+                if hit['id'] not in best or score > best[hit['id']][0]:
+                    best[hit['id']] = (score, dict(hit, collection=collection))
+        return [hit for _, hit in heapq.nlargest(n_results, best.values(), key=lambda item: item[0])]
+
+    def search(self, query: str, collections: List[str] = None, namespace: str = None, n_results: int = 5,
+               max_context_chars: int = 4000, **search_options) -> List[Dict[str, Any]]:
+        """
+        Search several collections in parallel and merge their hits by score (rerank score when
+        reranking). Keyword and hybrid hits are fused by rank instead, since BM25 scores from
+        different collections are not comparable. Each hit is tagged with its 'collection'.
+        Options are as for VectorStore.search().
+        """
+        collections = collections or [DEFAULT_COLLECTION]
+        if fused_by_rank(search_options) and len(collections) > 1:
+            ranked = self._rank_fused(query, collections, namespace, n_results, search_options)
+            return VectorStore._fill_context(ranked, n_results, max_context_chars)
+        per_collection = self._fan_out(
+            collections, namespace,
+            lambda store: store.search(query, n_results, max_context_chars=max_context_chars, **search_options)
+        )
+        merged = self._merge(per_collection, collections, n_results * len(collections))
+        return VectorStore._fill_context(merged, n_results, max_context_chars)
+
+    def search_context(self, query: str, collections: List[str] = None, namespace: str = None,
+                       max_context_chars: int = 4000, n_candidates: int = 10, **search_options) -> Dict[str, Any]:
+        """Packed context (see VectorStore.search_context) built from the best hits of several collections."""
+        collections = collections or [DEFAULT_COLLECTION]
+        if len(collections) == 1:
+            with self.lease(collections[0], namespace) as store:
+                return store.search_context(query, max_context_chars, n_candidates=n_candidates, **search_options)
+        if fused_by_rank(search_options):
+            hits = self._rank_fused(query, collections, namespace, n_candidates, search_options)[:n_candidates]
+        else:
+            per_collection = self._fan_out(
+                collections, namespace,
+                lambda store: store.search(query, n_candidates, max_context_chars=1 << 30, **search_options)
+            )
+            hits = self._merge(per_collection, collections, n_candidates)
+        packed = pack_context(hits, max_context_chars)
+        packed['query'] = query
+        return packed
+
+    def close(self):
+        """Close every handle, which stops the shard processes of sharded collections."""
+        with self._lock:
+            stores, self._stores = list(self._stores.values()), OrderedDict()
+        for store in stores:
+            store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'open': [{'namespace': namespace, 'collection': collection} for namespace, collection in self._stores],
+                'max_open': self.max_open,
+                'in_use': len(self._leases),
+                'opened': self.opened,
+                'evicted': self.evicted
+            }
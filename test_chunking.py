@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import random
+import shutil
+import tempfile
+
+
+def reference_chunks(text, chunk_size, chunk_overlap):
+    """The chunker as it was before chunking became lazy: split everything, then pack."""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    current_chunk = ""
+    for sentence in re.split(r'(?<=[.!?])\s+', text):
+        if len(current_chunk) + len(sentence) + 1 <= chunk_size:
+            current_chunk += (" " if current_chunk else "") + sentence
+        elif current_chunk:
+            chunks.append(current_chunk.strip())
+            if chunk_overlap > 0 and len(current_chunk) > chunk_overlap:
+                current_chunk = current_chunk[-chunk_overlap:] + " " + sentence
+            else:
+                current_chunk = sentence
+        elif len(sentence) > chunk_size:
+            current_word_chunk = ""
+            for word in sentence.split():
+                if len(current_word_chunk) + len(word) + 1 <= chunk_size:
+                    current_word_chunk += (" " if current_word_chunk else "") + word
+                else:
+                    if current_word_chunk:
+                        chunks.append(current_word_chunk.strip())
+                    current_word_chunk = word
+            if current_word_chunk:
+                current_chunk = current_word_chunk
+        else:
+            current_chunk = sentence
+
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def random_text(rng):
+    """Sentences of random length, with runs of mixed whitespace and the occasional very long word."""
+    pieces = []
+    for _ in range(rng.randint(0, 40)):
+        words = [rng.choice(["alpha", "beta", "gamma", "delta", "x"]) for _ in range(rng.randint(1, 30))]
+        if rng.random() < 0.1:
+            words.append("word" * rng.randint(10, 60))
+        pieces.append(" ".join(words) + rng.choice([".", "!", "?", ",", ""]))
+        pieces.append(rng.choice([" ", "  ", "\n", "\n\n", " \t ", ""]))
+    return "".join(pieces)
+
+
+def test_lazy_chunker_matches_reference(tmp_path):
+    """Chunking text block by block gives exactly the chunks of the old split-everything chunker."""
+    print("🧪 Testing lazy chunking against the reference chunker...")
+    from vector_store import VectorStore
+
+    rng = random.Random(1234)
+    texts = [random_text(rng) for _ in range(100)] + ["", "Short.", "One sentence. " * 200]
+    for chunk_size, chunk_overlap in ((80, 20), (200, 0), (800, 100)):
+        for read_block_size in (1, 7, 64, 1 << 20):
+            store = VectorStore(persist_directory=str(tmp_path), chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                read_block_size=read_block_size)
+            for text in texts:
+                expected = reference_chunks(text, chunk_size, chunk_overlap)
+                blocks = [text[i:i + read_block_size] for i in range(0, len(text), read_block_size)]
+                assert store._split_text_into_chunks(text) == expected, (chunk_size, text[:80])
+                assert list(store._iter_text_chunks(blocks)) == expected, (chunk_size, read_block_size, text[:80])
+    print(f"✓ {len(texts)} texts chunk identically for every chunk and block size")
+
+
+def test_streamed_file_shrinks(tmp_path):
+    """Re-ingesting a streamed file that got shorter drops the chunks past its new end."""
+    print("🧪 Testing streamed re-ingest of a shrinking file...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="streamed", persist_directory=str(tmp_path / "db"), chunk_size=120,
+                        chunk_overlap=20, read_block_size=64, stream_threshold=1000, write_batch_size=7)
+    path = tmp_path / "large.txt"
+    sentences = [f"Line {i} of the streamed file talks about item {i}." for i in range(200)]
+    path.write_text(" ".join(sentences), encoding='utf-8')
+
+    doc_id = store.add_file(str(path))
+    full = store.collection.get(where={"parent_doc_id": doc_id}, include=["documents"])
+    assert len(full['ids']) == len(reference_chunks(" ".join(sentences), 120, 20))
+    assert store._write_streamed_file(store._load_file(str(path)))['unchanged_documents'] == 1
+    print(f"✓ Streamed {len(full['ids'])} chunks; an unchanged file is skipped")
+
+    path.write_text(" ".join(sentences[:50]), encoding='utf-8')
+    counts = store._write_streamed_file(store._load_file(str(path)))
+    expected = reference_chunks(" ".join(sentences[:50]), 120, 20)
+    after = store.collection.get(where={"parent_doc_id": doc_id}, include=["documents", "metadatas"])
+    assert counts['deleted'] == len(full['ids']) - len(expected), counts
+    assert sorted(after['ids']) == sorted(f"{doc_id}_chunk_{i}" for i in range(len(expected)))
+    by_index = sorted(zip(after['metadatas'], after['documents']), key=lambda pair: pair[0]['chunk_index'])
+    assert [document for _, document in by_index] == expected
+    assert all(meta['total_chunks'] == len(expected) for meta in after['metadatas'])
+    assert store.registry.get_document(store.collection_name, doc_id)['chunk_count'] == len(expected)
+    assert not store.search("item 150", 5, where={"chunk_index": {"$gte": len(expected)}})
+    print(f"✓ Shrunk to {len(expected)} chunks, {counts['deleted']} stale chunks removed")
+
+
+def test_token_overlap_inside_sentence(tmp_path):
+    """With no sentence short enough to carry whole, the next chunk starts with the tail of the last one."""
+    print("🧪 Testing token overlap that cuts into a sentence...")
+    from vector_store import VectorStore
+
+    store = VectorStore(persist_directory=str(tmp_path), chunking="tokens", chunk_tokens=30, chunk_overlap_tokens=5)
+    sentences = [f"Sentence {i} has a dozen words in it to exceed the overlap." for i in range(6)]
+    chunks = store._split_text_into_chunks(" ".join(sentences))
+    assert len(chunks) > 1, chunks
+    tokenizer = store.embedding_backend.tokenizer
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = [sentence for sentence in sentences if sentence in previous][-1]
+        offsets = tokenizer(last_sentence, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+        tail = last_sentence[offsets[-5][0]:]
+        assert chunk.startswith(tail + " "), (previous, chunk)
+        assert len(tokenizer(chunk, add_special_tokens=False)['input_ids']) <= 30
+    print(f"✓ {len(chunks) - 1} chunk boundaries carry the last 5 tokens of the previous sentence")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="chunking-"))
+    try:
+        (directory / "a").mkdir()
+        (directory / "b").mkdir()
+        (directory / "c").mkdir()
+        test_lazy_chunker_matches_reference(directory / "a")
+        test_streamed_file_shrinks(directory / "b")
+        test_token_overlap_inside_sentence(directory / "c")
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All chunking tests passed!")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+
+def random_vectors(n, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def assert_own_vectors(store, vectors, ids, atol):
+    stored = store.vectors(ids)
+    expected = vectors[[int(chunk_id[1:]) for chunk_id in ids]]
+    assert all(vector is not None for vector in stored)
+    assert np.allclose(np.stack(stored), expected, atol=atol)
+
+
+def test_round_trip(tmp_path):
+    """float16 stores vectors almost exactly; pq approximates them closely enough to rank by."""
+    print("🧪 Testing compressed vector round trips...")
+    from compressed_store import CompressedVectorFile
+
+    vectors = random_vectors(600)
+    ids = [f"c{i}" for i in range(600)]
+    for storage, train_size in (("float16", 4096), ("pq", 300)):
+        store = CompressedVectorFile(str(tmp_path / storage), storage, pq_subspaces=8, train_size=train_size)
+        store.put(ids, vectors)
+        decoded = np.stack(store.vectors(ids))
+        cosine = (decoded * vectors).sum(axis=1) / np.linalg.norm(decoded, axis=1)
+        assert cosine.min() > (0.999 if storage == "float16" else 0.8), (storage, cosine.min())
+        assert store.vectors(["missing"]) == [None]
+        assert np.isnan(store.similarities(vectors[0], ["missing"])[0])
+        print(f"✓ {storage}: worst cosine to the original {cosine.min():.4f}")
+    assert CompressedVectorFile(str(tmp_path / "pq"), "pq", pq_subspaces=8).stats()['bytes_per_vector'] == 8
+
+
+def test_pq_trains_once(tmp_path):
+    """PQ vectors wait in float16 staging until train_size arrive, then the codebooks are trained once."""
+    print("🧪 Testing product quantizer training...")
+    from compressed_store import CompressedVectorFile, ProductQuantizer
+
+    store = CompressedVectorFile(str(tmp_path), "pq", pq_subspaces=8, train_size=500)
+    vectors = random_vectors(800)
+    with mock.patch.object(ProductQuantizer, "train", autospec=True, side_effect=ProductQuantizer.train) as train:
+        store.put([f"c{i}" for i in range(499)], vectors[:499])
+        assert not store.stats()['trained'] and os.path.exists(os.path.join(str(tmp_path), "staging.bin"))
+        store.put(["c499"], vectors[499:500])
+        assert store.stats()['trained'] and train.call_count == 1
+        assert not os.path.exists(os.path.join(str(tmp_path), "staging.bin"))
+        store.put([f"c{i}" for i in range(500, 800)], vectors[500:])
+        assert train.call_count == 1
+    assert train.call_args[0][1].shape == (500, 32)
+    assert np.load(os.path.join(str(tmp_path), "codebooks.npy")).shape == (8, 256, 4)
+    # Staged vectors were encoded with the new codebooks, not left behind
+    decoded = np.stack(store.vectors(["c0", "c799"]))
+    assert ((decoded * vectors[[0, 799]]).sum(axis=1) > 0.6).all()
+    print("✓ Trained once at train_size; staged and later vectors are encoded")
+
+
+def test_deleted_rows_are_reused(tmp_path):
+    """A deleted chunk's row goes on the free list and is handed to the next new chunk."""
+    from compressed_store import CompressedVectorFile
+
+    store = CompressedVectorFile(str(tmp_path), "float16")
+    vectors = random_vectors(12)
+    store.put([f"c{i}" for i in range(10)], vectors[:10])
+    store.delete(["c3", "c7"])
+    assert store.vectors(["c3"]) == [None] and store.stats()['vectors'] == 8
+    store.put(["c10", "c11"], vectors[10:])
+    assert sorted(store._rows(["c10", "c11"]).values()) == [3, 7]
+    assert store._meta("next_row") == "10"
+    assert_own_vectors(store, vectors, ["c10", "c11", "c9"], 1e-3)
+    print("✓ Rows of deleted chunks are reused")
+
+
+def test_reopen(tmp_path):
+    """Vectors, the row map and the trained codebooks are read back by a new instance."""
+    from compressed_store import CompressedVectorFile
+
+    vectors = random_vectors(700)
+    ids = [f"c{i}" for i in range(700)]
+    for storage, train_size in (("float16", 4096), ("pq", 500)):
+        directory = str(tmp_path / storage)
+        store = CompressedVectorFile(directory, storage, pq_subspaces=8, train_size=train_size)
+        store.put(ids, vectors)
+        before = store.vectors(ids)
+        reopened = CompressedVectorFile(directory, storage, pq_subspaces=8, train_size=train_size)
+        assert reopened.stats() == store.stats()
+        assert all(np.array_equal(a, b) for a, b in zip(before, reopened.vectors(ids)))
+    print("✓ float16 and pq files reopen with identical vectors")
+
+
+def test_search_recall(tmp_path):
+    """Compressed collections find most of the exact top 10 of the uncompressed store."""
+    print("🧪 Testing compressed search recall...")
+    from vector_store import VectorStore
+
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa", "lambda", "sigma"]
+    rng = np.random.default_rng(3)
+    documents = [" ".join(rng.choice(words, 12)) + f" item{i}." for i in range(600)]
+    queries = [" ".join(rng.choice(words, 4)) for _ in range(20)]
+
+    exact = VectorStore(collection_name="exact", persist_directory=str(tmp_path / "exact"))
+    exact.add_documents(documents)
+    truth = [{hit['id'] for hit in exact.search(query, 10, max_context_chars=1 << 30)} for query in queries]
+    for storage, minimum in (("float16", 0.9), ("pq", 0.75)):
+        store = VectorStore(collection_name="compressed", persist_directory=str(tmp_path / storage),
+                            vector_storage=storage, pq_subspaces=16)
+        store.collection.vectors.train_size = 400
+        store.add_documents(documents)
+        found = [{hit['id'] for hit in store.search(query, 10, max_context_chars=1 << 30)} for query in queries]
+        recall = np.mean([len(a & b) / len(a) for a, b in zip(found, truth)])
+        assert recall >= minimum, (storage, recall)
+        print(f"✓ {storage}: recall@10 {recall:.2f} against the uncompressed store")
+
+
+def test_compact(tmp_path):
+    """compact() drops deleted rows from the memory map and the free list, and survives a reopen."""
+    print("🧪 Testing compressed vector file compaction...")
+    from compressed_store import CompressedVectorFile
+
+    for storage, train_size in (("float16", 4096), ("pq", 4096), ("pq", 500)):
+        directory = str(tmp_path / f"{storage}-{train_size}")
+        store = CompressedVectorFile(directory, storage, pq_subspaces=8, train_size=train_size)
+        vectors = random_vectors(3000)
+        store.put([f"c{i}" for i in range(3000)], vectors)
+        store.delete([f"c{i}" for i in range(0, 3000, 2)])
+        before = store.stats()['disk_bytes']
+        expected = dict(zip([f"c{i}" for i in range(1, 3000, 2)], store.vectors([f"c{i}" for i in range(1, 3000, 2)])))
+
+        assert store.compact() == {'rows_before': 3000, 'rows_after': 1500}
+        store.vacuum()
+        assert store.stats()['disk_bytes'] < before, (storage, store.stats(), before)
+        assert store._conn.execute("SELECT COUNT(*) FROM free_rows").fetchone()[0] == 0
+        reopened = CompressedVectorFile(directory, storage, pq_subspaces=8, train_size=train_size)
+        assert reopened.stats()['vectors'] == 1500
+        for chunk_id, vector in zip(expected, reopened.vectors(list(expected))):
+            assert np.array_equal(vector, expected[chunk_id]), (storage, chunk_id)
+        if storage == "float16":
+            assert_own_vectors(reopened, vectors, [f"c{i}" for i in range(1, 3000, 2)], 1e-3)
+        # New rows go after the compacted ones
+        reopened.put(["new"], random_vectors(1, seed=1))
+        assert reopened._rows(["new"]) == {"new": 1500}
+    print("✓ float16, staged and trained pq files shrink and keep every live vector")
+
+
+def test_interrupted_compaction(tmp_path):
+    """A compaction that stops before or after its commit is undone or finished on open."""
+    from compressed_store import CompressedVectorFile
+
+    store = CompressedVectorFile(str(tmp_path), "float16")
+    vectors = random_vectors(2000)
+    store.put([f"c{i}" for i in range(2000)], vectors)
+    store.delete([f"c{i}" for i in range(0, 2000, 3)])
+    live = [f"c{i}" for i in range(2000) if i % 3]
+    compacted_path = os.path.join(str(tmp_path), "codes.bin.compact")
+
+    # Stopped after the renumbering committed, before the compacted file replaced the old one
+    with mock.patch("compressed_store.os.replace", side_effect=OSError("killed")):
+        try:
+            store.compact()
+        except OSError:
+            pass
+    assert os.path.exists(compacted_path)
+    reopened = CompressedVectorFile(str(tmp_path), "float16")
+    assert not os.path.exists(compacted_path)
+    assert_own_vectors(reopened, vectors, live, 1e-3)
+
+    # Stopped before the commit: the leftover compacted file is discarded
+    open(compacted_path, "wb").write(b"\0" * 64)
+    reopened = CompressedVectorFile(str(tmp_path), "float16")
+    assert not os.path.exists(compacted_path)
+    assert_own_vectors(reopened, vectors, live, 1e-3)
+    print("✓ Interrupted compactions recover on open")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="compressed-store-"))
+    try:
+        tests = (test_round_trip, test_pq_trains_once, test_deleted_rows_are_reused, test_reopen,
+                 test_search_recall, test_compact, test_interrupted_compaction)
+        for i, test in enumerate(tests):
+            (directory / str(i)).mkdir()
+            test(directory / str(i))
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All compressed store tests passed!")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import sys
+
+
+def hit(doc_id, chunk_index, content, score):
+    return {'id': f"{doc_id}_chunk_{chunk_index}", 'content': content, 'score': score,
+            'metadata': {'parent_doc_id': doc_id, 'chunk_index': chunk_index, 'title': doc_id}}
+
+
+def test_overlap_at_chunk_boundary():
+    """Consecutive chunks merge into one segment that carries their shared overlap once."""
+    print("🧪 Testing chunk overlap removal...")
+    from context_packer import pack_context
+
+    overlap = "the shared sentence at the boundary."
+    first = "The first chunk starts here and ends with " + overlap
+    second = overlap + " The second chunk carries on from there."
+    packed = pack_context([hit("doc", 1, second, 0.8), hit("doc", 0, first, 0.9)], max_chars=1000)
+    assert len(packed['segments']) == 1, packed['segments']
+    segment = packed['segments'][0]
+    assert segment['chunk_indices'] == [0, 1] and segment['ids'] == ["doc_chunk_0", "doc_chunk_1"]
+    assert segment['content'] == first + " The second chunk carries on from there."
+    assert packed['context'].count(overlap) == 1 and packed['dropped'] == 0
+
+    # Chunks that are not consecutive, or share less than a real overlap, are kept whole
+    packed = pack_context([hit("doc", 0, first, 0.9), hit("doc", 2, second, 0.8)], max_chars=1000)
+    assert len(packed['segments']) == 2 and packed['context'].count(overlap) == 2
+    short = pack_context([hit("doc", 0, "Ends with a word.", 0.9), hit("doc", 1, "word. Next.", 0.8)], 1000)
+    assert short['segments'][0]['content'] == "Ends with a word. word. Next."
+    print("✓ Overlap between consecutive chunks appears once")
+
+
+def test_budget_smaller_than_best_chunk():
+    """A top hit that cannot fit is skipped in favour of lower-ranked hits that do."""
+    from context_packer import pack_context
+
+    hits = [hit("long", 0, "x" * 500, 0.95), hit("a", 0, "A short answer.", 0.6), hit("b", 0, "Another one.", 0.5)]
+    packed = pack_context(hits, max_chars=100)
+    assert [segment['doc_id'] for segment in packed['segments']] == ["a", "b"], packed['segments']
+    assert packed['chars'] <= 100 and packed['chars'] == len(packed['context'])
+    assert packed['dropped'] == 1
+    # Nothing fits at all
+    packed = pack_context(hits, max_chars=10)
+    assert packed['context'] == "" and packed['segments'] == [] and packed['dropped'] == 3
+    print("✓ Hits larger than the budget are skipped, not truncated")
+
+
+def test_output_order():
+    """Chosen segments are emitted most relevant first, whatever order they were picked in."""
+    from context_packer import pack_context
+
+    hits = [
+        hit("first", 0, "The best hit is rather long. " * 5, 0.9),
+        hit("second", 0, "Short.", 0.3),
+        hit("third", 3, "Third ranked.", 0.2),
+        hit("third", 2, "Fourth ranked, merged before the third.", 0.1),
+    ]
+    packed = pack_context(hits, max_chars=4000)
+    assert [segment['doc_id'] for segment in packed['segments']] == ["first", "second", "third"]
+    assert packed['segments'][2]['chunk_indices'] == [2, 3]
+    assert packed['context'].index("[first]") < packed['context'].index("[second]") < packed['context'].index("[third]")
+    print("✓ Segments come out in rank order; a merged segment takes its best rank")
+
+
+if __name__ == "__main__":
+    try:
+        test_overlap_at_chunk_boundary()
+        test_budget_smaller_than_best_chunk()
+        test_output_order()
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    print("\n🎉 All context packer tests passed!")
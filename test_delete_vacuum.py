@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import threading
+
+
+DOCUMENTS = [
+    {"content": f"Record {i} belongs to group {i % 5}. " + "It repeats a few words to take up space. " * 8,
+     "metadata": {"title": f"record-{i}", "source": f"group-{i % 5}"}}
+    for i in range(1200)
+]
+
+
+def segment_directories(directory):
+    return [name for name in os.listdir(directory) if re.match(r'^[0-9a-f]{8}-[0-9a-f-]{27}$', name)]
+
+
+def test_delete_documents(tmp_path):
+    """Bulk deletes by id and by filter remove documents from the collection, keyword index and registry."""
+    print("🧪 Testing bulk deletes...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="deletes", persist_directory=str(tmp_path))
+    store.add_documents(DOCUMENTS[:300])
+    doc_ids = [document['doc_id'] for document in store.list_documents(0, 300)]
+
+    result = store.delete_documents(doc_ids[:120], batch_size=50)
+    assert result['deleted_documents'] == 120 and result['batches'] == 3, result
+    result = store.delete_documents(source="group-1")
+    assert result['deleted_documents'] > 0, result
+
+    info = store.get_collection_info()
+    assert info['unique_documents'] == store.collection.count() == 300 - 120 - result['deleted_documents'], info
+    remaining = {hit['metadata']['parent_doc_id'] for hit in store.search("record group", 50, mode="keyword")}
+    assert not remaining & set(doc_ids[:120])
+    assert not store.search("record group", 5, mode="keyword", source="group-1")
+    # Pre-migration documents were stored as one chunk whose id is the document id
+    legacy = [f"Legacy record {i} from before parent_doc_id." for i in range(3)]
+    store.collection.add(ids=[f"legacy-{i}" for i in range(3)], documents=legacy, embeddings=store._embed_texts(legacy),
+                         metadatas=[{"title": f"legacy-{i}", "source": "legacy"} for i in range(3)])
+    count = store.collection.count()
+    result = store.delete_documents(["legacy-0", doc_ids[150]])
+    assert result['deleted_chunks'] == 2 and store.collection.count() == count - 2, result
+    assert not store.collection.get(ids=["legacy-0"])['ids']
+    result = store.delete_documents(where={"source": "legacy"})
+    assert result['deleted_chunks'] == 2 and not store.collection.get(where={"source": "legacy"})['ids'], result
+    try:
+        store.delete_documents()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("an unscoped delete was accepted")
+    print(f"✓ Deleted by id in batches and by source; {info['unique_documents']} documents left")
+
+
+def vacuum_after_deletes(store):
+    store.add_documents(DOCUMENTS)
+    keep = [document['doc_id'] for document in store.list_documents(0, 200)]
+    store.delete_documents([document['doc_id'] for document in store.list_documents(200, len(DOCUMENTS))])
+    # Compared by score: equally scored hits may come back in either order
+    before = [round(hit['score'], 5) for hit in store.search("record group three", 5)]
+
+    result = store.vacuum()
+    assert result['bytes_freed'] > 0 and result['bytes_after'] < result['bytes_before'], result
+    assert result['chunks'] == len(keep) == store.get_collection_info()['unique_documents']
+    store.query_cache.clear()
+    hits = store.search("record group three", 5)
+    after = [round(hit['score'], 5) for hit in hits]
+    assert {hit['metadata']['parent_doc_id'] for hit in hits} <= set(keep)
+    # The rebuilt HNSW graph has no deleted nodes left to route around, so it can only do better
+    assert len(after) == len(before) and all(a >= b for a, b in zip(after, before)), (before, after)
+    return result
+
+
+def test_vacuum_reclaims_space(tmp_path):
+    """Vacuum shrinks the Chroma files, replaces only its own index segment and keeps search results."""
+    print("🧪 Testing vacuum...")
+    from vector_store import VectorStore
+
+    neighbour = VectorStore(collection_name="neighbour", persist_directory=str(tmp_path))
+    neighbour.add_documents(DOCUMENTS[:20])
+    neighbour_segments = segment_directories(tmp_path)
+    assert len(neighbour_segments) == 1, neighbour_segments
+    store = VectorStore(collection_name="vacuum", persist_directory=str(tmp_path))
+    result = vacuum_after_deletes(store)
+    assert len(segment_directories(tmp_path)) == 2, segment_directories(tmp_path)
+    assert set(neighbour_segments) < set(segment_directories(tmp_path))
+    neighbour.query_cache.clear()
+    assert neighbour.search("record group", 3)
+    for name in ("document_registry.sqlite3-wal", os.path.join("bm25", "vacuum.sqlite3-wal")):
+        path = tmp_path / name
+        assert not path.exists() or path.stat().st_size == 0, name
+    print(f"✓ Freed {result['bytes_freed']} bytes; search results unchanged")
+
+    store.vacuum()
+    assert len(segment_directories(tmp_path)) == 2, segment_directories(tmp_path)
+    assert set(neighbour_segments) < set(segment_directories(tmp_path))
+    print("✓ Repeated vacuums leave no orphaned index segments and keep other collections' ones")
+
+
+def test_search_during_vacuum(tmp_path):
+    """Searches running while vacuum swaps in the rebuilt collection never see it missing."""
+    print("🧪 Testing searches during vacuum...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="busy", persist_directory=str(tmp_path))
+    store.add_documents(DOCUMENTS[:400])
+    store.delete_documents([document['doc_id'] for document in store.list_documents(100, 400)])
+    errors, done = [], threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                store.query_cache.clear()
+                assert store.search("record group", 3)
+                assert store.get_collection_info()['total_chunks'] == 100
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(2):
+            store.vacuum()
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert not errors, errors[:3]
+    print("✓ Searches kept working through two vacuums")
+
+
+def test_vacuum_flat_collection(tmp_path):
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="vacuum", persist_directory=str(tmp_path), index_backend="flat")
+    result = vacuum_after_deletes(store)
+    assert store.collection.stats()['tombstones'] == 0
+    print(f"✓ Flat collection compacted; freed {result['bytes_freed']} bytes")
+
+
+def test_vacuum_compressed_collection(tmp_path):
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="vacuum", persist_directory=str(tmp_path), vector_storage="float16")
+    store.add_documents(DOCUMENTS)
+    before = store.collection.vectors.stats()['disk_bytes']
+    vacuum_after_deletes(store)
+    stats = store.collection.vectors.stats()
+    assert stats['disk_bytes'] < before and stats['vectors'] == 200, (before, stats)
+    print(f"✓ Compressed vectors compacted from {before} to {stats['disk_bytes']} bytes")
+
+
+def test_interrupted_vacuum_recovers(tmp_path):
+    """A vacuum that stopped at any point of its swap leaves exactly one complete collection."""
+    print("🧪 Testing recovery from an interrupted vacuum...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="swap", persist_directory=str(tmp_path))
+    store.add_documents(DOCUMENTS[:50])
+    temp_name, old_name = store._vacuum_names()
+
+    def copy_collection(rows):
+        original = store.collection
+        copy = store.client.create_collection(temp_name, metadata=dict(original.metadata))
+        page = original.get(include=["embeddings", "documents", "metadatas"], limit=rows)
+        copy.add(ids=page['ids'], embeddings=page['embeddings'], documents=page['documents'],
+                 metadatas=page['metadatas'])
+        return original
+
+    def reopen():
+        reopened = VectorStore(collection_name="swap", persist_directory=str(tmp_path))
+        assert reopened.collection.count() == 50
+        names = {getattr(item, "name", item) for item in reopened.client.list_collections()}
+        assert not names & {temp_name, old_name}, names
+        store._collection = None
+
+    # Stopped while copying: the partial copy is discarded
+    copy_collection(10)
+    reopen()
+    # Stopped between the renames: the complete copy takes the name
+    copy_collection(None).modify(name=old_name)
+    reopen()
+    # Stopped before the replaced original was deleted
+    original = copy_collection(None)
+    original.modify(name=old_name)
+    store.client.get_collection(temp_name).modify(name="swap")
+    reopen()
+    print("✓ Every interrupted swap recovers to one complete collection")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="delete-vacuum-"))
+    try:
+        tests = (test_delete_documents, test_vacuum_reclaims_space, test_search_during_vacuum,
+                 test_vacuum_flat_collection, test_vacuum_compressed_collection, test_interrupted_vacuum_recovers)
+        for i, test in enumerate(tests):
+            (directory / str(i)).mkdir()
+            test(directory / str(i))
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All delete and vacuum tests passed!")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import sys
+import shutil
+import tempfile
+
+
+def build_store(directory):
+    from vector_store import VectorStore
+    store = VectorStore(collection_name="filtered", persist_directory=str(directory))
+    store.add_documents([
+        {"content": f"Document {i} is about thing number {i}. This sentence mentions a thing.",
+         "metadata": {"title": f"t{i}", "source": f"source-{i % 2}"}}
+        for i in range(200)
+    ])
+    return store
+
+
+def test_selective_keyword_filter(tmp_path):
+    """A filter matching one document still finds its keyword hits among 200 matching documents."""
+    print("🧪 Testing filtered keyword search...")
+    store = build_store(tmp_path)
+
+    hits = store.search("thing sentence", 3, mode="keyword", title="t7")
+    assert hits and all(hit['metadata']['title'] == "t7" for hit in hits), hits
+    print("✓ Keyword search scoped to one document by title")
+
+    hits = store.search("thing sentence", 3, mode="hybrid", title="t7")
+    assert hits and all(hit['metadata']['title'] == "t7" for hit in hits), hits
+    assert any(hit['distance'] is not None for hit in hits)
+    print("✓ Hybrid search keeps its keyword ranking under the same filter")
+
+    hits = store.search("thing sentence", 3, mode="keyword", where={"title": "t123"})
+    assert hits and hits[0]['metadata']['title'] == "t123", hits
+    print("✓ Chunk-level where filter pages through BM25 hits until one passes")
+
+
+def test_broad_keyword_filter(tmp_path):
+    """Filters too broad to list their documents still return filtered keyword hits."""
+    store = build_store(tmp_path)
+    store.PREFILTER_MAX_DOCUMENTS = 10
+    hits = store.search("thing sentence", 5, mode="keyword", source="source-1")
+    assert len(hits) == 5 and all(hit['metadata']['source'] == "source-1" for hit in hits), hits
+    assert not store.search("thing sentence", 5, mode="keyword", where={"title": "missing"})
+    print("✓ Broad filters fall back to filtering BM25 hits")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="filtered-search-"))
+    try:
+        (directory / "a").mkdir()
+        (directory / "b").mkdir()
+        test_selective_keyword_filter(directory / "a")
+        test_broad_keyword_filter(directory / "b")
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All filtered search tests passed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+
+def build(directory, n=3000, dim=16):
+    from flat_index import FlatCollection
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    collection = FlatCollection(str(directory), min_compact_rows=1 << 30)
+    collection.upsert(
+        ids=[f"c{i}" for i in range(n)], embeddings=vectors, documents=[f"chunk {i}" for i in range(n)],
+        metadatas=[{"parent_doc_id": f"d{i // 3}", "source": f"s{i % 7}", "chunk_index": i % 3} for i in range(n)]
+    )
+    return collection, vectors
+
+
+def assert_own_vectors(collection, vectors, ids):
+    stored = collection.get(ids=ids, include=["embeddings"])
+    expected = vectors[[int(chunk_id[1:]) for chunk_id in stored['ids']]]
+    assert sorted(stored['ids']) == sorted(ids)
+    assert np.allclose(stored['embeddings'], expected, atol=1e-6)
+
+
+def test_filters_use_metadata_indexes(tmp_path):
+    """parent_doc_id and source filters are answered from an index, not a table scan."""
+    print("🧪 Testing flat index metadata filters...")
+    from flat_index import where_to_sql
+    collection, _ = build(tmp_path)
+    for where in ({"parent_doc_id": {"$in": ["d1", "d2"]}}, {"source": "s3"},
+                  {"$and": [{"parent_doc_id": "d5"}, {"chunk_index": {"$ne": 0}}]}):
+        sql, params = where_to_sql(where)
+        plan = " ".join(str(row) for row in collection._conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT row FROM chunks WHERE {sql}", params))
+        assert "USING INDEX chunks_by_" in plan, (where, plan)
+    assert collection.get(where={"parent_doc_id": {"$in": ["d1", "d2"]}}, include=[])['ids'] == \
+        ["c3", "c4", "c5", "c6", "c7", "c8"]
+    assert len(collection.get(where={"$and": [{"parent_doc_id": "d5"}, {"chunk_index": {"$ne": 0}}]})['ids']) == 2
+    print("✓ Scoped reads use the parent_doc_id and source indexes")
+
+
+def test_compact_keeps_vectors(tmp_path):
+    """After compact() and a reopen, every id still returns its own vector."""
+    print("🧪 Testing flat index compaction...")
+    from flat_index import FlatCollection
+    collection, vectors = build(tmp_path)
+    collection.delete(ids=[f"c{i}" for i in range(0, 3000, 2)])
+    assert collection.compact() == {'rows_before': 3000, 'rows_after': 1500}
+    live = [f"c{i}" for i in range(1, 3000, 2)]
+    assert_own_vectors(collection, vectors, live)
+
+    reopened = FlatCollection(str(tmp_path))
+    assert reopened.count() == 1500
+    assert_own_vectors(reopened, vectors, live)
+    hits = reopened.query(vectors[[7, 1001]], n_results=1)
+    assert hits['ids'] == [["c7"], ["c1001"]], hits['ids']
+    print("✓ Compacted vectors survive a reopen")
+
+
+def test_interrupted_compaction(tmp_path):
+    """A compaction that stops before or after its commit is undone or finished on open."""
+    from flat_index import FlatCollection
+    collection, vectors = build(tmp_path)
+    collection.delete(ids=[f"c{i}" for i in range(0, 3000, 3)])
+    live = [f"c{i}" for i in range(3000) if i % 3]
+
+    # Stopped after the renumbering committed, before the compacted file replaced the old one
+    with mock.patch("flat_index.os.replace", side_effect=OSError("killed")):
+        try:
+            collection.compact()
+        except OSError:
+            pass
+    assert os.path.exists(os.path.join(str(tmp_path), "vectors.bin.compact"))
+    reopened = FlatCollection(str(tmp_path))
+    assert not os.path.exists(os.path.join(str(tmp_path), "vectors.bin.compact"))
+    assert_own_vectors(reopened, vectors, live)
+
+    # Stopped before the commit: the leftover compacted file is discarded
+    open(os.path.join(str(tmp_path), "vectors.bin.compact"), "wb").write(b"\0" * 64)
+    reopened = FlatCollection(str(tmp_path))
+    assert not os.path.exists(os.path.join(str(tmp_path), "vectors.bin.compact"))
+    assert_own_vectors(reopened, vectors, live)
+    print("✓ Interrupted compactions recover on open")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="flat-index-"))
+    try:
+        tests = (test_filters_use_metadata_indexes, test_compact_keeps_vectors, test_interrupted_compaction)
+        for i, test in enumerate(tests):
+            (directory / str(i)).mkdir()
+            test(directory / str(i))
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All flat index tests passed!")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+COMPLETION = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "deepseek-r1-distill-llama-70b",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "Hello from the fake endpoint"},
+        "finish_reason": "stop"
+    }],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10}
+}
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """Serves a scripted sequence of responses for /openai/v1/chat/completions."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status, headers, delay = server.script.pop(0) if server.script else (200, {}, 0)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+
+        time.sleep(delay)
+        body = json.dumps(COMPLETION if status == 200 else {"error": {"message": f"status {status}"}}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_groq(script):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGroqHandler)
+    server.script = list(script)
+    server.requests = 0
+    server.active = 0
+    server.max_active = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_client(base_url, **kwargs):
+    import os
+    os.environ.setdefault("GROQ_API_KEY", "test-key")
+    from groq_client import GroqClient
+    client = GroqClient(base_url=base_url, **kwargs)
+    client.backoff_base = 0.01
+    return client
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_retries_rate_limit_and_server_errors():
+    """429 (honoring retry-after) and 503 responses are retried until the request succeeds."""
+    print("🧪 Testing retries against a fake Groq endpoint...")
+    server, url = start_fake_groq([
+        (429, {"retry-after": "0.2"}, 0),
+        (503, {}, 0),
+    ])
+    try:
+        client = make_client(url, max_retries=3)
+        started = time.perf_counter()
+        response = client.chat_completion(MESSAGES)
+        elapsed = time.perf_counter() - started
+
+        assert response is not None and response.choices[0].message.content == COMPLETION["choices"][0]["message"]["content"]
+        assert server.requests == 3, server.requests
+        assert elapsed >= 0.2, f"retry-after was not honored ({elapsed:.2f}s)"
+        print(f"✓ Succeeded after {server.requests} requests in {elapsed:.2f}s")
+    finally:
+        server.shutdown()
+
+
+def test_gives_up_on_client_errors():
+    """4xx errors other than 429 are not retried and chat_completion returns None."""
+    server, url = start_fake_groq([(400, {}, 0)])
+    try:
+        client = make_client(url, max_retries=3)
+        assert client.chat_completion(MESSAGES) is None
+        assert server.requests == 1, server.requests
+        print("✓ 400 was not retried")
+    finally:
+        server.shutdown()
+
+
+def test_timeout_is_retried():
+    """A response slower than the timeout counts as a failed attempt and is retried."""
+    server, url = start_fake_groq([(200, {}, 1.0)])
+    try:
+        client = make_client(url, timeout=0.3, max_retries=1)
+        response = client.chat_completion(MESSAGES)
+        assert response is not None
+        assert server.requests == 2, server.requests
+        print("✓ Timed-out request was retried")
+    finally:
+        server.shutdown()
+
+
+def test_concurrency_limit():
+    """No more than max_concurrency requests are in flight at once."""
+    server, url = start_fake_groq([(200, {}, 0.2)] * 6)
+    try:
+        client = make_client(url, max_concurrency=2)
+        threads = [threading.Thread(target=client.chat_completion, args=(MESSAGES,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert server.requests == 6
+        assert server.max_active <= 2, server.max_active
+        print(f"✓ At most {server.max_active} concurrent requests")
+    finally:
+        server.shutdown()
+
+
+def test_backoff_releases_slot():
+    """A request waiting to retry a 429 does not hold its concurrency slot."""
+    server, url = start_fake_groq([(429, {"retry-after": "0.5"}, 0)])
+    try:
+        client = make_client(url, max_concurrency=1, max_retries=1)
+        retrying = threading.Thread(target=client.chat_completion, args=(MESSAGES,))
+        retrying.start()
+        time.sleep(0.1)
+        started = time.perf_counter()
+        assert client.chat_completion(MESSAGES) is not None
+        elapsed = time.perf_counter() - started
+        retrying.join()
+        assert server.requests == 3, server.requests
+        assert elapsed < 0.4, f"waited {elapsed:.2f}s for the backing-off request"
+        print(f"✓ Second request ran during the first one's backoff ({elapsed:.2f}s)")
+    finally:
+        server.shutdown()
+
+
+def test_rate_limit_headers():
+    from groq_client import rate_limit_delay
+    assert rate_limit_delay({"retry-after": "3"}) == 3.0
+    assert abs(rate_limit_delay({
+        "x-ratelimit-remaining-tokens": "0",
+        "x-ratelimit-reset-tokens": "2m59.56s"
+    }) - 179.56) < 1e-6
+    assert rate_limit_delay({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "1s"}) is None
+    print("✓ Rate-limit headers parsed")
+
+
+if __name__ == "__main__":
+    try:
+        test_rate_limit_headers()
+        test_retries_rate_limit_and_server_errors()
+        test_gives_up_on_client_errors()
+        test_timeout_is_retried()
+        test_concurrency_limit()
+        test_backoff_releases_slot()
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    print("\n🎉 All GroqClient tests passed!")
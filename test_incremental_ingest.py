@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import sys
+import shutil
+import tempfile
+
+
+SENTENCES = [f"Sentence {i} describes part {i} of the incremental ingest test." for i in range(60)]
+
+
+def test_duplicates_in_one_batch(tmp_path):
+    """The same content twice in one write batch is written once instead of failing the batch."""
+    print("🧪 Testing duplicate documents within one batch...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="duplicates", persist_directory=str(tmp_path))
+    result = store.add_documents(["same text here.", "other text.", "same text here."])
+    assert result['failed'] == 0 and result['added'] == 3, result
+    assert store.get_collection_info()['unique_documents'] == 2
+    assert store.collection.count() == 2
+
+    result = store.add_documents([
+        {"content": "titled twice.", "metadata": {"title": "first"}},
+        {"content": "titled twice.", "metadata": {"title": "second"}},
+    ])
+    assert result['failed'] == 0, result
+    hit = store.search("titled twice", 1, title="second")
+    assert hit and hit[0]['metadata']['title'] == "second", hit
+    print("✓ Duplicates share one document; the last copy wins")
+
+    path = tmp_path / "twice.txt"
+    path.write_text("A file listed twice in one call.", encoding='utf-8')
+    result = store.add_files([str(path), str(path)])
+    assert result['failed'] == 0, result
+    assert store.collection.count() == 4
+    print("✓ A path listed twice is ingested once")
+
+
+def test_changed_file_is_reingested_incrementally(tmp_path):
+    """Re-ingesting a changed file embeds only new chunks and drops the ones that disappeared."""
+    print("🧪 Testing incremental re-ingest of a changed file...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="incremental", persist_directory=str(tmp_path / "db"), chunk_size=200)
+    path = tmp_path / "notes.txt"
+    path.write_text(" ".join(SENTENCES), encoding='utf-8')
+    doc_id = store.add_file(str(path))
+    before = store.collection.get(where={"parent_doc_id": doc_id}, include=[])['ids']
+    assert len(before) > 3, before
+
+    unchanged = store._write_documents([store._load_file(str(path))])
+    assert unchanged == {'embedded': 0, 'updated': 0, 'deleted': 0, 'unchanged_documents': 1}, unchanged
+    print("✓ Unchanged file is skipped")
+
+    # Rewrite the end of the file and drop some of it
+    path.write_text(" ".join(SENTENCES[:40] + ["A brand new closing sentence."]), encoding='utf-8')
+    written = store._write_documents([store._load_file(str(path))])
+    after = store.collection.get(where={"parent_doc_id": doc_id}, include=["metadatas"])
+    assert 0 < written['embedded'] < len(after['ids']), written
+    assert written['deleted'] > 0, written
+    assert set(after['ids']) & set(before), "unchanged chunks should keep their ids"
+    assert sorted(meta['chunk_index'] for meta in after['metadatas']) == list(range(len(after['ids'])))
+    assert all(meta['total_chunks'] == len(after['ids']) for meta in after['metadatas'])
+    assert store.registry.get_document(store.collection_name, doc_id)['chunk_count'] == len(after['ids'])
+    assert store.search("brand new closing sentence", 1)[0]['metadata']['parent_doc_id'] == doc_id
+    print(f"✓ Embedded {written['embedded']} new chunks, deleted {written['deleted']} stale ones")
+
+
+def test_failed_document_in_batch(tmp_path):
+    """A document the collection rejects fails alone; the rest of its write batch is stored."""
+    print("🧪 Testing a failing document within one batch...")
+    from vector_store import VectorStore
+
+    store = VectorStore(collection_name="partial", persist_directory=str(tmp_path))
+    documents = [{"content": f"Good document {i}.", "metadata": {"title": f"good-{i}"}} for i in range(5)]
+    documents.insert(2, {"content": "Rejected document.", "metadata": {"title": "bad", "nested": {"a": 1}}})
+    result = store.add_documents(documents)
+    assert result['added'] == 5 and result['failed'] == 1, result
+    assert [failure['source'] for failure in result['failures']] == ["2"], result['failures']
+    assert store.collection.count() == 5 and store.get_collection_info()['unique_documents'] == 5
+    print("✓ Only the rejected document is reported as failed")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="incremental-ingest-"))
+    try:
+        (directory / "a").mkdir()
+        (directory / "b").mkdir()
+        (directory / "c").mkdir()
+        test_duplicates_in_one_batch(directory / "a")
+        test_changed_file_is_reingested_incrementally(directory / "b")
+        test_failed_document_in_batch(directory / "c")
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All incremental ingest tests passed!")
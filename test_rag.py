@@ -45,7 +45,7 @@ def test_basic_functionality():
     result_data = json.loads(result)
     if result_data.get("success"):
         info = result_data.get("collection_info", {})
-        print(f"✓ Collection has {info.get('count')} documents")
+        print(f"✓ Collection has {info.get('unique_documents')} documents in {info.get('total_chunks')} chunks")
     else:
         print(f"✗ Failed to get collection info: {result_data.get('error')}")
     
@@ -64,6 +64,20 @@ def test_basic_functionality():
         print(f"✗ Search failed: {result_data.get('error')}")
         return False
     
+    print("\n4b. Testing hybrid search...")
+    result = client.execute_tool("search_documents", {
+        "query": "Python programming language",
+        "n_results": 2,
+        "mode": "hybrid"
+    })
+    result_data = json.loads(result)
+    if result_data.get("success") and result_data.get("results"):
+        top = result_data["results"][0]
+        print(f"✓ Hybrid search returned {result_data['count']} results (top score: {top['score']:.4f})")
+    else:
+        print(f"✗ Hybrid search failed: {result_data.get('error')}")
+        return False
+    
     print("\n5. Testing chat with tools...")
     response = client.chat_with_tools("What programming languages are good for beginners?")
     print(f"✓ Chat response: {response[:100]}...")
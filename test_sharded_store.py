@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import gc
+import sys
+import shutil
+import tempfile
+import weakref
+
+
+DOCUMENTS = [
+    {"content": f"Document {i} explains topic {i % 4}: " + text, "metadata": {"title": f"doc-{i}", "source": f"test-{i % 3}"}}
+    for i, text in enumerate([
+        "Python lists are dynamic arrays that grow by over-allocating.",
+        "Vector databases index embeddings for nearest-neighbour search.",
+        "HNSW builds a layered proximity graph over the vectors.",
+        "Sharding splits a collection across several independent stores.",
+        "Reciprocal rank fusion combines several rankings into one.",
+        "A cross-encoder scores a query and a passage together.",
+        "Product quantization stores each vector as a few bytes.",
+        "SQLite write-ahead logging lets readers run during writes.",
+        "Process pools sidestep the global interpreter lock.",
+        "BM25 ranks documents by term frequency and rarity.",
+        "Memory-mapped files are paged in by the operating system.",
+        "Scatter-gather sends a request to every shard and merges the answers.",
+    ])
+]
+
+
+def test_routing_and_search(tmp_path):
+    """Documents land on the shard that owns their id, and merged search matches a single store."""
+    print("🧪 Testing ShardedVectorStore with 3 shard processes...")
+    from sharded_store import ShardedVectorStore
+    from vector_store import VectorStore
+
+    store = ShardedVectorStore(num_shards=3, persist_directory=str(tmp_path / "shards"))
+    try:
+        result = store.add_documents(DOCUMENTS)
+        assert result['added'] == len(DOCUMENTS) and not result['failures'], result
+        print(f"✓ Added {result['added']} documents, {result['chunks']} chunks")
+
+        per_shard = [store._submit(shard, "list_documents", 0, 100).result() for shard in range(3)]
+        assert sum(len(documents) for documents in per_shard) == len(DOCUMENTS)
+        for shard, documents in enumerate(per_shard):
+            assert all(store.shard_for(document['doc_id']) == shard for document in documents)
+        print(f"✓ Documents per shard: {[len(documents) for documents in per_shard]}")
+
+        single = VectorStore(collection_name="single", persist_directory=str(tmp_path / "single"))
+        single.add_documents(DOCUMENTS)
+        for query in ("how does sharding work", "graph index for vectors", "ranking documents by terms"):
+            sharded_hits = store.search(query, 4)
+            single_hits = single.search(query, 4)
+            scores = [hit['score'] for hit in sharded_hits]
+            assert scores == sorted(scores, reverse=True), scores
+            # Compared by score: equally scored hits may come back in either order
+            assert [round(hit['score'], 5) for hit in sharded_hits] == [round(hit['score'], 5) for hit in single_hits], query
+            top = {hit['id'] for hit in single_hits if round(hit['score'], 5) == round(single_hits[0]['score'], 5)}
+            assert sharded_hits[0]['id'] in top, query
+        print("✓ Scatter-gather search matches a single store")
+
+        query = "ranking documents by terms and rarity"
+        rankings = [store._submit(shard, "search_rankings", [query], 6, "hybrid").result()[0] for shard in range(3)]
+        shard_best = {ranking['keyword'][0]['id'] for ranking in rankings if ranking['keyword']}
+        keyword_hits = store.search(query, 6, mode="keyword")
+        # BM25 scores are per shard: every shard's best keyword hit comes before any second-best one
+        assert {hit['id'] for hit in keyword_hits[:len(shard_best)]} == shard_best, keyword_hits
+        hybrid_hits = store.search(query, 6, mode="hybrid")
+        scores = [hit['score'] for hit in hybrid_hits]
+        assert scores == sorted(scores, reverse=True) and max(scores) <= 2 / 61, scores
+        candidates = {hit['id'] for ranking in rankings for hits in ranking.values() for hit in hits}
+        assert {hit['id'] for hit in hybrid_hits} <= candidates
+        print("✓ Keyword and hybrid hits fused by rank across shards")
+
+        batch = store.search_many(["sharding", "quantization"], 2)
+        assert [hit['score'] for hit in batch['results'][0]] == [hit['score'] for hit in store.search("sharding", 2)]
+        print("✓ Batch search merged per query")
+
+        union = store.search_many(["sharding", "quantization"], 2, fuse="union")['fused']
+        single_union = single.search_many(["sharding", "quantization"], 2, fuse="union")['fused']
+        assert [hit['score'] for hit in union] == [hit['score'] for hit in single_union]
+        rrf = store.search_many(["sharding", "quantization"], 2, fuse="rrf")
+        merged_ids = {hit['id'] for hits in rrf['results'] for hit in hits}
+        scores = [hit['score'] for hit in rrf['fused']]
+        assert len(scores) == 2 and scores == sorted(scores, reverse=True)
+        assert {hit['id'] for hit in rrf['fused']} <= merged_ids
+        print("✓ Batch results fused across shards")
+
+        doc_id = store.add_document("A late document about shard routing.", {"title": "late"})
+        assert store.search("late document shard routing", 1)[0]['metadata']['title'] == "late"
+        assert store.delete_document(doc_id)
+        info = store.get_collection_info()
+        assert info['unique_documents'] == len(DOCUMENTS), info['unique_documents']
+        assert len(store.list_documents(0, 5)) == 5
+        print(f"✓ Routed add/delete; {info['unique_documents']} documents across {info['num_shards']} shards")
+    finally:
+        store.shutdown()
+
+
+def test_shard_count_is_fixed(tmp_path):
+    from sharded_store import ShardedVectorStore
+    ShardedVectorStore(num_shards=3, persist_directory=str(tmp_path)).shutdown()
+    ShardedVectorStore(num_shards=3, persist_directory=str(tmp_path)).shutdown()
+    try:
+        ShardedVectorStore(num_shards=2, persist_directory=str(tmp_path))
+    except ValueError:
+        print("✓ Reopening with a different shard count is refused")
+        return
+    raise AssertionError("a different shard count was accepted")
+
+
+def test_evicted_store_is_released(tmp_path):
+    """A pool that evicts a sharded store stops its shard processes and holds no reference to it."""
+    print("🧪 Testing eviction of a sharded store...")
+    from store_pool import VectorStorePool
+
+    pool = VectorStorePool(str(tmp_path), max_open=1, num_shards=2)
+    first = pool.get("first")
+    first.get_collection_info()
+    processes = [process for executor in first._executors for process in executor._processes.values()]
+    assert len(processes) == 2 and all(process.is_alive() for process in processes)
+    released = weakref.ref(first)
+    del first
+
+    pool.get("second")
+    gc.collect()
+    assert released() is None, "the evicted store is still referenced"
+    assert not any(process.is_alive() for process in processes)
+    pool.close()
+    print("✓ Eviction stopped both shard processes and freed the store")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="sharded-store-"))
+    try:
+        (directory / "a").mkdir()
+        (directory / "b").mkdir()
+        (directory / "c").mkdir()
+        test_routing_and_search(directory / "a")
+        test_shard_count_is_fixed(directory / "b")
+        test_evicted_store_is_released(directory / "c")
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All sharded store tests passed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import sys
+import shutil
+import tempfile
+
+
+def test_leased_store_survives_eviction(tmp_path):
+    """A leased handle stays open past max_open and is closed once the lease is released."""
+    print("🧪 Testing leases against eviction...")
+    from store_pool import VectorStorePool
+
+    pool = VectorStorePool(str(tmp_path), max_open=1)
+    with pool.lease("leased") as store:
+        store.add_documents(["A document kept open by its lease."])
+        # Opening two more collections pushes the pool past max_open while the lease is held
+        pool.get("second")
+        pool.get("third")
+        stats = pool.stats()
+        assert {'namespace': None, 'collection': "leased"} in stats['open'], stats
+        assert stats['in_use'] == 1 and stats['evicted'] == 1, stats
+        assert store.search("kept open by its lease", 1), "the leased store stopped working"
+        assert store.get_collection_info()['unique_documents'] == 1
+        print("✓ The leased store kept working while other collections were opened and evicted")
+
+    stats = pool.stats()
+    assert [entry['collection'] for entry in stats['open']] == ["third"], stats
+    assert stats['in_use'] == 0 and stats['evicted'] == 2, stats
+    assert store._collection is None, "the released store was not closed"
+    with pool.lease("leased") as reopened:
+        assert reopened is not store and reopened.get_collection_info()['unique_documents'] == 1
+    pool.close()
+    print("✓ Released store was closed and reopens with its data")
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    directory = Path(tempfile.mkdtemp(prefix="store-pool-"))
+    try:
+        test_leased_store_survives_eviction(directory)
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("\n🎉 All store pool tests passed!")
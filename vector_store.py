@@ -1,179 +1,1656 @@
-import chromadb
-from chromadb.config import Settings
-from chromadb.errors import NotFoundError
-from sentence_transformers import SentenceTransformer
 import os
-from typing import List, Dict, Any
-import uuid
+from typing import List, Dict, Any, Iterable, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+import copy
+import functools
+import json
+import hashlib
+import itertools
+import threading
 import re
+import shutil
+import sqlite3
+import time
+import numpy as np
+from datetime import datetime
+from embedding_cache import get_embedding_cache
+from query_cache import QueryResultCache, normalize_query
+from document_registry import get_document_registry
+from bm25_index import get_bm25_index
+from reranker import get_reranker, DEFAULT_RERANKER_MODEL
+from context_packer import pack_context
+from embeddings import get_embedding_backend
+from embedding_pool import get_embedding_pool
+from compressed_store import CompressedCollection, get_compressed_vectors
+from flat_index import FlatCollection, get_flat_collection, release_flat_collection
+
+
+# chromadb and the embedding model take seconds to import and load, so they are imported
+# on first use and shared by every VectorStore in the process
+_client_lock = threading.Lock()
+_chroma_clients = {}
+
+
+def get_chroma_client(path: str):
+    path = os.path.abspath(path)
+    with _client_lock:
+        if path not in _chroma_clients:
+            import chromadb
+            _chroma_clients[path] = chromadb.PersistentClient(path=path)
+        return _chroma_clients[path]
+
+
+class _ReadWriteLock:
+    """Any number of readers or one writer. A waiting writer holds off new readers, so it cannot starve."""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._writer and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            self._condition.wait_for(lambda: not self._writer and not self._readers)
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
 
 
 class VectorStore:
-    def __init__(self, collection_name: str = "documents", chunk_size: int = 800, chunk_overlap: int = 100):
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+    VECTOR_STORAGE = ("float32", "float16", "pq")
+    INDEX_BACKENDS = ("chroma", "flat")
+    
+    def __init__(self, collection_name: str = "documents", chunk_size: int = 800, chunk_overlap: int = 100,
+                 embed_batch_size: int = 64, write_batch_size: int = 1000, persist_directory: str = "./chroma_db",
+                 use_embedding_cache: bool = True, query_cache_size: int = 1024, query_cache_ttl: float = 300.0,
+                 read_block_size: int = 1 << 20, stream_threshold: int = 8 << 20, chunking: str = "chars",
+                 chunk_tokens: int = None, chunk_overlap_tokens: int = 32, keyword_index: bool = True,
+                 rrf_k: int = 60, reranker_model: str = DEFAULT_RERANKER_MODEL, rerank_candidates: int = 20,
+                 embedding_backend: str = None, embedding_model: str = None, embedding_workers: int = None,
+                 embedding_threads: int = None, vector_storage: str = "float32", coarse_dim: int = 64,
+                 rescore_oversample: int = 8, pq_subspaces: int = 48, index_backend: str = "chroma"):
+        self.persist_directory = persist_directory
         self.collection_name = collection_name
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # "sentence-transformers" (PyTorch), "onnx" or "onnx-int8"; defaults come from EMBEDDING_* env vars
+        self.embedding_backend = get_embedding_backend(embedding_backend, embedding_model)
+        self.embedding_model_name = self.embedding_backend.model_name
+        # With embedding_workers > 0 (or EMBEDDING_WORKERS), embedding runs in a pool of worker
+        # processes with embedding_threads torch threads each, instead of in this process
+        if embedding_workers is None:
+            embedding_workers = int(os.getenv("EMBEDDING_WORKERS", "0"))
+        if embedding_threads is None and os.getenv("EMBEDDING_THREADS_PER_WORKER"):
+            embedding_threads = int(os.getenv("EMBEDDING_THREADS_PER_WORKER"))
+        self.embedding_pool = None
+        if embedding_workers > 0:
+            self.embedding_pool = get_embedding_pool(
+                self.embedding_backend.name, self.embedding_model_name, self.embedding_backend.file_name,
+                embedding_workers, embedding_threads, embed_batch_size
+            )
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        if chunking not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunking mode: {chunking}")
+        # "tokens" packs chunks up to the embedding model's sequence limit, counted with its own tokenizer
+        self.chunking = chunking
+        self._chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self._token_counts = OrderedDict()
+        self._token_counts_lock = threading.Lock()
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        # Files larger than stream_threshold bytes are read, chunked and written block by block
+        self.read_block_size = read_block_size
+        self.stream_threshold = stream_threshold
+        self._write_lock = threading.Lock()
+        # Searches read the collection under this; vacuum takes it exclusively to swap collections
+        self._swap_lock = _ReadWriteLock()
+        self._collection_lock = threading.Lock()
+        self._collection = None
+        # Id of the Chroma collection whose first write has been checked for a new index directory
+        self._segments_checked = None
+        # Bumped on every write so cached search results from before the write are never served
+        self._generation = 0
+        self.query_cache = QueryResultCache(query_cache_size, query_cache_ttl) if query_cache_size > 0 else None
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = get_embedding_cache(os.path.join(persist_directory, "embedding_cache.sqlite3"))
+        # Per-document rows and counters, so stats never need a full collection scan
+        self.registry = get_document_registry(os.path.join(persist_directory, "document_registry.sqlite3"))
+        self._registry_ready = False
+        # BM25 index over the same chunks, for exact identifiers and rare terms dense retrieval misses
+        self.keyword_index = None
+        if keyword_index:
+            self.keyword_index = get_bm25_index(os.path.join(persist_directory, "bm25", f"{collection_name}.sqlite3"))
+        self._keyword_index_ready = False
+        self.rrf_k = rrf_k
+        # Cross-encoder used by search(rerank=True); loaded on first use
+        self.reranker_model_name = reranker_model
+        self.rerank_candidates = rerank_candidates
+        if vector_storage not in self.VECTOR_STORAGE:
+            raise ValueError(f"Unknown vector storage: {vector_storage} (choose from {', '.join(self.VECTOR_STORAGE)})")
+        # "float16" or "pq" keep embeddings compressed in a memory-mapped side store; Chroma then
+        # only indexes coarse_dim-dimensional projections, and candidates are re-scored exactly
+        self.vector_storage = vector_storage
+        if index_backend not in self.INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend: {index_backend} (choose from {', '.join(self.INDEX_BACKENDS)})")
+        if index_backend == "flat" and vector_storage != "float32":
+            raise ValueError("Compressed vector storage needs the chroma index backend")
+        # "flat" replaces Chroma with exact NumPy search over a memory-mapped matrix, which is
+        # faster for collections up to a few hundred thousand chunks
+        self.index_backend = index_backend
+        self.coarse_dim = coarse_dim
+        self.rescore_oversample = rescore_oversample
+        self.pq_subspaces = pq_subspaces
+    
+    @property
+    def embedding_model(self):
+        return self.embedding_backend.model
+    
+    @property
+    def reranker(self):
+        return get_reranker(self.reranker_model_name)
+    
+    @property
+    def client(self):
+        return get_chroma_client(self.persist_directory)
+    
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._collection_lock:
+                if self._collection is None:
+                    self._collection = self._open_collection()
+        return self._collection
+    
+    def _open_collection(self):
+        if self.index_backend == "flat":
+            return get_flat_collection(os.path.join(self.persist_directory, "flat", self.collection_name))
         
-        try:
-            self.collection = self.client.get_collection(name=collection_name)
-        except NotFoundError:
-            self.collection = self.client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
+        metadata = {"hnsw:space": "cosine"}
+        if self.vector_storage != "float32":
+            metadata.update(vector_storage=self.vector_storage, coarse_dim=self.coarse_dim)
+        self._recover_interrupted_vacuum()
+        collection = self.client.get_or_create_collection(name=self.collection_name, metadata=metadata)
+        
+        stored = (collection.metadata or {}).get("vector_storage", "float32")
+        if stored != self.vector_storage:
+            raise ValueError(
+                f"Collection {self.collection_name} was created with {stored} vector storage, "
+                f"not {self.vector_storage}"
             )
+        if self.vector_storage == "float32":
+            return collection
+        vectors = get_compressed_vectors(
+            os.path.join(self.persist_directory, "compressed", self.collection_name),
+            self.vector_storage, self.pq_subspaces
+        )
+        return CompressedCollection(
+            collection, vectors, collection.metadata.get("coarse_dim", self.coarse_dim), self.rescore_oversample
+        )
+    
+    def warm_up(self, background: bool = False):
+        """Load the embedding model and open the collection ahead of the first request."""
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="vector-store-warm-up", daemon=True)
+            thread.start()
+            return thread
+        
+        if self.embedding_pool is not None:
+            self.embedding_pool.warm_up()
+        # Queries are embedded in this process even with a worker pool
+        self.embedding_model
+        self.collection
+    
+    def close(self):
+        """
+        Drop this store's collection handle and cached results, e.g. when a pool evicts it.
+        Shared resources (embedding model, Chroma client) stay loaded for other stores.
+        """
+        with self._collection_lock:
+            if isinstance(self._collection, FlatCollection):
+                release_flat_collection(self._collection.directory)
+            self._collection = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
+    
+    _SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
     
     def _split_text_into_chunks(self, text: str) -> List[str]:
         """Split text into chunks with smart sentence/paragraph boundaries."""
-        if len(text) <= self.chunk_size:
-            return [text]
+        return list(self._iter_text_chunks([text]))
+    
+    def _iter_text_chunks(self, blocks: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily chunk text that arrives in blocks (e.g. read from a file). Produces the same
+        chunks as splitting the concatenated text at once, while holding at most one block
+        plus one unfinished sentence in memory.
+        """
+        if self.chunking == "tokens":
+            yield from self._pack_sentences_by_tokens(self._iter_sentences(blocks))
+            return
         
-        chunks = []
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        blocks = iter(blocks)
+        head = ""
+        # Text that fits in a single chunk is returned unchanged
+        for block in blocks:
+            head += block
+            if len(head) > self.chunk_size:
+                break
+        else:
+            yield head
+            return
+        
+        yield from self._pack_sentences(self._iter_sentences(itertools.chain([head], blocks)))
+    
+    def _iter_sentences(self, blocks: Iterable[str]) -> Iterator[str]:
+        """Yield the pieces `re.split` would produce at sentence boundaries, across block borders."""
+        max_carry = max(self.read_block_size, self.chunk_size * 64)
+        carry = ""
+        for block in blocks:
+            buffer = carry + block
+            start = 0
+            for match in self._SENTENCE_BOUNDARY.finditer(buffer):
+                if match.end() == len(buffer):
+                    # The whitespace run may continue in the next block
+                    break
+                yield buffer[start:match.start()]
+                start = match.end()
+            carry = buffer[start:]
+            
+            if len(carry) > max_carry:
+                # No sentence boundary for a long stretch; cut at the last space to bound memory
+                cut = carry.rfind(" ", 0, max_carry) + 1 or max_carry
+                yield carry[:cut].rstrip()
+                carry = carry[cut:]
+        
+        yield from self._SENTENCE_BOUNDARY.split(carry)
+    
+    def _pack_sentences(self, sentences: Iterable[str]) -> Iterator[str]:
+        """Pack sentences into chunks of at most `chunk_size` characters with `chunk_overlap` carried over."""
+        # The current chunk is " ".join(parts); `length` tracks its size without re-joining
+        parts = []
+        length = 0
         
-        current_chunk = ""
         for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 <= self.chunk_size:
-                current_chunk += (" " if current_chunk else "") + sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    
-                    if self.chunk_overlap > 0 and len(current_chunk) > self.chunk_overlap:
-                        overlap_text = current_chunk[-self.chunk_overlap:]
-                        current_chunk = overlap_text + " " + sentence
-                    else:
-                        current_chunk = sentence
+            if length + len(sentence) + 1 <= self.chunk_size:
+                if length:
+                    parts.append(sentence)
+                    length += len(sentence) + 1
+                else:
+                    parts = [sentence]
+                    length = len(sentence)
+            elif length:
+                current_chunk = " ".join(parts)
+                if current_chunk.strip():
+                    yield current_chunk.strip()
+                
+                if self.chunk_overlap > 0 and length > self.chunk_overlap:
+                    overlap_text = current_chunk[-self.chunk_overlap:]
+                    parts = [overlap_text, sentence]
+                    length = len(overlap_text) + 1 + len(sentence)
                 else:
-                    if len(sentence) > self.chunk_size:
-                        words = sentence.split()
-                        current_word_chunk = ""
-                        for word in words:
-                            if len(current_word_chunk) + len(word) + 1 <= self.chunk_size:
-                                current_word_chunk += (" " if current_word_chunk else "") + word
-                            else:
-                                if current_word_chunk:
-                                    chunks.append(current_word_chunk.strip())
-                                current_word_chunk = word
-                        if current_word_chunk:
-                            current_chunk = current_word_chunk
+                    parts = [sentence]
+                    length = len(sentence)
+            elif len(sentence) > self.chunk_size:
+                words = []
+                words_length = 0
+                for word in sentence.split():
+                    if words_length + len(word) + 1 <= self.chunk_size:
+                        words_length += len(word) + (1 if words else 0)
+                        words.append(word)
                     else:
-                        current_chunk = sentence
+                        if words:
+                            yield " ".join(words)
+                        words = [word]
+                        words_length = len(word)
+                if words:
+                    parts = [" ".join(words)]
+                    length = words_length
+            else:
+                parts = [sentence]
+                length = len(sentence)
+        
+        if length and " ".join(parts).strip():
+            yield " ".join(parts).strip()
+    
+    @property
+    def chunk_tokens(self) -> int:
+        """Token budget per chunk: the model's max sequence length minus [CLS] and [SEP]."""
+        if self._chunk_tokens is None:
+            self._chunk_tokens = self.embedding_backend.max_tokens - 2
+        return self._chunk_tokens
+    
+    def _count_tokens(self, sentences: List[str]) -> List[int]:
+        """Token counts for sentences, tokenized in one batch call and memoized in a bounded LRU."""
+        counts = [None] * len(sentences)
+        missing = {}
+        with self._token_counts_lock:
+            for i, sentence in enumerate(sentences):
+                count = self._token_counts.get(sentence)
+                if count is None:
+                    missing.setdefault(sentence, []).append(i)
+                else:
+                    self._token_counts.move_to_end(sentence)
+                    counts[i] = count
+        
+        if missing:
+            texts = list(missing)
+            encoded = self.embedding_backend.tokenizer(texts, add_special_tokens=False)['input_ids']
+            with self._token_counts_lock:
+                for text, input_ids in zip(texts, encoded):
+                    for i in missing[text]:
+                        counts[i] = len(input_ids)
+                    self._token_counts[text] = len(input_ids)
+                while len(self._token_counts) > 50000:
+                    self._token_counts.popitem(last=False)
+        
+        return counts
+    
+    def _split_long_sentence(self, sentence: str) -> List[str]:
+        """Cut a sentence longer than `chunk_tokens` into token windows overlapping by `chunk_overlap_tokens`."""
+        offsets = self.embedding_backend.tokenizer(
+            sentence, add_special_tokens=False, return_offsets_mapping=True
+        )['offset_mapping']
+        step = max(1, self.chunk_tokens - self.chunk_overlap_tokens)
+        windows = []
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.chunk_tokens]
+            windows.append(sentence[window[0][0]:window[-1][1]])
+            if start + self.chunk_tokens >= len(offsets):
+                break
+        return windows
+    
+    def _trailing_tokens(self, sentence: str) -> str:
+        """The last `chunk_overlap_tokens` tokens of a sentence, cut at the tokenizer's character offsets."""
+        offsets = self.embedding_backend.tokenizer(
+            sentence, add_special_tokens=False, return_offsets_mapping=True
+        )['offset_mapping']
+        if not offsets:
+            return ""
+        return sentence[offsets[-min(self.chunk_overlap_tokens, len(offsets))][0]:]
+    
+    def _pack_sentences_by_tokens(self, sentences: Iterable[str], batch_size: int = 256) -> Iterator[str]:
+        """
+        Pack sentences into chunks of at most `chunk_tokens` tokens. The overlap carried into the
+        next chunk is whole sentences, or the tail of the last sentence when none fits whole.
+        """
+        limit = self.chunk_tokens
+        current = []  # (sentence, tokens)
+        current_tokens = 0
+        
+        def overlap(items):
+            kept, kept_tokens = [], 0
+            for item in reversed(items):
+                if kept_tokens + item[1] > self.chunk_overlap_tokens:
+                    break
+                kept.insert(0, item)
+                kept_tokens += item[1]
+            if not kept and items and self.chunk_overlap_tokens > 0:
+                tail = self._trailing_tokens(items[-1][0])
+                if tail:
+                    kept_tokens = self._count_tokens([tail])[0]
+                    kept = [(tail, kept_tokens)]
+            return kept, kept_tokens
+        
+        batch = []
+        for sentence in itertools.chain(sentences, [None]):
+            if sentence is not None:
+                sentence = sentence.strip()
+                if sentence:
+                    batch.append(sentence)
+                if len(batch) < batch_size:
+                    continue
+            elif not batch:
+                break
+            
+            for sentence, tokens in zip(batch, self._count_tokens(batch)):
+                if tokens > limit:
+                    windows = self._split_long_sentence(sentence)
+                    if current:
+                        yield " ".join(text for text, _ in current)
+                    for window in windows[:-1]:
+                        yield window
+                    current = [(windows[-1], self._count_tokens([windows[-1]])[0])]
+                    current_tokens = current[0][1]
+                    continue
+                
+                if current and current_tokens + tokens > limit:
+                    yield " ".join(text for text, _ in current)
+                    current, current_tokens = overlap(current)
+                    if current_tokens + tokens > limit:
+                        current, current_tokens = [], 0
+                
+                current.append((sentence, tokens))
+                current_tokens += tokens
+            batch = []
+        
+        if current:
+            yield " ".join(text for text, _ in current)
+    
+    def _iter_file_blocks(self, file_path: str) -> Iterator[str]:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(self.read_block_size)
+                if not block:
+                    return
+                yield block
+    
+    def _encode(self, texts: List[str], pooled: bool = True) -> np.ndarray:
+        if pooled and self.embedding_pool is not None:
+            return self.embedding_pool.encode(texts, batch_size=self.embed_batch_size)
+        return self.embedding_backend.encode(texts, batch_size=self.embed_batch_size)
+    
+    def _embed_texts(self, texts: List[str], pooled: bool = True) -> np.ndarray:
+        """
+        Embed texts in batches of `embed_batch_size`, returning a (len(texts), dim) float32 matrix.
+        Texts already in the embedding cache are not sent to the model. With pooled=False (queries)
+        the worker pool is bypassed, which for a few texts is faster than the round trip.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        if self.embedding_cache is None:
+            return self._encode(texts, pooled)
+        
+        # Only touch the model when something is missing, so fully cached calls never load it
+        cache_key = self.embedding_backend.cache_key
+        embeddings = self.embedding_cache.get_many(cache_key, texts)
+        missing = {}
+        for i, vector in enumerate(embeddings):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if missing:
+            missing_texts = list(missing)
+            encoded = self._encode(missing_texts, pooled)
+            self.embedding_cache.put_many(cache_key, missing_texts, encoded)
+            for text, vector in zip(missing_texts, encoded):
+                for i in missing[text]:
+                    embeddings[i] = vector
         
-        return [chunk for chunk in chunks if chunk.strip()]
+        return np.stack(embeddings)
     
-    def add_document(self, content: str, metadata: Dict[str, Any] = None) -> str:
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def file_document_id(cls, file_path: str) -> str:
+        """Stable document ID for a file, so re-ingesting a changed file updates it in place."""
+        return cls._hash_text(os.path.abspath(file_path))[:32]
+    
+    def _prepare_document(self, content: str, metadata: Dict[str, Any] = None, doc_id: str = None) -> Dict[str, Any]:
+        """Chunk a document and build the ids and metadata for each chunk, without embedding."""
         if metadata is None:
             metadata = {}
         
-        doc_id = str(uuid.uuid4())
+        doc_hash = self._hash_text(content)
+        if doc_id is None:
+            doc_id = doc_hash[:32]
         chunks = self._split_text_into_chunks(content)
         
-        documents = []
-        embeddings = []
         metadatas = []
         ids = []
+        seen = {}
         
         for i, chunk in enumerate(chunks):
-            chunk_id = f"{doc_id}_chunk_{i}"
+            chunk_hash = self._hash_text(chunk)
+            # Chunk ids are content-addressed so unchanged chunks keep their id when text
+            # is inserted or removed elsewhere in the document
+            chunk_id = f"{doc_id}_{chunk_hash[:16]}"
+            seen[chunk_id] = seen.get(chunk_id, 0) + 1
+            if seen[chunk_id] > 1:
+                chunk_id = f"{chunk_id}_{seen[chunk_id] - 1}"
+            
             chunk_metadata = metadata.copy()
             chunk_metadata.update({
                 'parent_doc_id': doc_id,
+                'doc_hash': doc_hash,
+                'chunk_hash': chunk_hash,
                 'chunk_index': i,
                 'total_chunks': len(chunks),
                 'chunk_size': len(chunk)
             })
             
-            embedding = self.embedding_model.encode([chunk])[0].tolist()
-            
-            documents.append(chunk)
-            embeddings.append(embedding)
             metadatas.append(chunk_metadata)
             ids.append(chunk_id)
         
-        self.collection.add(
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
-        )
+        return {
+            'doc_id': doc_id,
+            'doc_hash': doc_hash,
+            'metadata': metadata,
+            'byte_size': len(content.encode('utf-8')),
+            'ids': ids,
+            'chunks': chunks,
+            'metadatas': metadatas
+        }
+    
+    def _write_documents(self, prepared: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Write prepared documents incrementally. Documents whose chunks are unchanged are skipped,
+        only chunks that are not already stored are embedded, chunks that merely moved get a
+        metadata update, and chunks no longer present are deleted.
+        """
+        # The same content (or file) twice in one batch shares a doc_id; the last copy wins
+        prepared = list({doc['doc_id']: doc for doc in prepared}.values())
+        with self._write_lock:
+            self._ensure_registry()
+            self._ensure_keyword_index()
+            doc_ids = [doc['doc_id'] for doc in prepared]
+            existing = self.collection.get(
+                where={"parent_doc_id": {"$in": doc_ids}},
+                include=["metadatas"]
+            )
+            stored = {}
+            for chunk_id, meta in zip(existing['ids'], existing['metadatas']):
+                stored.setdefault(meta['parent_doc_id'], {})[chunk_id] = meta
+            
+            new_ids, new_chunks, new_metadatas = [], [], []
+            update_ids, update_metadatas = [], []
+            stale_ids = []
+            registry_rows = []
+            unchanged = 0
+            
+            now = time.time()
+            for doc in prepared:
+                current = stored.pop(doc['doc_id'], {})
+                # Documents keep the time they were first ingested, so re-ingests stay incremental
+                ingested_at = next(iter(current.values()), {}).get('ingested_at') or now
+                for meta in doc['metadatas']:
+                    meta['ingested_at'] = ingested_at
+                if len(current) == len(doc['ids']) and all(
+                        current.get(chunk_id) == meta for chunk_id, meta in zip(doc['ids'], doc['metadatas'])):
+                    unchanged += 1
+                    continue
+                
+                for chunk_id, chunk, meta in zip(doc['ids'], doc['chunks'], doc['metadatas']):
+                    if chunk_id not in current:
+                        new_ids.append(chunk_id)
+                        new_chunks.append(chunk)
+                        new_metadatas.append(meta)
+                    elif current[chunk_id] != meta:
+                        update_ids.append(chunk_id)
+                        update_metadatas.append(meta)
+                
+                stale_ids.extend(set(current) - set(doc['ids']))
+                registry_rows.append(self._registry_row(
+                    doc['doc_id'], doc['metadata'], doc['doc_hash'], len(doc['ids']), doc['byte_size'], ingested_at
+                ))
+            
+            embeddings = self._embed_texts(new_chunks)
+            
+            for start in range(0, len(new_ids), self.write_batch_size):
+                end = start + self.write_batch_size
+                self._upsert_chunks(
+                    documents=new_chunks[start:end],
+                    embeddings=embeddings[start:end],
+                    metadatas=new_metadatas[start:end],
+                    ids=new_ids[start:end]
+                )
+                self._index_keywords(new_ids[start:end], new_chunks[start:end])
+            
+            for start in range(0, len(update_ids), self.write_batch_size):
+                end = start + self.write_batch_size
+                self.collection.update(ids=update_ids[start:end], metadatas=update_metadatas[start:end])
+            
+            for start in range(0, len(stale_ids), self.write_batch_size):
+                self.collection.delete(ids=stale_ids[start:start + self.write_batch_size])
+                self._unindex_keywords(stale_ids[start:start + self.write_batch_size])
+            
+            self.registry.upsert_documents(self.collection_name, registry_rows)
+            
+            if new_ids or update_ids or stale_ids:
+                self._generation += 1
         
-        return doc_id
+        return {
+            'embedded': len(new_ids),
+            'updated': len(update_ids),
+            'deleted': len(stale_ids),
+            'unchanged_documents': unchanged
+        }
+    
+    def add_document(self, content: str, metadata: Dict[str, Any] = None, doc_id: str = None) -> str:
+        prepared = self._prepare_document(content, metadata, doc_id)
+        self._write_documents([prepared])
+        return prepared['doc_id']
+    
+    def add_file(self, file_path: str, title: str = None) -> str:
+        prepared = self._load_file(file_path, title)
+        if 'stream_path' in prepared:
+            self._write_streamed_file(prepared)
+        else:
+            self._write_documents([prepared])
+        return prepared['doc_id']
     
-    def search(self, query: str, n_results: int = 5, max_context_chars: int = 4000) -> List[Dict[str, Any]]:
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+    def _load_document(self, item: Any) -> Dict[str, Any]:
+        if isinstance(item, str):
+            return self._prepare_document(item)
+        if isinstance(item, dict):
+            return self._prepare_document(item['content'], item.get('metadata'), item.get('doc_id'))
+        content, metadata = item
+        return self._prepare_document(content, metadata)
+    
+    def _load_file(self, file_path: str, title: str = None) -> Dict[str, Any]:
+        metadata = {
+            'title': title or os.path.basename(file_path),
+            'source': file_path,
+            'type': 'file'
+        }
+        doc_id = self.file_document_id(file_path)
         
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results * 2  # Get more results to filter by context size
-        )
+        if os.path.getsize(file_path) > self.stream_threshold:
+            # Too big to hold in memory; chunked and written block by block by _write_streamed_file
+            return {'doc_id': doc_id, 'stream_path': file_path, 'metadata': metadata}
+        
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return self._prepare_document(content, metadata, doc_id)
+    
+    def _hash_file(self, file_path: str) -> str:
+        """Hash of a file's decoded text, identical to _hash_text of its full content."""
+        digest = hashlib.sha256()
+        for block in self._iter_file_blocks(file_path):
+            digest.update(block.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _write_streamed_file(self, prepared: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Chunk, embed and write a large file in batches of `write_batch_size` chunks, so peak
+        memory does not depend on the file size.
+        
+        Streamed chunks use positional ids (`<doc_id>_chunk_<i>`): a chunk whose hash is unchanged
+        at its position is left alone, and shifted chunks are re-upserted but found in the
+        embedding cache. Chunk 0 receives the document hash last, so it marks a complete ingest.
+        """
+        file_path, doc_id, metadata = prepared['stream_path'], prepared['doc_id'], prepared['metadata']
+        doc_hash = self._hash_file(file_path)
+        first_id = f"{doc_id}_chunk_0"
+        counts = {'embedded': 0, 'updated': 0, 'deleted': 0, 'unchanged_documents': 0}
+        stale_where = {"$and": [{"parent_doc_id": doc_id}, {"doc_hash": {"$ne": doc_hash}}]}
+        
+        with self._write_lock:
+            self._ensure_registry()
+            self._ensure_keyword_index()
+            first = self.collection.get(ids=[first_id], include=["metadatas"])
+            previous = first['metadatas'][0] if first['ids'] else {}
+            metadata = dict(metadata, ingested_at=previous.get('ingested_at') or time.time())
+            if previous.get('doc_hash') == doc_hash and all(previous.get(k) == v for k, v in metadata.items()):
+                if not self.collection.get(where=stale_where, limit=1, include=[])['ids']:
+                    counts['unchanged_documents'] = 1
+                    return counts
+            
+            expected_total = previous.get('total_chunks', 0)
+            total = 0
+            batch = []
+            for chunk in self._iter_text_chunks(self._iter_file_blocks(file_path)):
+                batch.append(chunk)
+                total += 1
+                if len(batch) >= self.write_batch_size:
+                    self._write_chunk_batch(doc_id, doc_hash, metadata, total - len(batch), batch, expected_total, counts)
+                    batch = []
+            if batch:
+                self._write_chunk_batch(doc_id, doc_hash, metadata, total - len(batch), batch, expected_total, counts)
+            
+            if total != expected_total:
+                for start in range(0, total, self.write_batch_size):
+                    ids = [f"{doc_id}_chunk_{i}" for i in range(start, min(total, start + self.write_batch_size))]
+                    self.collection.update(ids=ids, metadatas=[{'total_chunks': total}] * len(ids))
+            
+            if total:
+                self.collection.update(ids=[first_id], metadatas=[{'doc_hash': doc_hash}])
+            
+            while True:
+                stale_ids = self.collection.get(where=stale_where, limit=self.write_batch_size, include=[])['ids']
+                if not stale_ids:
+                    break
+                self.collection.delete(ids=stale_ids)
+                self._unindex_keywords(stale_ids)
+                counts['deleted'] += len(stale_ids)
+            
+            self.registry.upsert_documents(self.collection_name, [self._registry_row(
+                doc_id, metadata, doc_hash, total, os.path.getsize(file_path), metadata['ingested_at']
+            )])
+            self._generation += 1
+        
+        return counts
+    
+    def _upsert_chunks(self, **chunks):
+        """Upsert chunks, recording the index directory Chroma creates for a new collection."""
+        collection = self.collection
+        coarse = collection.coarse_collection if isinstance(collection, CompressedCollection) else collection
+        if isinstance(collection, FlatCollection) or self._segments_checked == coarse.id:
+            collection.upsert(**chunks)
+            return
+        self._segments_checked = coarse.id
+        if coarse.count():
+            # Filled before its directory was recorded: a vacuum leaves that directory alone
+            collection.upsert(**chunks)
+        else:
+            self._record_segment_directories(coarse, functools.partial(collection.upsert, **chunks))
+    
+    def _write_chunk_batch(self, doc_id: str, doc_hash: str, metadata: Dict[str, Any], offset: int,
+                           chunks: List[str], total_chunks: int, counts: Dict[str, int]):
+        ids = []
+        metadatas = []
+        for i, chunk in enumerate(chunks, start=offset):
+            chunk_metadata = metadata.copy()
+            chunk_metadata.update({
+                'parent_doc_id': doc_id,
+                # Chunk 0 gets the real hash once the whole file has been written
+                'doc_hash': doc_hash if i else '',
+                'chunk_hash': self._hash_text(chunk),
+                'chunk_index': i,
+                'total_chunks': total_chunks,
+                'chunk_size': len(chunk)
+            })
+            ids.append(f"{doc_id}_chunk_{i}")
+            metadatas.append(chunk_metadata)
+        
+        existing = self.collection.get(ids=ids, include=["metadatas"])
+        stored = dict(zip(existing['ids'], existing['metadatas']))
+        
+        changed = [i for i, chunk_id in enumerate(ids)
+                   if stored.get(chunk_id, {}).get('chunk_hash') != metadatas[i]['chunk_hash']]
+        if changed:
+            self._upsert_chunks(
+                documents=[chunks[i] for i in changed],
+                embeddings=self._embed_texts([chunks[i] for i in changed]),
+                metadatas=[metadatas[i] for i in changed],
+                ids=[ids[i] for i in changed]
+            )
+            self._index_keywords([ids[i] for i in changed], [chunks[i] for i in changed])
         
+        changed = set(changed)
+        moved = [i for i, chunk_id in enumerate(ids) if i not in changed and stored[chunk_id] != metadatas[i]]
+        if moved:
+            self.collection.update(ids=[ids[i] for i in moved], metadatas=[metadatas[i] for i in moved])
+        
+        counts['embedded'] += len(changed)
+        counts['updated'] += len(moved)
+    
+    def _ingest(self, items: Iterable[Any], load: Callable[[Any], Dict[str, Any]], label: Callable[[int, Any], str],
+                max_workers: int, progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Run `load` (read + chunk) over items in a thread pool and feed the results to the
+        embed-and-write stage in batches of roughly `write_batch_size` chunks.
+        """
+        started = time.perf_counter()
+        stats = {'processed': 0, 'added': 0, 'unchanged': 0, 'failed': 0, 'chunks': 0}
         documents = []
-        total_chars = 0
+        failures = []
+        pending = []
+        pending_chunks = 0
         
-        for i in range(len(results['documents'][0])):
-            content = results['documents'][0][i]
-            metadata = results['metadatas'][0][i]
+        def report():
+            if progress_callback:
+                progress_callback(dict(stats))
+        
+        def write(batch, writer):
+            try:
+                written = writer([prepared for _, prepared in batch])
+                stats['chunks'] += written['embedded']
+                stats['unchanged'] += written['unchanged_documents']
+                stats['added'] += len(batch) - written['unchanged_documents']
+                documents.extend({'source': name, 'document_id': prepared['doc_id']} for name, prepared in batch)
+            except Exception as e:
+                if len(batch) > 1:
+                    # Write the documents one by one so only the ones that fail are reported
+                    for item in batch:
+                        write([item], writer)
+                    return
+                stats['failed'] += 1
+                failures.append({'source': batch[0][0], 'error': str(e)})
+            report()
+        
+        def flush():
+            nonlocal pending, pending_chunks
+            batch, pending, pending_chunks = pending, [], 0
+            write(batch, self._write_documents)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
             
-            if total_chars + len(content) <= max_context_chars:
-                documents.append({
-                    'content': content,
-                    'metadata': metadata,
-                    'distance': results['distances'][0][i],
-                    'id': results['ids'][0][i]
-                })
-                total_chars += len(content)
+            def drain_one():
+                nonlocal pending_chunks
+                name, future = in_flight.popleft()
+                stats['processed'] += 1
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    failures.append({'source': name, 'error': str(e)})
+                    report()
+                    return
+                if 'stream_path' in prepared:
+                    write([(name, prepared)], lambda batch: self._write_streamed_file(batch[0]))
+                    return
+                pending.append((name, prepared))
+                pending_chunks += len(prepared['ids'])
+                if pending_chunks >= self.write_batch_size:
+                    flush()
+            
+            for i, item in enumerate(items):
+                in_flight.append((label(i, item), executor.submit(load, item)))
+                # Bound the number of loaded-but-unwritten documents held in memory
+                if len(in_flight) >= max_workers * 2:
+                    drain_one()
+            
+            while in_flight:
+                drain_one()
+        
+        if pending:
+            flush()
+        
+        stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        return {**stats, 'documents': documents, 'failures': failures}
+    
+    def add_documents(self, documents: Iterable[Any], max_workers: int = 4,
+                      progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Add many documents at once. Each item may be a content string, a (content, metadata)
+        tuple or a {'content': ..., 'metadata': ...} dict.
+        """
+        def label(i, item):
+            if isinstance(item, dict):
+                return (item.get('metadata') or {}).get('source') or str(i)
+            return str(i)
+        
+        return self._ingest(documents, self._load_document, label, max_workers, progress_callback)
+    
+    def add_files(self, file_paths: Iterable[str], max_workers: int = 4,
+                  progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Read, chunk and add many files, reporting per-file failures instead of aborting."""
+        return self._ingest(file_paths, self._load_file, lambda i, path: path, max_workers, progress_callback)
+    
+    SEARCH_MODES = ("vector", "keyword", "hybrid")
+    
+    # Document-level filters matching at most this many documents (per the registry) are sent to
+    # Chroma as a parent_doc_id list, so it only scores those documents' chunks
+    PREFILTER_MAX_DOCUMENTS = 500
+    # BM25 knows nothing about metadata; keyword searches with a filter too broad to list its
+    # documents over-fetch, filter the hits, and fetch this many times more until enough pass
+    KEYWORD_FILTER_OVERSAMPLE = 4
+    
+    def search(self, query: str, n_results: int = 5, max_context_chars: int = 4000,
+               mode: str = "vector", rerank: bool = False, rerank_candidates: int = None,
+               where: Dict[str, Any] = None, where_document: Dict[str, Any] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        Search the collection. mode is "vector" (dense retrieval), "keyword" (BM25) or "hybrid"
+        (both rankings fused with reciprocal rank fusion). With rerank, a pool of
+        rerank_candidates hits is re-ordered by the cross-encoder before the context budget is filled.
+        
+        Results can be scoped with Chroma `where` / `where_document` filters and with the
+        document-level filters source, title, doc_type, after and before (ingest time, as epoch
+        seconds or an ISO 8601 string).
+        """
+        candidates = self._candidate_pool(n_results, mode, rerank, rerank_candidates)
+        key = (normalize_query(query), n_results, max_context_chars, mode, rerank, candidates,
+               self._filter_key(where, where_document, filters))
+        
+        def run():
+            scope = self._resolve_filters(where, where_document, **filters)
+            if scope is None:
+                return []
+            with self._swap_lock.read():
+                ranked = self._ranked_candidates(query, mode, rerank, candidates, **scope)
+            return self._fill_context(ranked, n_results, max_context_chars)
+        
+        return self._cached(key, run)
+    
+    def search_context(self, query: str, max_context_chars: int = 4000, max_tokens: int = None,
+                       n_candidates: int = 10, mode: str = "vector", rerank: bool = False,
+                       rerank_candidates: int = None, where: Dict[str, Any] = None,
+                       where_document: Dict[str, Any] = None, **filters) -> Dict[str, Any]:
+        """
+        Search and return a ready-to-use packed context: adjacent chunks are merged with their
+        overlap removed, and the budget is filled greedily by relevance per character.
+        
+        max_tokens is counted with the embedding model's tokenizer, which approximates the LLM's.
+        Filters are as for search().
+        """
+        candidates = self._candidate_pool(n_candidates, mode, rerank, rerank_candidates, oversample=1)
+        key = ("context", normalize_query(query), max_context_chars, max_tokens, mode, rerank, candidates,
+               self._filter_key(where, where_document, filters))
+        
+        def pack():
+            scope = self._resolve_filters(where, where_document, **filters)
+            hits = []
+            if scope is not None:
+                with self._swap_lock.read():
+                    hits = self._ranked_candidates(query, mode, rerank, candidates, **scope)
+            count_tokens = (lambda text: self._count_tokens([text])[0]) if max_tokens is not None else None
+            packed = pack_context(hits, max_context_chars, max_tokens, count_tokens)
+            packed['query'] = query
+            return packed
+        
+        return self._cached(key, pack)
+    
+    def _candidate_pool(self, n_results: int, mode: str, rerank: bool, rerank_candidates: int = None,
+                        oversample: int = 2) -> int:
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != "vector" and self.keyword_index is None:
+            raise ValueError(f"Search mode '{mode}' needs the keyword index, which is disabled")
+        
+        candidates = n_results * oversample  # Get more results to filter by context size
+        if rerank:
+            candidates = max(candidates, rerank_candidates or self.rerank_candidates)
+        return candidates
+    
+    @staticmethod
+    def _filter_key(where: Dict[str, Any], where_document: Dict[str, Any], filters: Dict[str, Any]) -> str:
+        if not (where or where_document or filters):
+            return ""
+        return json.dumps([where, where_document, filters], sort_keys=True, default=str)
+    
+    @staticmethod
+    def _to_timestamp(value: Any) -> float:
+        if value is None or isinstance(value, (int, float)):
+            return value
+        return datetime.fromisoformat(value).timestamp()
+    
+    def _resolve_filters(self, where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                         source: str = None, title: str = None, doc_type: str = None,
+                         after: Any = None, before: Any = None) -> Dict[str, Any]:
+        """
+        Turn search filters into Chroma `where` / `where_document` arguments, or None when the
+        registry shows that no document can match (the search is then skipped entirely).
+        'doc_ids' is the list of matching documents when it is short enough to send as one.
+        """
+        after, before = self._to_timestamp(after), self._to_timestamp(before)
+        clauses = [where] if where else []
+        doc_ids = None
+        
+        if any(value is not None for value in (source, title, doc_type, after, before)):
+            self._ensure_registry()
+            doc_ids = self.registry.find_document_ids(
+                self.collection_name, source=source, title=title, doc_type=doc_type,
+                added_after=after, added_before=before, limit=self.PREFILTER_MAX_DOCUMENTS + 1
+            )
+            if not doc_ids:
+                return None
+            if len(doc_ids) <= self.PREFILTER_MAX_DOCUMENTS:
+                clauses.append({"parent_doc_id": {"$in": doc_ids}})
+            else:
+                doc_ids = None
+                # Too many documents to list; filter on the chunk metadata instead
+                for field, value in (("source", source), ("title", title), ("type", doc_type)):
+                    if value is not None:
+                        clauses.append({field: value})
+                if after is not None:
+                    clauses.append({"ingested_at": {"$gte": after}})
+                if before is not None:
+                    clauses.append({"ingested_at": {"$lte": before}})
+        
+        return {
+            'where': clauses[0] if len(clauses) == 1 else ({"$and": clauses} if clauses else None),
+            'where_document': where_document or None,
+            'doc_ids': doc_ids
+        }
+    
+    def _cached(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        if self.query_cache is None:
+            return compute()
+        
+        generation = self._generation
+        value = self.query_cache.get(key, generation)
+        if value is None:
+            value = compute()
+            self.query_cache.put(key, generation, value)
+        return value
+    
+    def search_many(self, queries: List[str], n_results: int = 5, max_context_chars: int = 4000,
+                    mode: str = "vector", rerank: bool = False, rerank_candidates: int = None,
+                    fuse: str = None, where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                    **filters) -> Dict[str, Any]:
+        """
+        Search several queries with one embedding batch and one multi-vector collection query.
+        
+        Args:
+            queries: Query strings
+            n_results, max_context_chars, mode, rerank, rerank_candidates: As for search(), per query
+            where, where_document, filters: As for search(), applied to every query
+            fuse: None, "union" (de-duplicated, best score wins) or "rrf" (reciprocal rank fusion)
+                  to also return one combined list under the same n_results / max_context_chars budget
+        
+        Returns:
+            Dict with 'results' (one hit list per query) and, when fusing, 'fused'
+        """
+        if fuse not in (None, "union", "rrf"):
+            raise ValueError(f"Unknown fusion method: {fuse}")
+        candidates = self._candidate_pool(n_results, mode, rerank, rerank_candidates)
+        
+        filter_key = self._filter_key(where, where_document, filters)
+        keys = [(normalize_query(query), n_results, max_context_chars, mode, rerank, candidates, filter_key)
+                for query in queries]
+        generation = self._generation
+        results = [self.query_cache.get(key, generation) if self.query_cache is not None else None for key in keys]
+        
+        # Identical queries in one batch are searched once
+        missing = {}
+        for i, documents in enumerate(results):
+            if documents is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            pending = [queries[positions[0]] for positions in missing.values()]
+            scope = self._resolve_filters(where, where_document, **filters)
+            if scope is None:
+                ranked = [[] for _ in pending]
+            else:
+                with self._swap_lock.read():
+                    ranked = self._ranked_candidates_many(pending, mode, rerank, candidates, **scope)
+            for (key, positions), hits in zip(missing.items(), ranked):
+                documents = self._fill_context(hits, n_results, max_context_chars)
+                if self.query_cache is not None:
+                    self.query_cache.put(key, generation, documents)
+                for i in positions:
+                    results[i] = copy.deepcopy(documents) if i != positions[0] else documents
+        
+        response = {'results': results}
+        if fuse == "rrf":
+            response['fused'] = self._fill_context(self._fuse_rankings(results), n_results, max_context_chars)
+        elif fuse == "union":
+            best = {}
+            for documents in results:
+                for hit in documents:
+                    if hit['id'] not in best or hit['score'] > best[hit['id']]['score']:
+                        best[hit['id']] = hit
+            union = sorted(best.values(), key=lambda hit: hit['score'], reverse=True)
+            response['fused'] = self._fill_context(union, n_results, max_context_chars)
+        return response
+    
+    def search_rankings(self, queries: List[str], n_results: int = 5, mode: str = "hybrid",
+                        where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                        **filters) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        The separate vector and keyword rankings behind a search, for every query: a dict with
+        'vector' and 'keyword' candidate lists (best first, the pool search() would draw
+        n_results from). The ranking a mode does not use is empty.
+        
+        A sharded store or a pool fuses these across shards or collections by rank, since BM25
+        scores depend on each index's own statistics and are not comparable between them.
+        """
+        candidates = self._candidate_pool(n_results, mode, False)
+        key = ("rankings", tuple(normalize_query(query) for query in queries), mode, candidates,
+               self._filter_key(where, where_document, filters))
+        
+        def compute():
+            rankings = [{'vector': [], 'keyword': []} for _ in queries]
+            scope = self._resolve_filters(where, where_document, **filters)
+            if scope is None:
+                return rankings
+            with self._swap_lock.read():
+                query_embeddings = None
+                if mode != "keyword":
+                    query_embeddings = self._embed_texts(queries, pooled=False)
+                    hits = self._vector_candidates(query_embeddings, candidates, scope['where'], scope['where_document'])
+                    for ranking, vector in zip(rankings, hits):
+                        ranking['vector'] = vector
+                if mode != "vector":
+                    for i, (query, ranking) in enumerate(zip(queries, rankings)):
+                        embedding = query_embeddings[i:i + 1] if query_embeddings is not None else None
+                        ranking['keyword'] = self._keyword_candidates(query, candidates, embedding, **scope)
+            return rankings
+        
+        return self._cached(key, compute)
+    
+    @staticmethod
+    def _fill_context(ranked: List[Dict[str, Any]], n_results: int, max_context_chars: int) -> List[Dict[str, Any]]:
+        documents = []
+        total_chars = 0
+        
+        for hit in ranked:
+            if total_chars + len(hit['content']) <= max_context_chars:
+                documents.append(hit)
+                total_chars += len(hit['content'])
             
             if len(documents) >= n_results:
                 break
         
         return documents
     
-    def delete_document(self, doc_id: str) -> bool:
-        try:
-            # Find all chunks for this document
+    def _ranked_candidates(self, query: str, mode: str, rerank: bool, candidates: int,
+                           where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                           doc_ids: List[str] = None) -> List[Dict[str, Any]]:
+        """Candidate hits for a query, best first, before any context budget is applied."""
+        return self._ranked_candidates_many([query], mode, rerank, candidates, where, where_document, doc_ids)[0]
+    
+    def _ranked_candidates_many(self, queries: List[str], mode: str, rerank: bool, candidates: int,
+                                where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                                doc_ids: List[str] = None) -> List[List[Dict[str, Any]]]:
+        if mode == "keyword":
+            ranked = [self._keyword_candidates(query, candidates, where=where, where_document=where_document,
+                                               doc_ids=doc_ids)
+                      for query in queries]
+        else:
+            query_embeddings = self._embed_texts(queries, pooled=False)
+            ranked = self._vector_candidates(query_embeddings, candidates, where, where_document)
+            if mode == "hybrid":
+                ranked = [
+                    self._fuse_rankings([hits, self._keyword_candidates(
+                        query, candidates, query_embeddings[i:i + 1], where, where_document, doc_ids
+                    )])
+                    for i, (query, hits) in enumerate(zip(queries, ranked))
+                ]
+        
+        if rerank:
+            ranked = [self.reranker.rerank(query, hits) for query, hits in zip(queries, ranked)]
+        return ranked
+    
+    def _vector_candidates(self, query_embeddings: np.ndarray, n_results: int, where: Dict[str, Any] = None,
+                           where_document: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        """Nearest chunks for every query embedding, from a single collection query."""
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            where_document=where_document
+        )
+        return [
+            [
+                {
+                    'content': content,
+                    'metadata': metadata,
+                    'distance': distance,
+                    'score': 1.0 - distance,
+                    'id': chunk_id
+                }
+                for content, metadata, distance, chunk_id in zip(documents, metadatas, distances, ids)
+            ]
+            for documents, metadatas, distances, ids in zip(
+                results['documents'], results['metadatas'], results['distances'], results['ids']
+            )
+        ]
+    
+    def _keyword_candidates(self, query: str, n_results: int, query_embeddings: np.ndarray = None,
+                            where: Dict[str, Any] = None, where_document: Dict[str, Any] = None,
+                            doc_ids: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        BM25 hits, best first. With query_embeddings, each hit also gets the distance the
+        collection would have reported for it, so hybrid results look like vector results.
+        
+        With doc_ids (a short list of documents in scope), only those documents' chunks are
+        scored. Other filters are applied to the BM25 hits, fetching more until enough pass.
+        """
+        if not self._keyword_index_ready:
+            with self._write_lock:
+                self._ensure_keyword_index()
+        
+        filtered = bool(where or where_document)
+        chunk_ids = None
+        if doc_ids is not None:
+            chunk_ids = self.collection.get(where=where, where_document=where_document, include=[])['ids']
+            if not chunk_ids:
+                return []
+        
+        include = ["documents", "metadatas"]
+        if query_embeddings is not None:
+            include.append("embeddings")
+        limit = n_results * (self.KEYWORD_FILTER_OVERSAMPLE if filtered and chunk_ids is None else 1)
+        while True:
+            hits = self.keyword_index.search(query, limit, chunk_ids)
+            if not hits:
+                return []
             results = self.collection.get(
-                where={"parent_doc_id": doc_id}
+                ids=[chunk_id for chunk_id, _ in hits],
+                where=where,
+                where_document=where_document,
+                include=include
             )
-            
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
-                return True
-            else:
+            # Fewer hits than asked for means BM25 has nothing more to offer
+            if len(results['ids']) >= n_results or len(hits) < limit:
+                break
+            limit *= self.KEYWORD_FILTER_OVERSAMPLE
+        
+        position = {chunk_id: i for i, chunk_id in enumerate(results['ids'])}
+        distances = None
+        if query_embeddings is not None and results['ids']:
+            distances = self._distances(query_embeddings[0], np.asarray(results['embeddings']))
+        
+        documents = []
+        for chunk_id, score in hits:
+            i = position.get(chunk_id)
+            if i is None:
+                continue
+            documents.append({
+                'content': results['documents'][i],
+                'metadata': results['metadatas'][i],
+                'distance': float(distances[i]) if distances is not None else None,
+                'score': score,
+                'id': chunk_id
+            })
+        return documents[:n_results]
+    
+    def _distances(self, query_embedding: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+        """Distances in the collection's own space (cosine, ip or squared l2)."""
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        if space == "l2":
+            return ((embeddings - query_embedding) ** 2).sum(axis=1)
+        if space == "ip":
+            return 1.0 - embeddings @ query_embedding
+        norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
+        return 1.0 - (embeddings @ query_embedding) / np.maximum(norms, 1e-12)
+    
+    def _fuse_rankings(self, rankings: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: each hit scores the sum of 1 / (rrf_k + rank) over the rankings it appears in."""
+        fused = {}
+        for ranking in rankings:
+            for rank, hit in enumerate(ranking, start=1):
+                entry = fused.setdefault(hit['id'], dict(hit, score=0.0))
+                entry['score'] += 1.0 / (self.rrf_k + rank)
+        return sorted(fused.values(), key=lambda hit: hit['score'], reverse=True)
+    
+    def delete_document(self, doc_id: str) -> bool:
+        try:
+            with self._write_lock:
+                self._ensure_registry()
+                self._ensure_keyword_index()
+                # Find all chunks for this document
+                results = self.collection.get(
+                    where={"parent_doc_id": doc_id},
+                    include=[]
+                )
+                
+                self.registry.delete_documents(self.collection_name, [doc_id])
                 # Try deleting as single document (backward compatibility)
-                self.collection.delete(ids=[doc_id])
+                chunk_ids = results['ids'] or [doc_id]
+                self.collection.delete(ids=chunk_ids)
+                self._unindex_keywords(chunk_ids)
+                # Only after the delete, so a search racing it cannot cache the deleted chunks
+                self._generation += 1
                 return True
         except Exception:
             return False
     
+    # Documents per delete batch: one parent_doc_id $in query, then collection, keyword index
+    # and registry deletes for just those documents
+    DELETE_BATCH_DOCUMENTS = 500
+    
+    def delete_documents(self, doc_ids: List[str] = None, where: Dict[str, Any] = None,
+                         where_document: Dict[str, Any] = None, batch_size: int = None, **filters) -> Dict[str, Any]:
+        """
+        Delete many documents at once: by id, by filter (as for search()), or ids narrowed by a
+        filter. Documents are always deleted whole, including when only some of their chunks
+        match a chunk-level filter. Each batch removes the documents from the collection, the
+        keyword index and the registry before the next starts.
+        
+        Returns:
+            Dict with 'deleted_documents', 'deleted_chunks', 'batches' and 'elapsed_seconds'
+        """
+        filtered = bool(where or where_document) or any(value is not None for value in filters.values())
+        if doc_ids is None and not filtered:
+            raise ValueError("delete_documents needs document ids or a filter")
+        
+        started = time.perf_counter()
+        batch_size = batch_size or self.DELETE_BATCH_DOCUMENTS
+        deleted_documents = deleted_chunks = batches = 0
+        with self._write_lock:
+            self._ensure_registry()
+            self._ensure_keyword_index()
+            targets = self._matching_document_ids(doc_ids, where, where_document, filters) if filtered else list(dict.fromkeys(doc_ids))
+            
+            for start in range(0, len(targets), batch_size):
+                batch = targets[start:start + batch_size]
+                found = self.collection.get(where={"parent_doc_id": {"$in": batch}}, include=["metadatas"])
+                chunk_ids = found['ids']
+                # Documents stored as a single chunk before parent_doc_id existed use their id as chunk id
+                parents = {meta.get('parent_doc_id') for meta in found['metadatas']}
+                legacy = [doc_id for doc_id in batch if doc_id not in parents]
+                if legacy:
+                    chunk_ids = chunk_ids + self.collection.get(ids=legacy, include=[])['ids']
+                for chunk_start in range(0, len(chunk_ids), self.write_batch_size):
+                    ids = chunk_ids[chunk_start:chunk_start + self.write_batch_size]
+                    self.collection.delete(ids=ids)
+                    self._unindex_keywords(ids)
+                deleted_documents += self.registry.delete_documents(self.collection_name, batch)
+                deleted_chunks += len(chunk_ids)
+                batches += 1
+                self._generation += 1
+        
+        return {
+            'deleted_documents': deleted_documents,
+            'deleted_chunks': deleted_chunks,
+            'batches': batches,
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def _matching_document_ids(self, doc_ids: List[str], where: Dict[str, Any], where_document: Dict[str, Any],
+                               filters: Dict[str, Any]) -> List[str]:
+        """Ids of the documents a delete filter selects, optionally limited to doc_ids."""
+        if not where and not where_document:
+            # Document-level filters only: answered by the registry without touching chunks
+            matched = self.registry.find_document_ids(
+                self.collection_name, source=filters.get('source'), title=filters.get('title'),
+                doc_type=filters.get('doc_type'), added_after=self._to_timestamp(filters.get('after')),
+                added_before=self._to_timestamp(filters.get('before'))
+            )
+        else:
+            scope = self._resolve_filters(where, where_document, **filters)
+            matched = []
+            if scope is not None:
+                for page in self._iter_collection(include=["metadatas"], where=scope['where'],
+                                                  where_document=scope['where_document']):
+                    # A chunk without parent_doc_id predates it and is its own document
+                    matched.extend((meta or {}).get('parent_doc_id') or chunk_id
+                                   for chunk_id, meta in zip(page['ids'], page['metadatas']))
+            matched = [doc_id for doc_id in dict.fromkeys(matched) if doc_id is not None]
+        
+        if doc_ids is not None:
+            allowed = set(doc_ids)
+            matched = [doc_id for doc_id in matched if doc_id in allowed]
+        return matched
+    
+    def vacuum(self) -> Dict[str, Any]:
+        """
+        Reclaim the space left by deleted chunks: rebuild the vector index from the live chunks,
+        compact a compressed or flat vector file and VACUUM the SQLite files. Writes to this store wait until it finishes; searches keep
+        running against the old index while it is copied and only pause for the swap.
+        
+        Returns:
+            Dict with 'elapsed_seconds', 'bytes_before', 'bytes_after' and 'bytes_freed' (for
+            the whole persist directory) and the number of 'chunks' kept
+        """
+        started = time.perf_counter()
+        with self._write_lock:
+            bytes_before = self._disk_usage()
+            collection = self.collection
+            if isinstance(collection, FlatCollection):
+                collection.compact()
+                collection.vacuum()
+            else:
+                coarse = collection.coarse_collection if isinstance(collection, CompressedCollection) else collection
+                rebuilt = self._rebuild_chroma_collection(coarse)
+                with self._swap_lock.write():
+                    self._swap_chroma_collection(coarse, rebuilt)
+                    if isinstance(collection, CompressedCollection):
+                        collection.coarse_collection = rebuilt
+                    else:
+                        self._collection = rebuilt
+                    # Chroma keeps reading this file, so nothing may search while it is rewritten
+                    self._vacuum_sqlite(os.path.join(self.persist_directory, "chroma.sqlite3"))
+                if isinstance(collection, CompressedCollection):
+                    collection.vectors.compact()
+                    collection.vectors.vacuum()
+            self.registry.vacuum()
+            if self.keyword_index is not None:
+                self.keyword_index.vacuum()
+            self._generation += 1
+            bytes_after = self._disk_usage()
+            chunks = self.collection.count()
+        
+        return {
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_freed': max(0, bytes_before - bytes_after),
+            'chunks': chunks
+        }
+    
+    def _vacuum_names(self) -> tuple:
+        """Names of the rebuilt copy and of the replaced original while a vacuum swaps them."""
+        suffix = self._hash_text(self.collection_name)[:16]
+        return f"vacuum-new-{suffix}", f"vacuum-old-{suffix}"
+    
+    def _recover_interrupted_vacuum(self):
+        """
+        Finish or undo a vacuum that stopped part-way. The swap only renames collections: the
+        original is renamed to the "old" name and the complete copy to the original name, and
+        only then is the old one deleted. So at every point one complete copy exists.
+        """
+        name = self.collection_name
+        temp_name, old_name = self._vacuum_names()
+        # Chroma returns names in newer releases and Collection objects in older ones
+        names = {getattr(item, "name", item) for item in self.client.list_collections()}
+        if not names & {temp_name, old_name}:
+            return
+        if name not in names:
+            # Stopped between the two renames: the copy was complete before the original moved
+            survivor = temp_name if temp_name in names else old_name
+            self.client.get_collection(survivor).modify(name=name)
+            names.discard(survivor)
+        for leftover in names & {temp_name, old_name}:
+            # Either an unfinished copy or the replaced original; the collection itself is intact
+            self._drop_chroma_collection(leftover)
+    
+    def _rebuild_chroma_collection(self, collection):
+        """Copy a Chroma collection into a fresh one (a new HNSW index), under a temporary name."""
+        temp_name, _ = self._vacuum_names()
+        self._recover_interrupted_vacuum()
+        
+        rebuilt = self.client.create_collection(name=temp_name, metadata=dict(collection.metadata or {}) or None)
+        for i, page in enumerate(self._iter_collection(include=["embeddings", "documents", "metadatas"],
+                                                       collection=collection)):
+            add = functools.partial(rebuilt.add, ids=page['ids'], embeddings=page['embeddings'],
+                                    documents=page['documents'], metadatas=page['metadatas'])
+            if i == 0:
+                self._record_segment_directories(rebuilt, add)
+            else:
+                add()
+        return rebuilt
+    
+    def _swap_chroma_collection(self, collection, rebuilt):
+        """Give the rebuilt copy the collection's name, then drop the original."""
+        name = collection.name
+        _, old_name = self._vacuum_names()
+        collection.modify(name=old_name)
+        rebuilt.modify(name=name)
+        self._drop_chroma_collection(old_name)
+    
+    _SEGMENT_DIRECTORY = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+    
+    def _segment_directory_names(self) -> set:
+        return {entry for entry in os.listdir(self.persist_directory)
+                if self._SEGMENT_DIRECTORY.match(entry) and os.path.isdir(os.path.join(self.persist_directory, entry))}
+    
+    def _record_segment_directories(self, collection, write: Callable[[], Any]):
+        """
+        Run the first write into an empty Chroma collection and record the index directory it
+        creates. If several appear (another collection in this directory wrote its first chunks
+        at the same moment) nothing is recorded: a directory is only ever removed when it is
+        known to belong to the collection being dropped.
+        """
+        before = self._segment_directory_names()
+        write()
+        created = self._segment_directory_names() - before
+        if len(created) == 1:
+            self.registry.record_segment_directories(str(collection.id), sorted(created))
+    
+    def _drop_chroma_collection(self, name: str):
+        """Delete a Chroma collection and the index directories recorded for it, which Chroma leaves on disk."""
+        collection_id = str(self.client.get_collection(name).id)
+        directories = self.registry.segment_directories(collection_id)
+        self.client.delete_collection(name)
+        for directory in directories:
+            shutil.rmtree(os.path.join(self.persist_directory, directory), ignore_errors=True)
+        self.registry.forget_segment_directories(collection_id)
+    
+    @staticmethod
+    def _vacuum_sqlite(path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        try:
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                conn.execute("VACUUM")
+                # In WAL mode the rewritten pages land in the -wal file until a checkpoint
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error:
+            # Another connection is mid-transaction; the index rebuild has still been done
+            return False
+    
+    def _disk_usage(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.persist_directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    
+    def _registry_row(self, doc_id: str, metadata: Dict[str, Any], doc_hash: str, chunk_count: int,
+                      byte_size: int, added_at: float = None) -> Dict[str, Any]:
+        row = {
+            'doc_id': doc_id,
+            'title': metadata.get('title'),
+            'source': metadata.get('source'),
+            'type': metadata.get('type'),
+            'doc_hash': doc_hash,
+            'chunk_count': chunk_count,
+            'byte_size': byte_size
+        }
+        if added_at is not None:
+            row['added_at'] = added_at
+        return row
+    
+    def _iter_collection(self, include: List[str], where: Dict[str, Any] = None, page_size: int = None,
+                         where_document: Dict[str, Any] = None, collection=None) -> Iterator[Dict[str, Any]]:
+        """Page through the collection instead of loading it with a single get()."""
+        collection = collection if collection is not None else self.collection
+        page_size = page_size or self.write_batch_size
+        offset = 0
+        while True:
+            page = collection.get(where=where, where_document=where_document, include=include,
+                                  limit=page_size, offset=offset)
+            if not page['ids']:
+                return
+            yield page
+            offset += len(page['ids'])
+    
+    def rebuild_registry(self):
+        """
+        Rebuild this collection's document registry from chunk metadata with one paged scan.
+        
+        Byte sizes are summed from chunk sizes, so they include chunk overlap.
+        """
+        documents = {}
+        for page in self._iter_collection(include=["metadatas"]):
+            for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+                metadata = metadata or {}
+                # Chunks without a parent predate chunking and are deleted by their own id
+                doc_id = metadata.get('parent_doc_id', chunk_id)
+                doc = documents.get(doc_id)
+                if doc is None:
+                    doc = documents[doc_id] = self._registry_row(
+                        doc_id, metadata, metadata.get('doc_hash'), 0, 0, metadata.get('ingested_at')
+                    )
+                doc['chunk_count'] += 1
+                doc['byte_size'] += metadata.get('chunk_size', 0)
+        
+        self.registry.clear(self.collection_name)
+        self.registry.mark_initialized(self.collection_name)
+        self.registry.upsert_documents(self.collection_name, list(documents.values()))
+        self._registry_ready = True
+    
+    def _ensure_registry(self):
+        if self._registry_ready:
+            return
+        if self.registry.is_initialized(self.collection_name):
+            self._registry_ready = True
+        elif self.collection.count() == 0:
+            self.registry.mark_initialized(self.collection_name)
+            self._registry_ready = True
+        else:
+            self.rebuild_registry()
+    
+    def _index_keywords(self, chunk_ids: List[str], chunks: List[str]):
+        if self.keyword_index is not None:
+            self.keyword_index.add(chunk_ids, chunks)
+    
+    def _unindex_keywords(self, chunk_ids: List[str]):
+        if self.keyword_index is not None:
+            self.keyword_index.delete(chunk_ids)
+    
+    def rebuild_keyword_index(self):
+        """Rebuild the BM25 index from the chunks stored in the collection, one page at a time."""
+        self.keyword_index.clear()
+        self.keyword_index.mark_initialized()
+        for page in self._iter_collection(include=["documents"]):
+            self.keyword_index.add(page['ids'], page['documents'])
+        self._keyword_index_ready = True
+    
+    def _ensure_keyword_index(self):
+        """Build the keyword index for collections that predate it. Callers hold the write lock."""
+        if self.keyword_index is None or self._keyword_index_ready:
+            return
+        if self.keyword_index.is_initialized():
+            self._keyword_index_ready = True
+        elif self.collection.count() == 0:
+            self.keyword_index.mark_initialized()
+            self._keyword_index_ready = True
+        else:
+            self.rebuild_keyword_index()
+    
+    def list_documents(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        self._ensure_registry()
+        return self.registry.list_documents(self.collection_name, offset, limit)
+    
     def get_collection_info(self) -> Dict[str, Any]:
-        total_count = self.collection.count()
+        with self._swap_lock.read():
+            total_count = self.collection.count()
         
-        # Try to get unique document count
         try:
-            all_metadata = self.collection.get()['metadatas']
-            unique_docs = set()
-            for metadata in all_metadata:
-                if 'parent_doc_id' in metadata:
-                    unique_docs.add(metadata['parent_doc_id'])
-                else:
-                    unique_docs.add('legacy_doc')
-            
-            return {
+            self._ensure_registry()
+            stats = self.registry.stats(self.collection_name)
+            info = {
                 'name': self.collection_name,
                 'total_chunks': total_count,
-                'unique_documents': len(unique_docs),
+                'unique_documents': stats['documents'],
+                'total_bytes': stats['bytes'],
+                'sources': self.registry.source_stats(self.collection_name),
                 'chunk_size': self.chunk_size,
-                'chunk_overlap': self.chunk_overlap
+                'chunk_overlap': self.chunk_overlap,
+                'chunking': self.chunking,
+                'embedding': dict(
+                    self.embedding_backend.describe(),
+                    workers=self.embedding_pool.describe() if self.embedding_pool is not None else None
+                )
             }
         except Exception:
-            return {
+            info = {
                 'name': self.collection_name,
                 'total_chunks': total_count,
                 'chunk_size': self.chunk_size,
-                'chunk_overlap': self.chunk_overlap
-            }
\ No newline at end of file
+                'chunk_overlap': self.chunk_overlap,
+                'chunking': self.chunking
+            }
+        
+        if self.embedding_cache is not None:
+            info['embedding_cache'] = self.embedding_cache.stats()
+        if self.query_cache is not None:
+            info['query_cache'] = self.query_cache.stats()
+        if self.keyword_index is not None:
+            info['keyword_index'] = self.keyword_index.stats()
+        info['reranker'] = dict(self.reranker.stats(), model=self.reranker_model_name)
+        info['index'] = self.collection.stats() if isinstance(self.collection, FlatCollection) else {'index': 'chroma'}
+        info['vector_storage'] = (
+            self.collection.vectors.stats() if isinstance(self.collection, CompressedCollection)
+            else {'storage': 'float32'}
+        )
+        return info
\ No newline at end of file